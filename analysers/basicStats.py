@@ -1,24 +1,32 @@
 '''
 Functions for basic stat gathering from text files.
-If run directly, writes a csv file with the stats at specified location.
-En_core_web_lg may take time to load depending on your set up, consider downloading and using sm or md versions as needed.
+If run directly, writes a parquet file with the stats at specified location, see analysers.export.
+En_core_web_lg may take time to load depending on your set up, consider downloading and using sm or md versions as needed,
+see analysers.models. The model is loaded on first use, not on import.
 
 NOTE: Document to doc conversion takes approx 0,4 ms per token.
 
 INPUT: Text for spacy document object.
-OUTPUT: Basic stats in csv file.
+OUTPUT: Basic stats in parquet file.
 '''
 
-import spacy
-import csv
+import numpy
 from timeit import default_timer as timer
 from datetime import datetime
 from spacy.lang.en.stop_words import STOP_WORDS
+from spacy.attrs import ORTH, LEMMA, POS, IS_PUNCT
 from collections import Counter
+from analysers import models
+from common.profiling import stage, first_length, second_length
 
-# Higher max length may cause memory issues, decrease as needed
-nlp = spacy.load('en_core_web_lg')
-nlp.max_length = 1500000
+ANALYSES = ('tokens', 'lemmas', 'entities', 'pos')
+
+
+# Model is loaded on first access of basicStats.nlp, with only the components ANALYSES need
+def __getattr__(name):
+    if name == 'nlp':
+        return models.load(*ANALYSES)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 
 def get_token_count(document) -> list:
@@ -28,6 +36,7 @@ def get_token_count(document) -> list:
 
 
 # Return as default 10 most common tokens and their counts.
+@stage('basicStats.get_top_tokens', items=first_length)
 def get_top_tokens(document, number=10) -> list:
     tokens = [token.text for token in document if token.is_punct is not True]
     return Counter(tokens).most_common(number)
@@ -35,6 +44,7 @@ def get_top_tokens(document, number=10) -> list:
 
 # Return as default 10 most common tokens and their counts , w/o punct or stop words, for full list print STOP_WORDS
 # STOP_WORDS imported as workaround, en_core_web_lg has known bug with stop words.
+@stage('basicStats.get_top_tokens_cleaned', items=first_length)
 def get_top_tokens_cleaned(document, number=10) -> list:
     tokens = [token.text for token in document if '\n' not in token.text
               and ' ' not in token.text
@@ -45,6 +55,7 @@ def get_top_tokens_cleaned(document, number=10) -> list:
 
 
 # Return as default 10 most common named entities and their counts
+@stage('basicStats.get_named_entities', items=first_length)
 def get_named_entities(document, number=10) -> list:
     entities = [ent.text for ent in document.ents if '\n' not in ent.text]
 
@@ -52,6 +63,7 @@ def get_named_entities(document, number=10) -> list:
 
 
 # Return as default 10 most common lemmas not including punctuation
+@stage('basicStats.get_top_lemmas', items=first_length)
 def get_top_lemmas(document, number=10) -> list:
     lemmas = [token.lemma_ for token in document if token.is_punct is not True]
 
@@ -59,6 +71,7 @@ def get_top_lemmas(document, number=10) -> list:
 
 
 # Return as default 10 most common lemmas not including punctuation, new lines, or stop words
+@stage('basicStats.get_top_lemmas_cleaned', items=first_length)
 def get_top_lemmas_cleaned(document, number=10) -> list:
     lemmas = [token.lemma_ for token in document if '\n' not in token.text
               and ' ' not in token.text
@@ -69,46 +82,141 @@ def get_top_lemmas_cleaned(document, number=10) -> list:
 
 
 # Return all POS-tags and their frequencies in descending order
+@stage('basicStats.get_pos', items=first_length)
 def get_pos(document) -> list:
     pos = [token.pos_ for token in document]
 
     return Counter(pos).most_common()
 
 
+# Returns (id, count) pairs of the hash IDs in the order of their first occurrence,
+# so Counter.most_common breaks ties the same way as counting the strings token by token.
+def _ordered_counts(ids) -> zip:
+    unique, first, counts = numpy.unique(ids, return_index=True, return_counts=True)
+    order = numpy.argsort(first, kind='stable')
+    return zip(unique[order].tolist(), counts[order].tolist())
+
+
+# Collects all basic stats in one pass over the document(s), results are identical to the functions above.
+# Counts are kept by ORTH/LEMMA/POS hash ID and turned into strings only for the requested top N.
+# Call update() for each document, e.g. when processing a corpus in pieces.
+class StatsCollector:
+    def __init__(self, document=None):
+        self.token_count = 0
+        self.tokens = Counter()
+        self.tokens_cleaned = Counter()
+        self.lemmas = Counter()
+        self.lemmas_cleaned = Counter()
+        self.entities = Counter()
+        self.pos = Counter()
+        self.strings = None
+        self._cleaned = {}
+
+        if document is not None:
+            self.update(document)
+
+    # Adds the counts of a document to the collected stats
+    @stage('basicStats.StatsCollector.update', items=second_length)
+    def update(self, document):
+        self.strings = document.vocab.strings
+        self.token_count += len(document)
+
+        for ent in document.ents:
+            if '\n' not in ent.text:
+                self.entities[ent.text] += 1
+
+        if len(document) == 0:
+            return self
+
+        array = document.to_array([ORTH, LEMMA, POS, IS_PUNCT])
+        orth, lemma, pos = array[:, 0], array[:, 1], array[:, 2]
+        kept = array[:, 3] == 0
+
+        # Cleaned filter depends on the token text only, so it is decided once per distinct ORTH ID
+        unique, inverse = numpy.unique(orth, return_inverse=True)
+        cleaned = numpy.fromiter((self._is_cleaned(key) for key in unique.tolist()), dtype=bool, count=len(unique))
+        cleaned = cleaned[inverse.reshape(-1)] & kept
+
+        self.tokens.update(dict(_ordered_counts(orth[kept])))
+        self.tokens_cleaned.update(dict(_ordered_counts(orth[cleaned])))
+        self.lemmas.update(dict(_ordered_counts(lemma[kept])))
+        self.lemmas_cleaned.update(dict(_ordered_counts(lemma[cleaned])))
+        self.pos.update(dict(_ordered_counts(pos)))
+
+        return self
+
+    # Adds the counts of another collector
+    def merge(self, other):
+        if self.strings is None:
+            self.strings = other.strings
+        self.token_count += other.token_count
+        for counter, counts in self._counters(other):
+            counter.update(counts)
+
+        return self
+
+    # Takes off the counts of another collector, which must have been added before
+    def subtract(self, other):
+        self.token_count -= other.token_count
+        for counter, counts in self._counters(other):
+            counter.subtract(counts)
+            for key in [key for key in counts if counter[key] <= 0]:
+                del counter[key]
+
+        return self
+
+    def _counters(self, other) -> list:
+        return [(self.tokens, other.tokens), (self.tokens_cleaned, other.tokens_cleaned), (self.lemmas, other.lemmas),
+                (self.lemmas_cleaned, other.lemmas_cleaned), (self.entities, other.entities), (self.pos, other.pos)]
+
+    def _is_cleaned(self, key) -> bool:
+        if key not in self._cleaned:
+            text = self.strings[key]
+            self._cleaned[key] = '\n' not in text and ' ' not in text and text not in STOP_WORDS
+        return self._cleaned[key]
+
+    def _top(self, counter, number) -> list:
+        return [(self.strings[key], count) for key, count in counter.most_common(number)]
+
+    def get_token_count(self) -> list:
+        return [('Total tokens', self.token_count)]
+
+    def get_top_tokens(self, number=10) -> list:
+        return self._top(self.tokens, number)
+
+    def get_top_tokens_cleaned(self, number=10) -> list:
+        return self._top(self.tokens_cleaned, number)
+
+    def get_named_entities(self, number=10) -> list:
+        return self.entities.most_common(number)
+
+    def get_top_lemmas(self, number=10) -> list:
+        return self._top(self.lemmas, number)
+
+    def get_top_lemmas_cleaned(self, number=10) -> list:
+        return self._top(self.lemmas_cleaned, number)
+
+    def get_pos(self) -> list:
+        return self._top(self.pos, None)
+
+
 if __name__ == '__main__':
+    from analysers.corpusRunner import CorpusRunner
+    from analysers.docCache import DocCache
+    from analysers import export
+
     # Set document to be analysed below
     print(f'Starting text to document import at {datetime.now()} ...')
     start = timer()
 
-    with open('FILENAME.txt') as f:
-        doc = nlp(f.read())
+    stats, = CorpusRunner(models.load(*ANALYSES), cache=DocCache()).run('FILENAME.txt', StatsCollector())
 
     end = timer()
     print(f'Finished text to document import at {datetime.now()}. '
           f'\nTook {end - start} seconds')
 
     # Set preferred stat file location below, if no file exists, new one will be created.
-    # NOTE: Writes over file
-    with open('FILENAME.csv', 'w+', newline='\n') as csvfile:
-        statwriter = csv.writer(csvfile, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-
-        for item in get_token_count(doc):
-            statwriter.writerow(item)
-        statwriter.writerow("")
-        statwriter.writerow(["Top tokens"])
-        for item in get_top_tokens_cleaned(doc):
-            statwriter.writerow(item)
-        statwriter.writerow("")
-        statwriter.writerow(["Top lemmas"])
-        for item in get_top_lemmas_cleaned(doc):
-            statwriter.writerow(item)
-        statwriter.writerow("")
-        statwriter.writerow(["Named entities"])
-        for item in get_named_entities(doc):
-            statwriter.writerow(item)
-        statwriter.writerow("")
-        statwriter.writerow(["POS-tags"])
-        for item in get_pos(doc):
-            statwriter.writerow(item)
-
-    print("Finished creating the file")
+    # NOTE: Writes over file, written as NDJSON if pyarrow is not installed
+    path = export.write_table('FILENAME.parquet', export.STATS, export.stats_batch(stats))
+
+    print(f"Finished creating the file {path}")
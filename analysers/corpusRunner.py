@@ -0,0 +1,163 @@
+'''
+Streams a corpus of text files through spacy in paragraph sized pieces.
+If run directly, prints basic stats and most positive/negative noun chunk roots of the corpus.
+
+Files are read line by line and split into pieces at blank lines, lines longer than a piece at white space, so no file
+is parsed as one document and nlp.max_length does not need raising. Pieces are fed to nlp.pipe with configurable
+batch_size and n_process, and each parsed piece is added to the collectors (e.g. StatsCollector, NounChunkCollector)
+before it is dropped, so memory stays bounded by the batch size regardless of corpus size. Given a DocCache, pieces
+parsed on earlier runs are loaded from disk instead of parsed again.
+
+NOTE: n_process > 1 requires spacy 2.2.2 or newer, and on spawn based platforms a __main__ guard.
+
+INPUT: Directory, glob pattern or path of text files.
+OUTPUT: Collectors updated with every document of the corpus.
+'''
+import os
+import glob
+import functools
+from timeit import default_timer as timer
+from datetime import datetime
+from common.profiling import measure
+
+# Pieces are kept at or below this many characters
+MAX_CHARS = 100000
+
+
+# Returns sorted list of file paths, for directory all .txt files under it, otherwise paths matching the glob pattern
+def corpus_files(source: str, pattern='**/*.txt') -> list:
+    if os.path.isdir(source):
+        return sorted(glob.glob(os.path.join(source, pattern), recursive=True))
+
+    return sorted(path for path in glob.glob(source, recursive=True) if os.path.isfile(path))
+
+
+# Yields pieces of a file, each one or more whole paragraphs of at most max_chars characters
+# Paragraphs longer than max_chars are split at line ends, lines longer than max_chars at white space
+def file_pieces(path: str, max_chars=MAX_CHARS, encoding='utf-8'):
+    with open(path, encoding=encoding) as f:
+        yield from line_pieces(f, max_chars)
+
+
+# Yields pieces of the lines as file_pieces does, for lines from any source
+def line_pieces(lines, max_chars=MAX_CHARS):
+    piece = []
+    size = 0
+
+    for line in split_lines(lines, max_chars):
+        if size + len(line) > max_chars and piece:
+            yield ''.join(piece)
+            piece = []
+            size = 0
+
+        piece.append(line)
+        size += len(line)
+
+        # Blank line ends the paragraph, cut here if the piece has grown to a reasonable size
+        if not line.strip() and size >= max_chars // 2:
+            yield ''.join(piece)
+            piece = []
+            size = 0
+
+    if piece:
+        yield ''.join(piece)
+
+
+# Yields the lines, those longer than max_chars cut after the last white space within max_chars, or at max_chars
+# if there is none. Lines are str or, for byte offsets as in incremental.file_blocks, UTF-8 bytes
+def split_lines(lines, max_chars):
+    for line in lines:
+        while len(line) > max_chars:
+            cut = _cut(line, max_chars)
+            yield line[:cut]
+            line = line[cut:]
+        yield line
+
+
+# Returns length of the first part of a line longer than max_chars, see split_lines
+def _cut(line, max_chars) -> int:
+    if isinstance(line, str):
+        return max(line.rfind(' ', 0, max_chars), line.rfind('\t', 0, max_chars)) + 1 or max_chars
+
+    cut = max(line.rfind(b' ', 0, max_chars), line.rfind(b'\t', 0, max_chars)) + 1 or max_chars
+    # Not inside a character, UTF-8 continuation bytes being 10xxxxxx
+    while cut > 0 and line[cut] & 0xC0 == 0x80:
+        cut -= 1
+    return cut or max_chars
+
+
+# Yields (piece, path) tuples for every piece of every file in the corpus
+def corpus_pieces(source: str, max_chars=MAX_CHARS, encoding='utf-8'):
+    for path in corpus_files(source):
+        for piece in file_pieces(path, max_chars, encoding):
+            if piece.strip():
+                yield piece, path
+
+
+# Returns (path, piece, offset) of a document from CorpusRunner.docs(), ('', 0, 0) for a document parsed otherwise
+# Token i of the document is token offset + i of the pieces of its file, so (path, offset + i) is unique in the corpus
+def doc_piece(document) -> tuple:
+    user_data = document.user_data
+    return user_data.get('path', ''), user_data.get('piece', 0), user_data.get('offset', 0)
+
+
+class CorpusRunner:
+    def __init__(self, nlp, batch_size=64, n_process=1, max_chars=MAX_CHARS, encoding='utf-8', cache=None):
+        self.nlp = nlp
+        self.cache = cache
+        self.batch_size = batch_size
+        self.n_process = n_process
+        self.max_chars = max_chars
+        self.encoding = encoding
+
+    # Yields (doc, path) tuples of the parsed corpus pieces, in corpus order
+    # With a DocCache, pieces parsed before are loaded from it instead
+    # Each doc gets its file path, the number of the piece in the file and the number of tokens in the pieces of the
+    # file before it in doc.user_data['path'], ['piece'] and ['offset'], see doc_piece()
+    def docs(self, source: str):
+        pieces = corpus_pieces(source, self.max_chars, self.encoding)
+        pipe = self.nlp.pipe if self.cache is None else functools.partial(self.cache.pipe, self.nlp)
+        kwargs = {} if self.n_process == 1 else {'n_process': self.n_process}
+
+        current, piece, offset = None, 0, 0
+        for doc, path in pipe(pieces, as_tuples=True, batch_size=self.batch_size, **kwargs):
+            if path != current:
+                current, piece, offset = path, 0, 0
+            doc.user_data.update({'path': path, 'piece': piece, 'offset': offset})
+            yield doc, path
+
+            piece += 1
+            offset += len(doc)
+
+    # Updates each collector with every document of the corpus, returns the collectors
+    def run(self, source: str, *collectors):
+        for doc, path in self.docs(source):
+            with measure('corpusRunner.collect', len(doc)):
+                for collector in collectors:
+                    collector.update(doc)
+
+        return collectors
+
+
+if __name__ == '__main__':
+    from analysers import models
+    from analysers.basicStats import StatsCollector
+    from analysers.nounChunks import NounChunkCollector
+
+    nlp = models.load('tokens', 'lemmas', 'pos', 'entities', 'noun_chunks', 'sentiment')
+
+    print(f'Starting corpus analysis at {datetime.now()} ...')
+    start = timer()
+
+    # Set corpus directory or glob pattern below
+    stats, chunks = CorpusRunner(nlp, batch_size=64, n_process=2).run('CORPUS_DIR', StatsCollector(),
+                                                                        NounChunkCollector())
+
+    end = timer()
+    print(f'Finished corpus analysis at {datetime.now()}. '
+          f'\nTook {end - start} seconds, {stats.token_count / (end - start):.0f} tokens per second')
+
+    print(stats.get_top_tokens_cleaned())
+    print(stats.get_named_entities())
+    print(chunks.get_root_mostpos())
+    print(chunks.get_root_mostneg())
@@ -0,0 +1,188 @@
+'''
+On-disk cache of parsed documents, so reruns on the same text skip the spacy parse.
+If run directly, prints cold and warm analysis times of a text file.
+
+Documents are stored as DocBin files named by a hash of the text, model name, model version and enabled pipeline
+components, so a different model or component set never gets another's parse. Files are memory-mapped when loaded.
+The cache is bounded by max_bytes, least recently used files are removed first.
+
+NOTE: DocBin requires spacy 2.2 or newer.
+
+INPUT: Spacy Language object and text.
+OUTPUT: Spacy document object, parsed or loaded from cache.
+'''
+import os
+import mmap
+import hashlib
+import itertools
+import tempfile
+import spacy
+from spacy.tokens import DocBin
+from timeit import default_timer as timer
+
+CACHE_DIR = os.environ.get('ENTITYANALYSER_CACHE',
+                           os.path.join(os.path.expanduser('~'), '.cache', 'entityAnalyser', 'docs'))
+MAX_BYTES = 2 * 1024 ** 3
+
+# Token attributes stored, enough for stats, noun chunks and entities
+ATTRS = ['ORTH', 'LEMMA', 'TAG', 'POS', 'HEAD', 'DEP', 'ENT_IOB', 'ENT_TYPE']
+SUFFIX = '.spacy'
+
+
+class DocCache:
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._size = None
+        os.makedirs(directory, exist_ok=True)
+
+    # Returns cache key of the text for the model
+    @staticmethod
+    def key(nlp, text: str) -> str:
+        meta = nlp.meta
+        digest = hashlib.sha256()
+        for part in (spacy.__version__, meta.get('lang', ''), meta.get('name', ''), meta.get('version', ''),
+                     ','.join(nlp.pipe_names)):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        digest.update(text.encode('utf-8'))
+
+        return digest.hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key + SUFFIX)
+
+    # Returns the cached document of the text, None if not cached
+    def get(self, nlp, text: str):
+        path = self.path(self.key(nlp, text))
+
+        try:
+            with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                doc_bin = DocBin(attrs=ATTRS).from_bytes(data)
+            document = next(iter(doc_bin.get_docs(nlp.vocab)))
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # Corrupt file (zlib, msgpack or empty file errors) is a miss, removed so the text is parsed again
+            self._remove(path)
+            return None
+
+        # Access time is not reliable on all file systems, modification time marks recent use instead
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # Evicted by another process since loading, the document is still good
+            pass
+
+        return document
+
+    # Stores the document of the text, removing least recently used files if the cache is over max_bytes
+    def put(self, nlp, text: str, document):
+        doc_bin = DocBin(attrs=ATTRS)
+        doc_bin.add(document)
+        data = doc_bin.to_bytes()
+
+        # Written to temporary file and renamed, so other processes never read a partial file
+        descriptor, temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(descriptor, 'wb') as f:
+            f.write(data)
+        os.replace(temporary, self.path(self.key(nlp, text)))
+
+        if self._size is not None:
+            self._size += len(data)
+        if self.size() > self.max_bytes:
+            self.evict()
+
+    # Returns the document of the text, from cache if there, otherwise parsed and cached
+    def parse(self, nlp, text: str):
+        document = self.get(nlp, text)
+        if document is None:
+            document = nlp(text)
+            self.put(nlp, text, document)
+
+        return document
+
+    # Yields documents like nlp.pipe, parsing only texts not in cache, in input order
+    # With as_tuples, texts are (text, context) tuples and (doc, context) tuples are yielded
+    def pipe(self, nlp, texts, as_tuples=False, batch_size=64, **kwargs):
+        if not as_tuples:
+            texts = ((text, None) for text in texts)
+
+        # Misses are streamed through one nlp.pipe, tee only buffers as far as nlp.pipe reads ahead
+        lookups, results = itertools.tee((text, context, self.get(nlp, text)) for text, context in texts)
+        missing = ((text, context) for text, context, document in lookups if document is None)
+        parsed = nlp.pipe(missing, as_tuples=True, batch_size=batch_size, **kwargs)
+
+        for text, context, document in results:
+            if document is None:
+                document, context = next(parsed)
+                self.put(nlp, text, document)
+
+            yield (document, context) if as_tuples else document
+
+    # Returns total size of the cached files in bytes
+    def size(self) -> int:
+        if self._size is None:
+            self._size = sum(size for path, size, used in self._files())
+        return self._size
+
+    # Removes least recently used files until the cache is within max_bytes
+    def evict(self):
+        files = sorted(self._files(), key=lambda x: x[2])
+        total = sum(size for path, size, used in files)
+
+        for path, size, used in files:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+        self._size = total
+
+    # Removes all cached files
+    def clear(self):
+        for path, size, used in self._files():
+            os.remove(path)
+        self._size = 0
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        # Recounted on next use
+        self._size = None
+
+    def _files(self) -> list:
+        files = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(SUFFIX):
+                    stat = entry.stat()
+                    files.append((entry.path, stat.st_size, stat.st_mtime))
+        return files
+
+
+if __name__ == '__main__':
+    from analysers import models
+    from analysers.basicStats import StatsCollector
+    from analysers.nounChunks import NounChunkCollector
+
+    nlp = models.load()
+    cache = DocCache(tempfile.mkdtemp())
+
+    # Set document to be analysed below
+    with open('FILENAME.txt') as f:
+        text = f.read()
+
+    for run in ('Cold', 'Warm'):
+        start = timer()
+        doc = cache.parse(nlp, text)
+        StatsCollector(doc)
+        NounChunkCollector(doc)
+        print(f'{run} analysis of {len(doc)} tokens took {timer() - start:.4f} seconds')
+
+    cache.clear()
@@ -0,0 +1,188 @@
+'''
+Sentiment of named entities, from the noun chunks they appear in and the noun chunks governing them.
+
+For each entity span of doc.ents, the context is the noun chunks overlapping the entity, and the noun chunk of the
+entity root's dependency head (or the head token itself if it is not in a noun chunk), without the entity's own
+tokens. Entities and noun chunks are both in document order, so overlaps are found by one merge-like pass over the
+two offset sorted lists instead of a nested scan, and heads are found through a token -> chunk array.
+
+EntityIndex maps (lowercase entity text, label) to the mentions and their running sentiment [sum, count], can be
+updated per document like the other collectors and merged across documents and workers. Each mention is a
+(doc_id, piece, start, end, total, count) tuple with its own sentiment sum and count; for documents of CorpusRunner
+start and end count from the start of the file and piece is the number of the corpus piece, see
+corpusRunner.doc_piece, so (doc_id, start) identifies a mention across the pieces of a file.
+
+INPUT: Spacy document objects.
+OUTPUT: Entity index with mentions and sentiment scores.
+'''
+import heapq
+import numpy
+from operator import itemgetter
+from sentiment.docSentiment import doc_polarity, doc_words
+from common.profiling import stage, second_length
+from analysers.corpusRunner import doc_piece
+
+
+class EntityEntry:
+    __slots__ = ('text', 'label', 'mentions', 'total', 'count', 'context')
+
+    def __init__(self, text: str, label: str):
+        self.text = text
+        self.label = label
+        self.mentions = []
+        self.total = 0
+        self.count = 0
+        self.context = set()
+
+    # Returns mean sentiment of the context words, 0 if there are none
+    def score(self) -> float:
+        return 0 if self.total == 0 else round(float(self.total / self.count), 4)
+
+    def merge(self, other):
+        self.mentions.extend(other.mentions)
+        self.total += other.total
+        self.count += other.count
+        self.context.update(other.context)
+        return self
+
+    def to_dict(self) -> dict:
+        return {'text': self.text, 'label': self.label, 'mentions': len(self.mentions), 'score': self.score(),
+                'total': self.total, 'count': self.count, 'context': sorted(self.context)}
+
+
+# Returns list of (entity, [chunk, ...]) pairs of the noun chunks overlapping each entity
+# Both lists must be sorted by start offset, noun chunks not overlapping each other
+def overlapping_chunks(entities, chunks) -> list:
+    pairs = []
+    first = 0
+
+    for entity in entities:
+        # Chunks ending before this entity also end before every later entity
+        while first < len(chunks) and chunks[first].end <= entity.start:
+            first += 1
+
+        overlapping = []
+        i = first
+        while i < len(chunks) and chunks[i].start < entity.end:
+            overlapping.append(chunks[i])
+            i += 1
+
+        pairs.append((entity, overlapping))
+
+    return pairs
+
+
+class EntityIndex:
+    def __init__(self, document=None):
+        self.entries = {}
+        self.documents = 0
+        self._scores = None
+
+        if document is not None:
+            self.update(document)
+
+    # Adds the entity mentions of a document, doc_id defaults to the path CorpusRunner sets or the document number
+    @stage('entitySentiment.EntityIndex.update', items=second_length)
+    def update(self, document, doc_id=None):
+        path, piece, offset = doc_piece(document)
+        if doc_id is None:
+            doc_id = path or self.documents
+        self.documents += 1
+        self._scores = None
+
+        if not document.ents:
+            return self
+
+        polarity = doc_polarity(document)
+        words = doc_words(document)
+        chunks = list(document.noun_chunks)
+
+        # Chunk number of each token, -1 for tokens outside noun chunks
+        chunk_of = numpy.full(len(document), -1, dtype=numpy.int32)
+        for number, chunk in enumerate(chunks):
+            chunk_of[chunk.start:chunk.end] = number
+
+        for entity, overlapping in overlapping_chunks(document.ents, chunks):
+            context = set()
+            for chunk in overlapping:
+                context.update(range(chunk.start, chunk.end))
+
+            head = entity.root.head
+            if not entity.start <= head.i < entity.end:
+                governing = chunk_of[head.i]
+                if governing >= 0:
+                    context.update(range(chunks[governing].start, chunks[governing].end))
+                else:
+                    context.add(head.i)
+
+            context.difference_update(range(entity.start, entity.end))
+            tokens = numpy.fromiter(sorted(context), dtype=numpy.int64, count=len(context))
+            tokens = tokens[words[tokens]]
+            values = polarity[tokens]
+
+            text = ' '.join(entity.text.split())
+            key = (text.lower(), entity.label_)
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self.entries[key] = EntityEntry(text, entity.label_)
+
+            total = int(values.sum())
+            entry.mentions.append((doc_id, piece, offset + entity.start, offset + entity.end, total, len(values)))
+            entry.total += total
+            entry.count += len(values)
+            entry.context.update(document[int(i)].lemma_.lower() or document[int(i)].lower_ for i in tokens)
+
+        return self
+
+    # Adds the entries of another index
+    def merge(self, other):
+        for key, entry in other.entries.items():
+            if key in self.entries:
+                self.entries[key].merge(entry)
+            else:
+                self.entries[key] = EntityEntry(entry.text, entry.label).merge(entry)
+
+        self.documents += other.documents
+        self._scores = None
+        return self
+
+    # Returns entries of the entity text, of any label or only the given one
+    def get(self, text: str, label=None) -> list:
+        text = ' '.join(text.split()).lower()
+        if label is not None:
+            entry = self.entries.get((text, label))
+            return [entry] if entry is not None else []
+        return [entry for (key, entry_label), entry in self.entries.items() if key == text]
+
+    # Returns dictionary of (text, label) and sentiment score of every entity, computed once until updated
+    def get_scores(self) -> dict:
+        if self._scores is None:
+            self._scores = {(entry.text, entry.label): entry.score() for entry in self.entries.values()}
+        return self._scores
+
+    # Returns as default 10 most mentioned entities and their mention counts
+    def get_most_mentioned(self, number=10) -> list:
+        return [((entry.text, entry.label), len(entry.mentions))
+                for entry in heapq.nlargest(number, self.entries.values(), key=lambda x: len(x.mentions))]
+
+    # Returns as default 10 highest sentiment score entities
+    def get_mostpos(self, number=10) -> dict:
+        return dict(heapq.nlargest(number, self.get_scores().items(), key=itemgetter(1)))
+
+    # Returns as default 10 lowest sentiment score entities
+    def get_mostneg(self, number=10) -> dict:
+        return dict(heapq.nsmallest(number, self.get_scores().items(), key=itemgetter(1)))
+
+
+if __name__ == '__main__':
+    from analysers import models
+    from analysers.corpusRunner import CorpusRunner
+    from analysers.docCache import DocCache
+
+    # Set document or corpus to be analysed below
+    nlp = models.load('entities', 'noun_chunks', 'sentiment')
+    index, = CorpusRunner(nlp, cache=DocCache()).run('FILENAME.txt', EntityIndex())
+
+    print(index.get_most_mentioned())
+    print(index.get_mostpos())
+    print(index.get_mostneg())
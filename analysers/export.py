@@ -0,0 +1,260 @@
+'''
+Columnar export of noun chunks, token sentiment, root scores and stats tables.
+
+Results are turned into typed column batches (dict of column lists per the table schema) and written in chunks
+as they are produced, so full result lists never need to sit in memory. Parquet (.parquet) and Arrow IPC
+(.arrow, .feather) files are written with pyarrow, NDJSON (.ndjson, .jsonl) is written with the standard library
+and used as fallback when pyarrow is not installed. Parquet and Arrow files can be read to pandas DataFrames
+memory-mapped, without copying numeric columns.
+
+ExportCollector can be given to CorpusRunner.run like the other collectors, to write chunks of a streamed corpus.
+Token positions (start, end, chunk_start) count from the start of the source file, not of the corpus piece, and
+piece is the number of the piece within the file, so (source, start) identifies a noun chunk across the corpus and
+joins token sentiment rows on (source, chunk_start).
+
+INPUT: Spacy document objects, StatsCollector, NounChunkCollector.
+OUTPUT: Parquet, Arrow or NDJSON files, or pandas DataFrame.
+'''
+import os
+import json
+import warnings
+from sentiment.docSentiment import doc_polarity, doc_words
+from common.profiling import measure
+from analysers.corpusRunner import doc_piece
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet as parquet
+except ImportError:
+    pyarrow = None
+    parquet = None
+
+# Column names and types of each table, types are pyarrow type names
+NOUN_CHUNKS = (('source', 'string'), ('piece', 'int32'), ('start', 'int32'), ('end', 'int32'), ('chunk', 'string'),
+               ('root', 'string'), ('root_lemma', 'string'))
+TOKEN_SENTIMENT = (('source', 'string'), ('piece', 'int32'), ('chunk_start', 'int32'), ('token', 'string'),
+                   ('lemma', 'string'), ('sentiment', 'int8'))
+ROOT_SCORES = (('root', 'string'), ('score', 'float64'), ('total', 'int32'), ('count', 'int32'))
+STATS = (('table', 'string'), ('key', 'string'), ('count', 'int64'))
+
+FORMATS = {'.parquet': 'parquet', '.arrow': 'arrow', '.feather': 'arrow', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}
+
+# Rows buffered before a batch is written
+BATCH_ROWS = 65536
+
+
+# Returns empty column batch for the schema
+def new_batch(schema) -> dict:
+    return {name: [] for name, kind in schema}
+
+
+# Returns column batch of the noun chunks of a document, offset being the token position of the document in source
+def noun_chunk_batch(document, source='', piece=0, offset=0) -> dict:
+    batch = new_batch(NOUN_CHUNKS)
+
+    for item in document.noun_chunks:
+        batch['source'].append(source)
+        batch['piece'].append(piece)
+        batch['start'].append(offset + item.start)
+        batch['end'].append(offset + item.end)
+        batch['chunk'].append(item.text)
+        batch['root'].append(item.root.text)
+        batch['root_lemma'].append(item.root.lemma_)
+
+    return batch
+
+
+# Returns column batch of the sentiment of every word token in the noun chunks of a document, offset as above
+def token_sentiment_batch(document, source='', piece=0, offset=0) -> dict:
+    batch = new_batch(TOKEN_SENTIMENT)
+    polarity = doc_polarity(document).tolist()
+    words = doc_words(document)
+
+    for item in document.noun_chunks:
+        for token in item:
+            if words[token.i]:
+                batch['source'].append(source)
+                batch['piece'].append(piece)
+                batch['chunk_start'].append(offset + item.start)
+                batch['token'].append(token.text)
+                batch['lemma'].append(token.lemma_)
+                batch['sentiment'].append(polarity[token.i])
+
+    return batch
+
+
+# Returns column batch of the root sentiment scores of a NounChunkCollector
+def root_scores_batch(collector) -> dict:
+    batch = new_batch(ROOT_SCORES)
+    scores = collector.get_root_sentiment_score()
+
+    for root, (total, count) in collector.root_sentiment.items():
+        batch['root'].append(root)
+        batch['score'].append(float(scores[root]))
+        batch['total'].append(total)
+        batch['count'].append(count)
+
+    return batch
+
+
+# Returns column batch of the StatsCollector tables, the same sections as the csv report of basicStats
+def stats_batch(stats, number=10) -> dict:
+    batch = new_batch(STATS)
+    tables = (('Total tokens', stats.get_token_count()),
+              ('Top tokens', stats.get_top_tokens_cleaned(number)),
+              ('Top lemmas', stats.get_top_lemmas_cleaned(number)),
+              ('Named entities', stats.get_named_entities(number)),
+              ('POS-tags', stats.get_pos()))
+
+    for table, rows in tables:
+        for key, count in rows:
+            batch['table'].append(table)
+            batch['key'].append(key)
+            batch['count'].append(count)
+
+    return batch
+
+
+class ExportWriter:
+    def __init__(self, path: str, schema, file_format=None, batch_rows=BATCH_ROWS):
+        self.schema = schema
+        self.batch_rows = batch_rows
+        self.format = file_format or FORMATS.get(os.path.splitext(path)[1].lower(), 'ndjson')
+        self.rows = 0
+
+        if self.format != 'ndjson' and pyarrow is None:
+            warnings.warn(f'pyarrow is not installed, writing {self.format} export {path} as NDJSON')
+            self.format = 'ndjson'
+            path = os.path.splitext(path)[0] + '.ndjson'
+
+        self.path = path
+        self._buffer = new_batch(schema)
+        self._buffered = 0
+        self._file = None
+        self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # Adds column batch, written to file once batch_rows rows are buffered
+    def write(self, batch: dict):
+        rows = len(batch[self.schema[0][0]])
+        if rows == 0:
+            return
+
+        for name, kind in self.schema:
+            self._buffer[name].extend(batch[name])
+        self._buffered += rows
+
+        if self._buffered >= self.batch_rows:
+            self.flush()
+
+    def flush(self):
+        if self._buffered == 0:
+            return
+
+        with measure('export.' + self.format, self._buffered):
+            if self.format == 'ndjson':
+                self._write_ndjson(self._buffer)
+            else:
+                self._write_arrow(self._buffer)
+
+        self.rows += self._buffered
+        self._buffer = new_batch(self.schema)
+        self._buffered = 0
+
+    def close(self):
+        self.flush()
+
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write_ndjson(self, batch: dict):
+        if self._file is None:
+            self._file = open(self.path, 'w', encoding='utf-8')
+
+        names = [name for name, kind in self.schema]
+        for row in zip(*(batch[name] for name in names)):
+            self._file.write(json.dumps(dict(zip(names, row)), ensure_ascii=False))
+            self._file.write('\n')
+
+    def _write_arrow(self, batch: dict):
+        record_batch = to_record_batch(batch, self.schema)
+
+        if self._writer is None:
+            if self.format == 'parquet':
+                self._writer = parquet.ParquetWriter(self.path, record_batch.schema)
+            else:
+                self._file = pyarrow.OSFile(self.path, 'wb')
+                self._writer = pyarrow.ipc.new_file(self._file, record_batch.schema)
+
+        if self.format == 'parquet':
+            self._writer.write_table(pyarrow.Table.from_batches([record_batch]))
+        else:
+            self._writer.write_batch(record_batch)
+
+
+# Returns pyarrow schema of the table schema
+def arrow_schema(schema):
+    return pyarrow.schema([(name, getattr(pyarrow, kind)()) for name, kind in schema])
+
+
+# Returns pyarrow RecordBatch of the column batch
+def to_record_batch(batch: dict, schema):
+    target = arrow_schema(schema)
+    return pyarrow.RecordBatch.from_arrays([pyarrow.array(batch[name], type=target.field(name).type)
+                                            for name, kind in schema], schema=target)
+
+
+# Writes a single column batch to the path, e.g. the stats or root score tables
+def write_table(path: str, schema, batch: dict) -> str:
+    with ExportWriter(path, schema) as writer:
+        writer.write(batch)
+    return writer.path
+
+
+# Returns pandas DataFrame of an export file or a column batch
+# Parquet and Arrow files are memory-mapped, numeric columns without nulls are not copied
+def to_pandas(source, schema=None):
+    if isinstance(source, dict):
+        table = pyarrow.Table.from_batches([to_record_batch(source, schema)])
+    elif source.endswith('.ndjson') or source.endswith('.jsonl'):
+        import pandas
+        return pandas.read_json(source, lines=True)
+    elif source.endswith('.parquet'):
+        table = parquet.read_table(source, memory_map=True)
+    else:
+        table = pyarrow.ipc.open_file(pyarrow.memory_map(source)).read_all()
+
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+# Collector writing noun chunks and their token sentiment of every document given to update()
+# Source, piece and token offsets are those CorpusRunner sets in doc.user_data, if any, see corpusRunner.doc_piece
+class ExportCollector:
+    def __init__(self, directory: str, file_format='parquet', batch_rows=BATCH_ROWS):
+        os.makedirs(directory, exist_ok=True)
+        extension = {'parquet': '.parquet', 'arrow': '.arrow', 'ndjson': '.ndjson'}[file_format]
+
+        self.noun_chunks = ExportWriter(os.path.join(directory, 'noun_chunks' + extension), NOUN_CHUNKS,
+                                        batch_rows=batch_rows)
+        self.token_sentiment = ExportWriter(os.path.join(directory, 'token_sentiment' + extension), TOKEN_SENTIMENT,
+                                            batch_rows=batch_rows)
+
+    def update(self, document):
+        source, piece, offset = doc_piece(document)
+        self.noun_chunks.write(noun_chunk_batch(document, source, piece, offset))
+        self.token_sentiment.write(token_sentiment_batch(document, source, piece, offset))
+        return self
+
+    def close(self):
+        self.noun_chunks.close()
+        self.token_sentiment.close()
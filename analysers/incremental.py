@@ -0,0 +1,199 @@
+'''
+Incremental analysis of text files that grow or are edited, so a small change is not a full re-parse.
+If run directly, analyses a file twice and prints the time of the second, unchanged or appended, run.
+
+Files are split into blocks of whole paragraphs. A block ends at a blank line when the hash of the paragraph before
+it says so, not at a fixed size, so an edit moves the block boundaries only near the edit and the blocks after it
+keep their fingerprints. Each block keeps its byte offsets, a fingerprint of its bytes, and its own StatsCollector
+and NounChunkCounter. On update only blocks with new fingerprints are parsed, their counts added to the totals and
+the counts of blocks no longer in the file subtracted, so the work is in proportion to the change.
+
+Unchanged files (same size and modification time) are not read at all. With append_only=True a grown file is read
+from the start of its last block only, trusting the bytes before it have not changed, e.g. for logs and feeds;
+if the last block no longer matches its fingerprint, the whole file is read instead.
+
+INPUT: Text files.
+OUTPUT: StatsCollector and NounChunkCounter of the current file contents.
+'''
+import os
+import zlib
+import hashlib
+import functools
+from timeit import default_timer as timer
+from datetime import datetime
+from analysers.basicStats import StatsCollector
+from analysers.nounChunks import NounChunkCounter
+from analysers.corpusRunner import corpus_files, split_lines
+from common.profiling import measure
+
+# Blocks are kept at or below this many bytes, longer lines are cut at white space as corpusRunner.split_lines does
+MAX_BLOCK_BYTES = 20000
+# About one in BLOCK_SPREAD paragraph ends is a block end
+BLOCK_SPREAD = 8
+
+
+class Block:
+    __slots__ = ('start', 'end', 'fingerprint', 'stats', 'chunks')
+
+    def __init__(self, start: int, end: int, fingerprint: bytes):
+        self.start = start
+        self.end = end
+        self.fingerprint = fingerprint
+        self.stats = None
+        self.chunks = None
+
+
+class FileState:
+    __slots__ = ('size', 'mtime', 'blocks')
+
+    def __init__(self):
+        self.size = -1
+        self.mtime = -1
+        self.blocks = []
+
+
+def fingerprint(data: bytes) -> bytes:
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+# Returns list of (start, end) byte offsets of the blocks of the data, offset added to each
+def file_blocks(data: bytes, offset=0, max_bytes=MAX_BLOCK_BYTES) -> list:
+    blocks = []
+    start = 0
+    position = 0
+    paragraph = 0
+
+    for line in split_lines(data.splitlines(keepends=True), max_bytes):
+        if position - start + len(line) > max_bytes and position > start:
+            blocks.append((start + offset, position + offset))
+            start = position
+
+        position += len(line)
+        paragraph = zlib.crc32(line, paragraph)
+
+        if not line.strip():
+            if paragraph % BLOCK_SPREAD == 0:
+                blocks.append((start + offset, position + offset))
+                start = position
+            paragraph = 0
+
+    if position > start:
+        blocks.append((start + offset, position + offset))
+
+    return blocks
+
+
+class IncrementalAnalyser:
+    def __init__(self, nlp, cache=None, append_only=False, batch_size=64, encoding='utf-8'):
+        self.nlp = nlp
+        self.cache = cache
+        self.append_only = append_only
+        self.batch_size = batch_size
+        self.encoding = encoding
+        self.files = {}
+        self.stats = StatsCollector()
+        self.chunks = NounChunkCounter()
+
+    # Brings the totals up to date with the file, returns number of blocks parsed and removed
+    def update(self, path: str) -> tuple:
+        status = os.stat(path)
+        state = self.files.setdefault(path, FileState())
+        if status.st_size == state.size and status.st_mtime_ns == state.mtime:
+            return 0, 0
+
+        kept, offset = [], 0
+        with open(path, 'rb') as f:
+            if self.append_only and state.blocks and status.st_size >= state.size:
+                last = state.blocks[-1]
+                f.seek(last.start)
+                data = f.read()
+                if fingerprint(data[:last.end - last.start]) == last.fingerprint:
+                    kept, offset = state.blocks[:-1], last.start
+                else:
+                    f.seek(0)
+                    data = f.read()
+            else:
+                data = f.read()
+
+        # Old blocks are reused by fingerprint, wherever they have moved in the file
+        old = {}
+        for block in state.blocks[len(kept):]:
+            old.setdefault(block.fingerprint, []).append(block)
+
+        blocks, parse = list(kept), []
+        for start, end in file_blocks(data, offset):
+            piece = data[start - offset:end - offset]
+            key = fingerprint(piece)
+            if old.get(key):
+                block = old[key].pop()
+                block.start, block.end = start, end
+            else:
+                block = Block(start, end, key)
+                parse.append((block, piece))
+            blocks.append(block)
+
+        removed = [block for same in old.values() for block in same]
+        for block in removed:
+            self._subtract(block)
+        self._parse(parse, path)
+
+        state.blocks = blocks
+        state.size, state.mtime = status.st_size, status.st_mtime_ns
+        return len(parse), len(removed)
+
+    # Takes the blocks of a file off the totals
+    def remove(self, path: str):
+        state = self.files.pop(path, None)
+        if state is not None:
+            for block in state.blocks:
+                self._subtract(block)
+
+    # Updates every file of the corpus and removes files no longer in it, returns the analyser
+    def run(self, source: str):
+        paths = corpus_files(source)
+        for path in set(self.files).difference(paths):
+            self.remove(path)
+        for path in paths:
+            self.update(path)
+
+        return self
+
+    def _parse(self, parse: list, path: str):
+        texts = ((piece.decode(self.encoding), block) for block, piece in parse if piece.strip())
+        pipe = self.nlp.pipe if self.cache is None else functools.partial(self.cache.pipe, self.nlp)
+
+        for doc, block in pipe(texts, as_tuples=True, batch_size=self.batch_size):
+            doc.user_data['path'] = path
+            with measure('incremental.collect', len(doc)):
+                block.stats = StatsCollector()
+                # Cleaned token decisions depend on the text only, one cache serves all blocks
+                block.stats._cleaned = self.stats._cleaned
+                block.stats.update(doc)
+                block.chunks = NounChunkCounter(doc)
+
+            self.stats.merge(block.stats)
+            self.chunks.merge(block.chunks)
+
+    def _subtract(self, block: Block):
+        if block.stats is not None:
+            self.stats.subtract(block.stats)
+            self.chunks.subtract(block.chunks)
+
+
+if __name__ == '__main__':
+    from analysers import models
+
+    nlp = models.load('tokens', 'lemmas', 'pos', 'entities', 'noun_chunks', 'sentiment')
+    analyser = IncrementalAnalyser(nlp, append_only=True)
+
+    # Set file to be analysed below
+    for run in ('first', 'second'):
+        print(f'Starting {run} analysis at {datetime.now()} ...')
+        start = timer()
+        parsed, removed = analyser.update('FILENAME.txt')
+        end = timer()
+        print(f'Finished {run} analysis at {datetime.now()}. '
+              f'\nTook {end - start} seconds, {parsed} blocks parsed, {removed} removed')
+
+    print(analyser.stats.get_top_tokens_cleaned())
+    print(analyser.chunks.get_root_mostpos())
@@ -0,0 +1,428 @@
+'''
+Map-reduce basic stats of a corpus over a process pool, for corpora too big for one process to count in time.
+If run directly, prints the top tokens, lemmas, named entities and POS-tags of the corpus.
+
+Files are cut into shards of about shard_bytes bytes at paragraph ends, or at line ends where no paragraph ends within
+shard_bytes, e.g. in logs, so a single large file is spread over the workers too. Each worker loads the model once and
+counts its shards with StatsCollector, returning the full count tables (tokens, cleaned tokens, lemmas, cleaned lemmas,
+named entities, POS-tags) as sorted arrays of string hashes, counts and first occurrences, the strings packed into one
+buffer, so results pickle compactly. The reducer merges them in batches.
+
+Exact mode keeps every count, CountTables. For vocabularies too big for the reducer's memory, approximate mode,
+SketchTables, keeps per table a Space-Saving summary of the capacity most frequent keys, counts overestimated by at
+most total / capacity, and a Count-Min sketch that tightens the estimates of the reported keys. Both report top N as
+StatsCollector does, so they can be exported with export.stats_batch. CountTables breaks ties by first occurrence in
+the corpus as StatsCollector does, SketchTables by string hash.
+
+Mapping is most of the work and shards are independent, so throughput grows about linearly with workers.
+
+INPUT: Directory, glob pattern or path of text files.
+OUTPUT: CountTables or SketchTables of the whole corpus.
+'''
+import os
+import re
+import argparse
+import functools
+import numpy
+from concurrent.futures import ProcessPoolExecutor
+from timeit import default_timer as timer
+from datetime import datetime
+from spacy.strings import hash_string
+from analysers.basicStats import StatsCollector, ANALYSES
+from analysers.corpusRunner import corpus_files, line_pieces, MAX_CHARS
+from common.profiling import measure
+
+TABLES = ('tokens', 'tokens_cleaned', 'lemmas', 'lemmas_cleaned', 'entities', 'pos')
+
+SHARD_BYTES = 4 * 1024 ** 2
+# First occurrences are numbered by shard in the high bits, by position in the shard's counts in the low bits
+SHARD_SHIFT = 32
+# Blank line, a line end followed by a line of white space only
+BLANK_LINE = re.compile(rb'\n[^\S\n]*\n')
+# Number of worker results merged at once in exact mode
+REDUCE_BATCH = 16
+
+# Space-Saving capacity and Count-Min sketch width (a power of two) and depth, per table
+CAPACITY = 10000
+WIDTH = 2 ** 16
+DEPTH = 4
+
+# Model of the worker process, loaded by _init_worker
+_nlp = None
+
+
+def _init_worker(size: str):
+    global _nlp
+    if size == 'blank':
+        import spacy
+        _nlp = spacy.blank('en')
+    else:
+        from analysers import models
+        _nlp = models.load(*ANALYSES, size=size)
+
+
+# Returns the keys sorted and unique with their counts summed and the earliest of their first occurrences
+def _sum_by_key(keys, counts, firsts) -> tuple:
+    if len(keys) == 0:
+        return numpy.zeros(0, dtype=numpy.uint64), numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.int64)
+
+    order = numpy.argsort(keys, kind='stable')
+    keys, counts, firsts = keys[order], counts[order], firsts[order]
+    starts = numpy.flatnonzero(numpy.concatenate(([True], keys[1:] != keys[:-1])))
+
+    return keys[starts], numpy.add.reduceat(counts, starts), numpy.minimum.reduceat(firsts, starts)
+
+
+# Returns values of the query keys from sorted keys and their values, default for keys not found
+def _lookup(keys, values, query, default=0) -> numpy.ndarray:
+    if len(keys) == 0:
+        return numpy.full(len(query), default, dtype=numpy.int64)
+
+    index = numpy.searchsorted(keys, query)
+    index[index == len(keys)] = 0
+    return numpy.where(keys[index] == query, values[index], default)
+
+
+# Returns (keys, utf-8 buffer, offsets) of a key -> string dictionary, see _unpack_strings
+def _pack_strings(strings: dict) -> tuple:
+    keys = numpy.fromiter(strings.keys(), dtype=numpy.uint64, count=len(strings))
+    encoded = [text.encode('utf-8') for text in strings.values()]
+    offsets = numpy.zeros(len(encoded) + 1, dtype=numpy.int64)
+    numpy.cumsum([len(data) for data in encoded], out=offsets[1:])
+
+    return keys, b''.join(encoded), offsets
+
+
+def _unpack_strings(keys, data: bytes, offsets) -> dict:
+    offsets = offsets.tolist()
+    return {key: data[offsets[i]:offsets[i + 1]].decode('utf-8') for i, key in enumerate(keys.tolist())}
+
+
+# Top N reports of the count tables as StatsCollector gives them, mixed into classes with top(name, number) and strings
+class StatsTables:
+    def get_token_count(self) -> list:
+        return [('Total tokens', self.token_count)]
+
+    def get_top_tokens(self, number=10) -> list:
+        return self.top('tokens', number)
+
+    def get_top_tokens_cleaned(self, number=10) -> list:
+        return self.top('tokens_cleaned', number)
+
+    def get_named_entities(self, number=10) -> list:
+        return self.top('entities', number)
+
+    def get_top_lemmas(self, number=10) -> list:
+        return self.top('lemmas', number)
+
+    def get_top_lemmas_cleaned(self, number=10) -> list:
+        return self.top('lemmas_cleaned', number)
+
+    def get_pos(self) -> list:
+        return self.top('pos', None)
+
+    # Returns (string, count) pairs of the keys in descending count order, ties in ascending order of ties
+    def _pairs(self, keys, counts, ties, number) -> list:
+        order = numpy.lexsort((ties, -counts))
+        if number is not None:
+            order = order[:number]
+        return [(self.strings[key], count) for key, count in zip(keys[order].tolist(), counts[order].tolist())]
+
+
+# Exact count tables, each sorted array of string hashes, their counts and first occurrences
+class CountTables(StatsTables):
+    def __init__(self, token_count=0, tables=None, strings=None):
+        self.token_count = token_count
+        self.tables = tables if tables is not None else {name: _sum_by_key([], [], []) for name in TABLES}
+        self.strings = strings if strings is not None else {}
+
+    # Returns count tables of the collector, first occurrences numbered after the shard number, so tables of
+    # shards merged in any order break ties by first occurrence in the corpus
+    @classmethod
+    def from_collector(cls, stats: StatsCollector, shard=0):
+        tables = {}
+        strings = {}
+
+        for name in TABLES:
+            counter = getattr(stats, name)
+            if name == 'entities':
+                # Entities are counted by text, hashed here as the other tables are
+                hashed = {}
+                for text, count in counter.items():
+                    key = hash_string(text)
+                    strings[key] = text
+                    hashed[key] = count
+                counter = hashed
+            else:
+                strings.update((key, stats.strings[key]) for key in counter if key not in strings)
+
+            keys = numpy.fromiter(counter.keys(), dtype=numpy.uint64, count=len(counter))
+            counts = numpy.fromiter(counter.values(), dtype=numpy.int64, count=len(counter))
+            # Counters keep their keys in order of first occurrence
+            firsts = numpy.arange(len(counter), dtype=numpy.int64) + (shard << SHARD_SHIFT)
+            tables[name] = _sum_by_key(keys, counts, firsts)
+
+        return cls(stats.token_count, tables, strings)
+
+    # Adds the counts of the other tables, all merged at once
+    def merge(self, *others):
+        with measure('mapReduce.merge', len(others)):
+            for name in TABLES:
+                keys = numpy.concatenate([self.tables[name][0]] + [other.tables[name][0] for other in others])
+                counts = numpy.concatenate([self.tables[name][1]] + [other.tables[name][1] for other in others])
+                firsts = numpy.concatenate([self.tables[name][2]] + [other.tables[name][2] for other in others])
+                self.tables[name] = _sum_by_key(keys, counts, firsts)
+
+            for other in others:
+                self.token_count += other.token_count
+                self.strings.update(other.strings)
+
+        return self
+
+    def top(self, name: str, number) -> list:
+        keys, counts, firsts = self.tables[name]
+        return self._pairs(keys, counts, firsts, number)
+
+    def __getstate__(self):
+        return {'token_count': self.token_count, 'tables': self.tables, 'strings': _pack_strings(self.strings)}
+
+    def __setstate__(self, state):
+        self.token_count = state['token_count']
+        self.tables = state['tables']
+        self.strings = _unpack_strings(*state['strings'])
+
+
+# Space-Saving summary of the most frequent keys, mergeable as in Agarwal et al. "Mergeable summaries" (2012)
+# Each kept count overestimates the true count by at most its error, and the error is at most total / capacity
+class SpaceSaving:
+    __slots__ = ('capacity', 'keys', 'counts', 'errors')
+
+    def __init__(self, capacity=CAPACITY):
+        self.capacity = capacity
+        self.keys = numpy.zeros(0, dtype=numpy.uint64)
+        self.counts = numpy.zeros(0, dtype=numpy.int64)
+        self.errors = numpy.zeros(0, dtype=numpy.int64)
+
+    # Returns the count a key not kept may have, the smallest kept count once the summary is full
+    def floor(self) -> int:
+        return int(self.counts.min()) if len(self.keys) >= self.capacity else 0
+
+    # Adds sorted keys and their counts, exact counts or those of another summary with its errors and floor
+    def merge(self, keys, counts, errors=None, floor=0):
+        own = self.floor()
+        union = numpy.union1d(self.keys, keys)
+        if errors is None:
+            errors = numpy.zeros(len(keys), dtype=numpy.int64)
+
+        total = _lookup(self.keys, self.counts, union, own) + _lookup(keys, counts, union, floor)
+        error = _lookup(self.keys, self.errors, union, own) + _lookup(keys, errors, union, floor)
+
+        if len(union) > self.capacity:
+            kept = numpy.sort(numpy.argpartition(-total, self.capacity - 1)[:self.capacity])
+            union, total, error = union[kept], total[kept], error[kept]
+
+        self.keys, self.counts, self.errors = union, total, error
+        return self
+
+    def merge_summary(self, other):
+        return self.merge(other.keys, other.counts, other.errors, other.floor())
+
+
+# Count-Min sketch of counts by key, estimates never below the true count, width a power of two
+class CountMinSketch:
+    __slots__ = ('width', 'depth', 'seed', 'table', 'multipliers', '_shift')
+
+    def __init__(self, width=WIDTH, depth=DEPTH, seed=0):
+        if width < 2 or width & (width - 1):
+            raise ValueError(f'Width must be a power of two, not {width}')
+
+        self.width = width
+        self.depth = depth
+        self.seed = seed
+        self.table = numpy.zeros((depth, width), dtype=numpy.int64)
+        # Multiply-shift hashing with odd multipliers, one per row
+        self.multipliers = numpy.random.RandomState(seed).randint(1, 2 ** 63, size=depth, dtype=numpy.uint64) | 1
+        self._shift = numpy.uint64(64 - (width.bit_length() - 1))
+
+    def _columns(self, keys) -> numpy.ndarray:
+        keys = numpy.asarray(keys, dtype=numpy.uint64)
+        return ((keys[None, :] * self.multipliers[:, None]) >> self._shift).astype(numpy.intp)
+
+    def update(self, keys, counts):
+        columns = self._columns(keys)
+        for row in range(self.depth):
+            numpy.add.at(self.table[row], columns[row], counts)
+        return self
+
+    def merge(self, other):
+        if (other.width, other.depth, other.seed) != (self.width, self.depth, self.seed):
+            raise ValueError('Only sketches of the same width, depth and seed can be merged')
+        self.table += other.table
+        return self
+
+    def estimate(self, keys) -> numpy.ndarray:
+        columns = self._columns(keys)
+        return self.table[numpy.arange(self.depth)[:, None], columns].min(axis=0)
+
+
+# Approximate count tables in bounded memory, strings kept only for the summarised keys
+class SketchTables(StatsTables):
+    def __init__(self, capacity=CAPACITY, width=WIDTH, depth=DEPTH, seed=0):
+        self.token_count = 0
+        self.summaries = {name: SpaceSaving(capacity) for name in TABLES}
+        self.sketches = {name: CountMinSketch(width, depth, seed) for name in TABLES}
+        self.strings = {}
+
+    # Adds exact CountTables, e.g. of one shard
+    def merge(self, tables: CountTables):
+        with measure('mapReduce.merge', 1):
+            self.token_count += tables.token_count
+            for name in TABLES:
+                keys, counts, firsts = tables.tables[name]
+                self.summaries[name].merge(keys, counts)
+                self.sketches[name].update(keys, counts)
+
+            self.strings.update(tables.strings)
+            kept = set()
+            for summary in self.summaries.values():
+                kept.update(summary.keys.tolist())
+            self.strings = {key: self.strings[key] for key in kept}
+
+        return self
+
+    # Returns (string, count) pairs of the top keys, counts the smaller of the summary and sketch estimates
+    # First occurrences are not kept, so ties are by key
+    def top(self, name: str, number) -> list:
+        summary = self.summaries[name]
+        counts = numpy.minimum(summary.counts, self.sketches[name].estimate(summary.keys))
+        return self._pairs(summary.keys, counts, summary.keys, number)
+
+
+# Returns list of (path, start, end) byte ranges of about shard_bytes of the corpus files
+def corpus_shards(source: str, shard_bytes=SHARD_BYTES) -> list:
+    shards = []
+
+    for path in corpus_files(source):
+        size = os.path.getsize(path)
+        for start in range(0, max(size, 1), shard_bytes):
+            shards.append((path, start, min(start + shard_bytes, size)))
+
+    return shards
+
+
+# Returns the position after the first blank line at or after offset, searched within window bytes. Where there is
+# none, e.g. in logs, the position after the first line end, then after the first white space, then the offset
+# moved to the next character start. Neighbouring shards find the same position for their shared offset, so every
+# byte is in exactly one shard.
+def _paragraph_start(f, offset: int, window=SHARD_BYTES) -> int:
+    if offset == 0:
+        return 0
+
+    f.seek(offset - 1)
+    data = f.read(window + 1)
+    if len(data) <= 1:
+        return offset
+
+    match = BLANK_LINE.search(data)
+    if match:
+        return offset - 1 + match.end()
+
+    for separator in (b'\n', b' ', b'\t'):
+        position = data.find(separator)
+        if position >= 0:
+            return offset + position
+
+    # UTF-8 continuation bytes start with bits 10
+    position = 1
+    while position < len(data) and data[position] & 0xC0 == 0x80:
+        position += 1
+    return offset - 1 + position
+
+
+# Yields the lines of the paragraphs of the shard, a line longer than the shard cut at the shard's end
+def shard_lines(path: str, start: int, end: int, encoding='utf-8', window=SHARD_BYTES):
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        stop = _paragraph_start(f, end, window) if end < size else size
+        position = _paragraph_start(f, start, window)
+        f.seek(position)
+
+        while position < stop:
+            line = f.readline(stop - position)
+            position += len(line)
+            yield line.decode(encoding)
+
+
+# Returns the count tables of a shard, counted in the worker with its model, shard number as in corpus order
+def map_shard(shard: tuple, number=0, max_chars=MAX_CHARS, encoding='utf-8', batch_size=64,
+              window=SHARD_BYTES) -> CountTables:
+    path, start, end = shard
+    stats = StatsCollector()
+    lines = shard_lines(path, start, end, encoding, window)
+    pieces = (piece for piece in line_pieces(lines, max_chars) if piece.strip())
+
+    for doc in _nlp.pipe(pieces, batch_size=batch_size):
+        stats.update(doc)
+
+    return CountTables.from_collector(stats, number)
+
+
+# Returns the stats of the corpus, CountTables or with approximate SketchTables
+# With workers=0 shards are counted in this process, e.g. for testing with the blank pipeline
+def map_reduce(source: str, size='lg', workers=None, approximate=False, capacity=CAPACITY, width=WIDTH,
+               depth=DEPTH, shard_bytes=SHARD_BYTES, max_chars=MAX_CHARS, encoding='utf-8', batch_size=64):
+    shards = corpus_shards(source, shard_bytes)
+    mapper = functools.partial(map_shard, max_chars=max_chars, encoding=encoding, batch_size=batch_size,
+                               window=shard_bytes)
+    result = SketchTables(capacity, width, depth) if approximate else CountTables()
+    pending = []
+
+    def reduce(tables):
+        if approximate:
+            result.merge(tables)
+            return
+        pending.append(tables)
+        if len(pending) >= REDUCE_BATCH:
+            result.merge(*pending)
+            pending.clear()
+
+    if workers == 0:
+        _init_worker(size)
+        for tables in map(mapper, shards, range(len(shards))):
+            reduce(tables)
+    else:
+        with ProcessPoolExecutor(workers or os.cpu_count(), initializer=_init_worker, initargs=(size,)) as executor:
+            for tables in executor.map(mapper, shards, range(len(shards))):
+                reduce(tables)
+
+    if pending:
+        result.merge(*pending)
+
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Count basic stats of a corpus over a process pool.')
+    parser.add_argument('source', help='directory, glob pattern or path of text files')
+    parser.add_argument('--size', default='lg', help='sm, md, lg or blank')
+    parser.add_argument('--workers', type=int, help='worker processes, default one per core, 0 for this process')
+    parser.add_argument('--approximate', action='store_true', help='bounded memory sketches instead of exact counts')
+    parser.add_argument('--capacity', type=int, default=CAPACITY, help='keys kept per table when approximate')
+    parser.add_argument('--shard-bytes', type=int, default=SHARD_BYTES)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    print(f'Starting corpus analysis at {datetime.now()} ...')
+    start = timer()
+
+    stats = map_reduce(args.source, args.size, args.workers, args.approximate, args.capacity,
+                       shard_bytes=args.shard_bytes)
+
+    end = timer()
+    print(f'Finished corpus analysis at {datetime.now()}. '
+          f'\nTook {end - start} seconds, {stats.token_count / (end - start):.0f} tokens per second')
+
+    print(stats.get_top_tokens_cleaned(args.top))
+    print(stats.get_top_lemmas_cleaned(args.top))
+    print(stats.get_named_entities(args.top))
+    print(stats.get_pos())
@@ -0,0 +1,168 @@
+'''
+Lazily loaded spacy models shared by the analysers.
+If run directly, prints import and model load times for the analyses.
+
+Models are loaded on first use, not on import, and only with the pipeline components the requested analyses need, e.g.
+get_named_entities needs ner only and noun_chunks needs tagger, parser and in spacy 3 their tok2vec. Each model and
+component set is loaded once per process and shared between basicStats, nounChunks and any other caller. There is one
+loaded copy of each model, vectors included. Spacy 3 loads the components not needed yet as disabled ones, which are
+enabled in the loaded copy when an analysis needs them; spacy 2 cannot load a component later, so there the whole
+pipeline is loaded on first use. Callers get a view of the shared copy that runs only the components their analyses
+need, sharing its vocab, tokenizer and component weights.
+
+Components of the shared copy are wrapped for profiling once, when loaded, so every view of it records component
+times whenever profiling is on, however long before the view was made (see common.profiling).
+
+Model size can be chosen per call or for the process with set_default_size() or ENTITYANALYSER_MODEL environment
+variable, consider sm or md if en_core_web_lg takes too long to load in your set up.
+
+INPUT: Model size and names of analyses.
+OUTPUT: Spacy Language object.
+'''
+import os
+import copy
+import spacy
+from common import profiling
+from timeit import default_timer as timer
+
+MODELS = {'sm': 'en_core_web_sm',
+          'md': 'en_core_web_md',
+          'lg': 'en_core_web_lg'}
+
+# Pipeline components needed by each analysis, tokenizer is always run. In spacy 3 models tagger and parser listen
+# to the shared tok2vec, attribute_ruler sets POS from the tags and lemmatizer the lemmas, spacy 2 models have none
+# of these three and their names are left out there
+COMPONENTS = {'tokens': (),
+              'lemmas': ('tok2vec', 'tagger', 'attribute_ruler', 'lemmatizer'),
+              'pos': ('tok2vec', 'tagger', 'attribute_ruler'),
+              'entities': ('ner',),
+              'sentences': ('tok2vec', 'parser'),
+              'noun_chunks': ('tok2vec', 'tagger', 'attribute_ruler', 'lemmatizer', 'parser'),
+              'sentiment': ('tok2vec', 'tagger', 'attribute_ruler', 'lemmatizer')}
+
+# Higher max length may cause memory issues, decrease as needed
+MAX_LENGTH = 1500000
+
+_default_size = os.environ.get('ENTITYANALYSER_MODEL', 'lg')
+# Shared copy of each model by name, with every component loaded so far
+_models = {}
+# Views of the shared copies by model name and component set
+_loaded = {}
+
+
+def set_default_size(size: str):
+    global _default_size
+    model_name(size)
+    _default_size = size
+
+
+# Returns package name of the model, size being sm, md or lg, or a full package name / model path
+def model_name(size=None) -> str:
+    size = size or _default_size
+    if size in MODELS:
+        return MODELS[size]
+    elif size.startswith('en_') or os.path.isdir(size):
+        return size
+    raise ValueError(f'Unknown model size {size!r}, expected one of {", ".join(MODELS)}')
+
+
+# Returns sorted tuple of pipeline components needed for the analyses, None if any analysis needs the full pipeline
+def required_components(analyses) -> tuple:
+    if analyses is None:
+        return None
+
+    components = set()
+    for analysis in analyses:
+        if analysis not in COMPONENTS:
+            raise ValueError(f'Unknown analysis {analysis!r}, expected one of {", ".join(COMPONENTS)}')
+        components.update(COMPONENTS[analysis])
+
+    return tuple(sorted(components))
+
+
+# Returns the shared model for the analyses, loading it with the other components disabled on first call
+# With no analyses given, the full pipeline is loaded
+def load(*analyses, size=None):
+    name = model_name(size)
+    components = required_components(analyses or None)
+    key = (name, components)
+
+    if key not in _loaded:
+        nlp = _models.get(name)
+        if nlp is None:
+            nlp = _models[name] = _load(name, components)
+        else:
+            _widen(nlp, components)
+        _loaded[key] = nlp if components is None else _select(nlp, components)
+
+    return _loaded[key]
+
+
+# Returns meta of the model, a package name or a model path
+def _model_meta(name: str) -> dict:
+    if spacy.util.is_package(name):
+        return spacy.util.get_model_meta(spacy.util.get_package_path(name))
+    return spacy.util.get_model_meta(spacy.util.ensure_path(name))
+
+
+def _load(name: str, components):
+    # Disabled components are loaded by spacy 3 only, spacy 2 leaves them out and could not add them later
+    if components is None or not hasattr(spacy.language.Language, 'enable_pipe'):
+        nlp = spacy.load(name)
+    else:
+        pipeline = _model_meta(name).get('pipeline', [])
+        nlp = spacy.load(name, disable=[pipe for pipe in pipeline if pipe not in components])
+
+    nlp.max_length = MAX_LENGTH
+
+    # Component timings are recorded only while profiling is on, the wrappers cost one check per call otherwise
+    return profiling.instrument_pipeline(nlp)
+
+
+# Enables the disabled components of the shared model the analyses need, all of them if components is None
+def _widen(nlp, components):
+    for pipe in list(getattr(nlp, 'disabled', ())):
+        if components is None or pipe in components:
+            nlp.enable_pipe(pipe)
+
+
+# Returns a shallow copy of the model running only the components, nlp.pipeline in spacy 2, nlp._components in spacy 3
+def _select(nlp, components: tuple):
+    view = copy.copy(nlp)
+    if hasattr(nlp, '_components'):
+        view._components = [(pipe, component) for pipe, component in nlp._components if pipe in components]
+        view._disabled = set()
+    else:
+        view.pipeline = [(pipe, component) for pipe, component in nlp.pipeline if pipe in components]
+
+    return view
+
+
+# Returns the named component of the loaded model with the vocab, enabled or not, None if there is no such component
+def find_pipe(vocab, name: str):
+    for nlp in _models.values():
+        if nlp.vocab is vocab and name in getattr(nlp, 'component_names', nlp.pipe_names):
+            return nlp.get_pipe(name)
+    return None
+
+
+# Removes loaded models, e.g. to free memory
+def clear():
+    _models.clear()
+    _loaded.clear()
+
+
+if __name__ == '__main__':
+    import importlib
+
+    start = timer()
+    importlib.import_module('analysers.basicStats')
+    importlib.import_module('analysers.nounChunks')
+    print(f'Import of basicStats and nounChunks took {timer() - start:.4f} seconds')
+
+    for analyses in [('tokens',), ('lemmas', 'pos'), ('entities',), ('noun_chunks', 'sentiment'), ()]:
+        start = timer()
+        nlp = load(*analyses)
+        print(f'Loading {model_name()} for {", ".join(analyses) or "full pipeline"} '
+              f'with {nlp.pipe_names} took {timer() - start:.4f} seconds')
+        clear()
@@ -1,224 +1,410 @@
 '''
 Functions for extracting noun-chunk information from text files.
-If run directly, writes a csv file at specified location.
+If run directly, prints the noun chunk lemmas of the root given. See analysers.export for writing the results to
+parquet files and pandas DataFrames.
 
-En_core_web_lg may take time to load depending on your set up, consider downloading and using sm or md versions as needed.
+En_core_web_lg may take time to load depending on your set up, consider downloading and using sm or md versions as
+needed, see analysers.models. The model is loaded on first use, not on import.
 
 NOTE: Document to doc conversion takes approx 0,4 ms per token.
 
 INPUT: Text for spacy document object.
-OUTPUT: Basic stats in csv file.
+OUTPUT: Noun chunks, clusters and root sentiment.
 '''
-import spacy
-from spacy.lemmatizer import Lemmatizer
+from collections import Counter
+from operator import itemgetter
+import heapq
+import weakref
+import numpy
+from spacy.tokens import Doc
 from timeit import default_timer as timer
 from datetime import datetime
-from sentiment import classSentiment
+from sentiment.docSentiment import doc_polarity, doc_words, span_polarity
+from analysers import models
+from common.profiling import stage, first_length, second_length
+from analysers.results import ChunkTable, ChunkView
 
 
-# TBD: pandas dataframe compatibility
+ANALYSES = ('noun_chunks', 'sentiment')
 
-nlp = spacy.load('en_core_web_lg')
-nlp.max_length = 1500000
-s = classSentiment.Sentiment
-lemma = Lemmatizer()
+
+# Model is loaded on first access of nounChunks.nlp, with only the components ANALYSES need
+def __getattr__(name):
+    if name == 'nlp':
+        return models.load(*ANALYSES)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 
 # Returns list of noun chunk and root word text
-def nc_list(document) -> list:
-    chunks = [(item.text, item.root.text) for item in document.noun_chunks]
-    return chunks
+# NOTE: nc_list, nc_words, nc_lemmas, nc_sentiment and nc_roots_sentiment return read-only views of the index,
+# iterating as lists of tuples, see analysers.results. Use tolist() for plain lists.
+def nc_list(document) -> ChunkView:
+    return nc_index(document).chunks
 
 
 # Returns list of noun chunk and root text, without new line in text
 def nc_list_cleaned(document) -> list:
-    chunks = []
-
-    for item in document.noun_chunks:
-        if '\n' in item.text:
-            chunks.append((item.text.replace('\n', ''), item.root.text))
-        else:
-            chunks.append((item.text, item.root.text))
-
-    return chunks
+    return [(text.replace('\n', ''), root) for text, root in nc_index(document).chunks]
 
 
 # Returns list of noun chunk text, without the root word
 def nc_min(document) -> list:
-    chunks = []
-
-    for item in document.noun_chunks:
-        if '\n' in item.text:
-            chunks.append(item.text.replace('\n', ''))
-        else:
-            chunks.append(item.text)
+    return [text.replace('\n', '') for text, root in nc_index(document).chunks]
 
-    return chunks
 
-
-# Returns list of tuples with noun chunk split into words and root word
+# Returns list of tuples with noun chunk split into words and root word, punctuation and white space left out
 # Tuple[1] being token list and Tuple[2] the rootword
 # E.g (['swift', 'decay'], 'decay')
-def nc_words(document) -> list:
-    words = []
-
-    for item in document.noun_chunks:
-        words.append((item.text.replace('\n', '').split(), item.root.text))
-
-    return words
+def nc_words(document) -> ChunkView:
+    return nc_index(document).words
 
 
 # Returns list of tuples with noun chunk split into lemmas and lemmatised root word in lowercase
-def nc_lemmas(document) -> list:
-    words = []
-
-    for item in document.noun_chunks:
-        chunk = []
-
-        for word in item.text.replace('\n', '').split():
-            chunk.append(lemma.lookup(word).lower())
-
-        words.append((chunk, lemma.lookup(item.root.text.lower())))
-
-    return words
+def nc_lemmas(document) -> ChunkView:
+    return nc_index(document).lemmas
 
 
 # Returns dictionary of all roots as keys + all unique noun chunk tokens related to the root as list
 def nc_clusters(document) -> dict:
-    clusters = {}
-
-    for item in nc_words(document):
-        words = list(set(item[0]))
-        if item[1] not in clusters.keys():
-            clusters[item[1]] = words
-        elif item[1] in clusters.keys():
-            words = list(set(item[0] + clusters[item[1]]))
-            clusters[item[1]] = words
-
-    return clusters
+    return nc_index(document).get_clusters()
 
 
 # Returns dictionary of all unique lemmatised roots as keys + all unique noun chunk lemmas related to the root as list
 def nc_lemma_clusters(document) -> dict:
-    clusters = {}
-
-    for item in nc_lemmas(document):
-        words = list(set(item[0]))
-        if item[1] not in clusters.keys():
-            clusters[item[1]] = words
-        elif item[1] in clusters.keys():
-            words = list(set(item[0] + clusters[item[1]]))
-            clusters[item[1]] = words
-
-    return clusters
+    return nc_index(document).get_lemma_clusters()
 
 
 # Returns list of tuples. Tuple[1] is a list of word sentiment pairs, Tuple[2] is the root word.
 # The first list of words is list of tuples with the word/token of the chunk being paired with the sentiment value
 # E.g. ([('swift', 1), ('decay', 0)], 'decay')
-# NOTE: looks up sentiment value for the lemma for increased coverage
-def nc_sentiment(document) -> list:
-    chunk_sentiment = []
-
-    for item in document.noun_chunks:
-        chunk = []
-        for word in item.text.split():
-            chunk.append((word, s.sentiment_single_word(lemma.lookup(word))))
-        chunk_sentiment.append((chunk, item.root.text))
-
-    return chunk_sentiment
+# NOTE: looks up sentiment value for the token lemma for increased coverage, see sentiment.docSentiment
+def nc_sentiment(document) -> ChunkView:
+    return nc_index(document).sentiment
 
 
 # Returns list of tuples, Tuple[1] contains the sentiment values of tokens in the noun chunk, Tuple[2] is the root word.
 # E.g. ([1, 0], 'decay')
-def nc_roots_sentiment(document) -> list:
-    chunk_sentiment = []
-
-    for item in document.noun_chunks:
-        chunk = []
-        for word in item.text.split():
-            chunk.append(s.sentiment_single_word(lemma.lookup(word)))
-        chunk_sentiment.append((chunk, item.root.text))
-
-    return chunk_sentiment
+def nc_roots_sentiment(document) -> ChunkView:
+    return nc_index(document).values
 
 
 # Returns dictionary, with the root word as key and list of the chunk token sentiment values related to the key
 # E.g. 'decay': [1, 0]
-# Calls function noun_chunks_roots_sentiment()
 def nc_root_sentiment(document) -> dict:
-    roots_dict = {}
-    sentiment, roots = zip(*nc_roots_sentiment(document))
-    l_roots = [token.lower() for token in roots]
-
-    l_sentiment = list(zip(l_roots, sentiment))
-
-    for item in l_sentiment:
-        sentiments = item[1]
-        if item[0] not in roots_dict.keys():
-            roots_dict[item[0]] = sentiments
-        elif item[0] in roots_dict.keys():
-            sentiments = item[1] + roots_dict[item[0]]
-            roots_dict[item[0]] = sentiments
-
-    return roots_dict
+    return nc_index(document).get_root_sentiment()
 
 
 def nc_root_sentiment_score(document) -> dict:
-    roots_scores = {}
-
-    roots_dict = nc_root_sentiment(document)
-
-    for key in roots_dict.keys():
-        if sum(roots_dict[key]) == 0:
-            roots_scores[key] = 0
-        else:
-            roots_scores[key] = round((float((sum(roots_dict[key]) / len(roots_dict[key])))), 4)
+    return dict(nc_index(document).get_root_sentiment_score())
 
-    return roots_scores
 
-
-# Return as default 10 highest sentiment score rootwords, calls nc_root_sentiment_score
+# Return as default 10 highest sentiment score rootwords
 def nc_root_mostpos(document, number=10) -> dict:
-    return dict(sorted(nc_root_sentiment_score(document).items(),
-                       key=lambda x: x[1], reverse=True)[:number])
+    return nc_index(document).get_root_mostpos(number)
 
 
-# Return as default 10 lowest sentiment score rootwords, calls calls nc_root_sentiment_score
+# Return as default 10 lowest sentiment score rootwords
 def nc_root_mostneg(document, number=10):
-    return dict(sorted(nc_root_sentiment_score(document).items(), key=lambda x: x[1])[:number])
+    return nc_index(document).get_root_mostneg(number)
 
 
 # Return list of tokens of noun clusters related to given word
 # If the word doesn't appear as root, return empty list
 def nc_word_cluster(word: str, document) -> list:
-    if word in nc_clusters(document).keys():
-        return nc_clusters(document)[word]
-    else:
-        return []
+    return nc_index(document).get_word_cluster(word)
 
 
 # Return list of lemmas of noun clusters related to lemmatised given word
 # If the word doesn't appear as root, return empty list
 def nc_word_lemmas(word: str, document) -> list:
-    lemmatised = lemma.lookup(word).lower()
-    if lemmatised in nc_lemma_clusters(document).keys():
-        return nc_lemma_clusters(document)[lemmatised]
-    else:
-        return []
+    return nc_index(document).get_word_lemmas(word)
+
+
+# Collects noun chunk clusters and root sentiment over one or more documents, in time linear to the chunk tokens.
+# Clusters are running set unions and root sentiment a running [sum, count] per lowercase root.
+# Results match nc_clusters, nc_lemma_clusters and nc_root_sentiment_score run on all the documents at once,
+# call update() per document and merge() to combine collectors, e.g. from corpus pieces or pickled from workers.
+class NounChunkCollector:
+    # Type of the cluster containers, see NounChunkCounter
+    cluster_type = set
+
+    def __init__(self, document=None):
+        self.clusters = {}
+        self.lemma_clusters = {}
+        self.root_sentiment = {}
+        self.vocab = None
+        self._scores = None
+
+        if document is not None:
+            self.update(document)
+
+    # Adds the noun chunks of a document to the collected clusters and sentiment values
+    @stage('nounChunks.NounChunkCollector.update', items=second_length)
+    def update(self, document):
+        self.vocab = document.vocab
+        polarity = doc_polarity(document)
+        words = doc_words(document)
+
+        for item in document.noun_chunks:
+            tokens = _chunk_words(item, words)
+            values = span_polarity(item, polarity, words)
+
+            self.clusters.setdefault(item.root.text, self.cluster_type()).update(token.text for token in tokens)
+            self.lemma_clusters.setdefault(_lemma(item.root), self.cluster_type()).update(
+                _lemma(token) for token in tokens)
+            self._add_sentiment(item.root.lower_, int(values.sum()), len(values))
+
+        self._scores = None
+        return self
+
+    # Adds the clusters and sentiment values of another collector
+    def merge(self, other):
+        for root, words in other.clusters.items():
+            self.clusters.setdefault(root, self.cluster_type()).update(words)
+        for root, lemmas in other.lemma_clusters.items():
+            self.lemma_clusters.setdefault(root, self.cluster_type()).update(lemmas)
+        for root, (total, count) in other.root_sentiment.items():
+            accumulator = self.root_sentiment.setdefault(root, [0, 0])
+            accumulator[0] += total
+            accumulator[1] += count
+
+        self._scores = None
+        return self
+
+    def get_clusters(self) -> dict:
+        return {root: list(words) for root, words in self.clusters.items()}
+
+    def get_lemma_clusters(self) -> dict:
+        return {root: list(lemmas) for root, lemmas in self.lemma_clusters.items()}
+
+    # Returns list of tokens of noun clusters related to given word, empty list if not a root
+    def get_word_cluster(self, word: str) -> list:
+        return list(self.clusters.get(word, []))
+
+    # Returns list of lemmas of noun clusters related to lemmatised given word, empty list if not a root
+    def get_word_lemmas(self, word: str) -> list:
+        return list(self.lemma_clusters.get(_lookup_lemma(self.vocab, word), []))
+
+    # Returns the root scores, computed once until the collector is updated
+    def get_root_sentiment_score(self) -> dict:
+        if self._scores is None:
+            roots_scores = {}
+
+            for root, (total, count) in self.root_sentiment.items():
+                roots_scores[root] = 0 if total == 0 else round(float(total / count), 4)
+
+            self._scores = roots_scores
+
+        return self._scores
+
+    # Returns as default 10 highest scoring roots, ties in order of first appearance as with sorted()
+    def get_root_mostpos(self, number=10) -> dict:
+        scores = self.get_root_sentiment_score().items()
+        if number is None:
+            return dict(sorted(scores, key=itemgetter(1), reverse=True))
+        return dict(heapq.nlargest(number, scores, key=itemgetter(1)))
+
+    # Returns as default 10 lowest scoring roots, ties in order of first appearance as with sorted()
+    def get_root_mostneg(self, number=10) -> dict:
+        scores = self.get_root_sentiment_score().items()
+        if number is None:
+            return dict(sorted(scores, key=itemgetter(1)))
+        return dict(heapq.nsmallest(number, scores, key=itemgetter(1)))
+
+    def _add_sentiment(self, root: str, total: int, count: int):
+        accumulator = self.root_sentiment.setdefault(root, [0, 0])
+        accumulator[0] += total
+        accumulator[1] += count
+
+    # Vocab is only needed for lemmatising query words, it is not sent along when pickled to or from workers
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['vocab'] = None
+        return state
+
+
+# Noun chunk collector keeping clusters as word counts instead of sets, so the chunks of a document can be taken
+# off again with subtract(), e.g. when a block of an edited file is analysed again, see analysers.incremental.
+# Roots are kept while any chunk of theirs is left, counted by root, root lemma and lowercase root in chunk_counts.
+# Query results are the same as those of NounChunkCollector.
+class NounChunkCounter(NounChunkCollector):
+    cluster_type = Counter
+
+    def __init__(self, document=None):
+        self.chunk_counts = (Counter(), Counter(), Counter())
+        NounChunkCollector.__init__(self, document)
+
+    def update(self, document):
+        NounChunkCollector.update(self, document)
+        roots, lemmas, lowers = self.chunk_counts
+        for item in document.noun_chunks:
+            roots[item.root.text] += 1
+            lemmas[_lemma(item.root)] += 1
+            lowers[item.root.lower_] += 1
+
+        return self
+
+    def merge(self, other):
+        NounChunkCollector.merge(self, other)
+        for counts, others in zip(self.chunk_counts, other.chunk_counts):
+            counts.update(others)
+
+        return self
+
+    # Takes off the clusters and sentiment values of another collector, which must have been added before
+    def subtract(self, other):
+        roots, lemmas, lowers = self.chunk_counts
+
+        for clusters, others, counts, other_counts in ((self.clusters, other.clusters, roots, other.chunk_counts[0]),
+                                                       (self.lemma_clusters, other.lemma_clusters, lemmas,
+                                                        other.chunk_counts[1])):
+            for root, words in others.items():
+                cluster = clusters.get(root)
+                if cluster is not None:
+                    cluster.subtract(words)
+                    for word in [word for word, count in cluster.items() if count <= 0]:
+                        del cluster[word]
+            self._subtract_counts(counts, other_counts, clusters)
+
+        for root, (total, count) in other.root_sentiment.items():
+            accumulator = self.root_sentiment.get(root)
+            if accumulator is not None:
+                accumulator[0] -= total
+                accumulator[1] -= count
+        self._subtract_counts(lowers, other.chunk_counts[2], self.root_sentiment)
+
+        self._scores = None
+        return self
+
+    # Takes the chunk counts off, dropping the roots with no chunks left from the counts and the dictionary
+    @staticmethod
+    def _subtract_counts(counts: Counter, others: Counter, dictionary: dict):
+        for root, number in others.items():
+            counts[root] -= number
+            if counts[root] <= 0:
+                del counts[root]
+                dictionary.pop(root, None)
+
+
+# Noun chunks of one document with their words, lemmas and sentiment values, built in one pass over the chunks.
+# The nc_* functions are queries against the index of their document, get it with nc_index().
+# Chunks are kept in a ChunkTable, chunks, words, lemmas, sentiment and values are tuple-compatible views of it,
+# see analysers.results. Use their tolist() for plain lists, e.g. to modify or serialise them.
+class NounChunkIndex(NounChunkCollector):
+    def __init__(self, document):
+        NounChunkCollector.__init__(self, document)
+
+    @stage('nounChunks.NounChunkIndex.update', items=second_length)
+    def update(self, document):
+        self.vocab = document.vocab
+        self.table = table = ChunkTable(document)
+        self.chunks = ChunkView(table, 'chunks')
+        self.words = ChunkView(table, 'words')
+        self.lemmas = ChunkView(table, 'lemmas')
+        self.sentiment = ChunkView(table, 'sentiment')
+        self.values = ChunkView(table, 'values')
+
+        counts = numpy.diff(table.offsets).tolist()
+        for i, (first, last, total) in enumerate(zip(table.offsets.tolist(), table.offsets[1:].tolist(),
+                                                    table.totals.tolist())):
+            root = table.root(i)
+            self.clusters.setdefault(root, set()).update(table.texts(first, last))
+            self.lemma_clusters.setdefault(table.root_lemma(i), set()).update(table.lemmas(first, last))
+            self._add_sentiment(root.lower(), total, counts[i])
+
+        self._scores = None
+        return self
+
+    # Returns dictionary of lowercase roots and their chunk sentiment values, later chunks first
+    def get_root_sentiment(self) -> dict:
+        table = self.table
+        roots = [table.root(i).lower() for i in range(len(table))]
+        roots_dict = {root: [] for root in roots}
+
+        for i in reversed(range(len(table))):
+            roots_dict[roots[i]].extend(table.values(*table.bounds(i)))
+
+        return roots_dict
+
+
+# Noun chunk indexes and versions of the documents, dropped with their document. Kept out of doc.user_data, so the
+# index is not serialised with the document and the document is not kept alive by its own index.
+_indexes = weakref.WeakKeyDictionary()
+_versions = weakref.WeakKeyDictionary()
+
+
+# Returns the noun chunk index of the document, built on first call and kept until the document is gone or its
+# version is raised with nc_index_clear, e.g. after re-parsing or retokenizing the document in place
+@stage('nounChunks.nc_index', items=first_length)
+def nc_index(document) -> NounChunkIndex:
+    version = _versions.get(document, 0)
+    cached = _indexes.get(document)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    index = NounChunkIndex(document)
+    _indexes[document] = (version, index)
+
+    return index
+
+
+# Returns the version of the document, raised by nc_index_clear
+def nc_index_version(document) -> int:
+    return _versions.get(document, 0)
+
+
+# Returns the word tokens of the chunk, given word mask of its document
+def _chunk_words(span, words) -> list:
+    return [token for token, is_word in zip(span, words[span.start:span.end]) if is_word]
+
+
+# Returns lowercase lemma of the token, pronouns (-PRON- lemma in spacy 2) by their lowercase form
+def _lemma(token) -> str:
+    if token.lemma_ == '-PRON-' or not token.lemma_:
+        return token.lower_
+    return token.lemma_.lower()
+
+
+# Returns lowercase lemma of a word out of context, lemmatised as a noun as chunk roots are. Tried in order: the
+# lemmatizer of spacy 2 vocab, a lemma_lookup table in the vocab lookups and the lemmatizer component of the loaded
+# model sharing the vocab (spacy 3), the lowercase word being returned if none of them is there
+def _lookup_lemma(vocab, word: str) -> str:
+    lemmatizer = getattr(getattr(vocab, 'morphology', None), 'lemmatizer', None)
+    if lemmatizer is not None and hasattr(lemmatizer, 'lookup'):
+        return lemmatizer.lookup(word).lower()
+
+    lookups = getattr(vocab, 'lookups', None)
+    if lookups is not None and lookups.has_table('lemma_lookup'):
+        return lookups.get_table('lemma_lookup').get(word, word).lower()
+
+    lemmatizer = models.find_pipe(vocab, 'lemmatizer')
+    if lemmatizer is not None:
+        document = Doc(vocab, words=[word])
+        document[0].pos_ = 'NOUN'
+        return _lemma(lemmatizer(document)[0])
+    return word.lower()
+
+
+# Raises the version of the document and drops its cached index, so the next query builds it again
+def nc_index_clear(document):
+    _versions[document] = _versions.get(document, 0) + 1
+    _indexes.pop(document, None)
 
 
 if __name__ == '__main__':
+    from analysers.corpusRunner import CorpusRunner
+    from analysers.docCache import DocCache
+
     # Set document to be analysed below
     print(f'Starting text to document import at {datetime.now()} ...')
     start = timer()
 
-    with open('/Users/ibl/Documents/entityAnalyser/data/goblin.txt') as f:
-        doc = nlp(f.read())
+    runner = CorpusRunner(models.load(*ANALYSES), cache=DocCache())
+    chunks, = runner.run('/Users/ibl/Documents/entityAnalyser/data/goblin.txt', NounChunkCollector())
 
     end = timer()
     print(f'Finished text to document import at {datetime.now()}. '
           f'\nTook {end - start} seconds')
 
-    print(nc_word_lemmas('dish', doc))
+    print(chunks.get_word_lemmas('dish'))
 
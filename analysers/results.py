@@ -0,0 +1,228 @@
+'''
+Compact result types for noun chunk and word sentiment output.
+If run directly, prints memory of nc_sentiment style lists of tuples against the compact table for a synthetic text.
+
+ChunkTable keeps the noun chunks of a document as offset ranges and the word tokens of all chunks as one flat
+array, chunk i owning tokens[offsets[i]:offsets[i + 1]], with their string hashes and int8 sentiment values beside.
+Chunk texts are slices of the document text kept by the table, which holds no reference to the document itself, so
+a table cached for a document does not keep it alive.
+ChunkView is a read-only sequence over the table and its items are ChunkRecord views, so no list, tuple or string
+is created per chunk until one is accessed. Sentiment.sentiment_text returns the same kind of view of words and their
+values, see sentiment.wordSentiment.
+
+Records and views keep the old result shapes: a record iterates, indexes, compares and prints as the tuple it
+replaces, e.g. ([('swift', 1), ('decay', 0)], 'decay'), so "for words, root in nc_words(doc)" works unchanged.
+tolist() returns plain lists and tuples, e.g. for JSON or for modifying.
+
+INPUT: Spacy document object, list of words.
+OUTPUT: ChunkTable and ChunkView sequences.
+'''
+import numpy
+from array import array
+from collections.abc import Sequence
+from spacy.attrs import ORTH, LEMMA, LOWER
+from sentiment.docSentiment import doc_polarity, doc_words
+
+# Tuple fields of the records of each view kind
+FIELDS = {'chunks': ('text', 'root'),
+          'words': ('words', 'root'),
+          'lemmas': ('lemmas', 'root_lemma'),
+          'sentiment': ('pairs', 'root'),
+          'values': ('values', 'root')}
+
+
+class ChunkTable:
+    __slots__ = ('source', 'strings', 'starts', 'ends', 'characters', 'offsets', 'roots', 'tokens', 'polarity',
+                 'totals')
+
+    def __init__(self, document):
+        self.source = document.text
+        self.strings = document.vocab.strings
+
+        spans = array('i')
+        for item in document.noun_chunks:
+            spans.extend((item.start, item.end, item.root.i, item.start_char, item.end_char))
+        spans = numpy.array(spans, dtype=numpy.int32).reshape(-1, 5)
+        self.starts, self.ends = spans[:, 0], spans[:, 1]
+        self.characters = spans[:, 3:]
+
+        # Noun chunks don't overlap, so a running sum of +1 at chunk starts and -1 at ends marks the chunk tokens
+        marks = numpy.zeros(len(document) + 1, dtype=numpy.int32)
+        marks[self.starts] += 1
+        marks[self.ends] -= 1
+        in_chunk = numpy.cumsum(marks[:-1]) > 0
+
+        tokens = numpy.flatnonzero(in_chunk & doc_words(document)).astype(numpy.int32)
+        self.offsets = numpy.searchsorted(tokens, numpy.append(self.starts, len(document))).astype(numpy.int32)
+        self.polarity = doc_polarity(document)[tokens]
+
+        # Hashes of the root and word tokens, roots first, then the words of all chunks in order
+        attributes = document.to_array([ORTH, LEMMA, LOWER]) if len(document) else numpy.zeros((0, 3), numpy.uint64)
+        self.roots = attributes[spans[:, 2]]
+        self.tokens = attributes[tokens]
+
+        summed = numpy.concatenate(([0], numpy.cumsum(self.polarity, dtype=numpy.int64)))
+        self.totals = summed[self.offsets[1:]] - summed[self.offsets[:-1]]
+
+    def __len__(self):
+        return len(self.starts)
+
+    # Returns (first, last) positions of the chunk's words in the flat token arrays
+    def bounds(self, i: int) -> tuple:
+        return int(self.offsets[i]), int(self.offsets[i + 1])
+
+    def texts(self, first: int, last: int) -> list:
+        strings = self.strings
+        return [strings[key] for key in self.tokens[first:last, 0].tolist()]
+
+    def lemmas(self, first: int, last: int) -> list:
+        return [self.lemma(lemma, lower) for lemma, lower in self.tokens[first:last, 1:].tolist()]
+
+    def values(self, first: int, last: int) -> list:
+        return self.polarity[first:last].tolist()
+
+    # Returns lowercase lemma of the hashes, pronouns (-PRON- lemma in spacy 2) by their lowercase form
+    def lemma(self, lemma: int, lower: int) -> str:
+        text = self.strings[lemma] if lemma else ''
+        if text == '-PRON-' or not text:
+            return self.strings[lower]
+        return text.lower()
+
+    def root(self, i: int) -> str:
+        return self.strings[int(self.roots[i, 0])]
+
+    def root_lemma(self, i: int) -> str:
+        return self.lemma(int(self.roots[i, 1]), int(self.roots[i, 2]))
+
+    def text(self, i: int) -> str:
+        start, end = self.characters[i].tolist()
+        return self.source[start:end]
+
+
+class ChunkRecord:
+    __slots__ = ('table', 'index', 'kind')
+
+    def __init__(self, table: ChunkTable, index: int, kind: str):
+        self.table = table
+        self.index = index
+        self.kind = kind
+
+    @property
+    def start(self) -> int:
+        return int(self.table.starts[self.index])
+
+    @property
+    def end(self) -> int:
+        return int(self.table.ends[self.index])
+
+    @property
+    def text(self) -> str:
+        return self.table.text(self.index)
+
+    @property
+    def root(self) -> str:
+        return self.table.root(self.index)
+
+    @property
+    def root_lemma(self) -> str:
+        return self.table.root_lemma(self.index)
+
+    @property
+    def words(self) -> list:
+        return self.table.texts(*self.table.bounds(self.index))
+
+    @property
+    def lemmas(self) -> list:
+        return self.table.lemmas(*self.table.bounds(self.index))
+
+    @property
+    def values(self) -> list:
+        return self.table.values(*self.table.bounds(self.index))
+
+    @property
+    def pairs(self) -> list:
+        first, last = self.table.bounds(self.index)
+        return list(zip(self.table.texts(first, last), self.table.values(first, last)))
+
+    def astuple(self) -> tuple:
+        first, second = FIELDS[self.kind]
+        return getattr(self, first), getattr(self, second)
+
+    def __iter__(self):
+        return iter(self.astuple())
+
+    def __len__(self):
+        return 2
+
+    def __getitem__(self, i):
+        return self.astuple()[i]
+
+    def __eq__(self, other):
+        if isinstance(other, ChunkRecord):
+            other = other.astuple()
+        return self.astuple() == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(self.astuple())
+
+
+class ChunkView(Sequence):
+    __slots__ = ('table', 'kind')
+
+    def __init__(self, table: ChunkTable, kind: str):
+        if kind not in FIELDS:
+            raise ValueError(f'Unknown kind {kind!r}, expected one of {", ".join(FIELDS)}')
+        self.table = table
+        self.kind = kind
+
+    def __len__(self):
+        return len(self.table)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('ChunkView index out of range')
+        return ChunkRecord(self.table, i, self.kind)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield ChunkRecord(self.table, i, self.kind)
+
+    def __eq__(self, other):
+        if isinstance(other, ChunkView):
+            other = other.tolist()
+        return isinstance(other, (list, tuple)) and self.tolist() == list(other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(self.tolist())
+
+    # Returns the results as list of tuples
+    def tolist(self) -> list:
+        return [record.astuple() for record in self]
+
+
+if __name__ == '__main__':
+    import gc
+    import spacy
+    import tracemalloc
+    from benchmarks.syntheticCorpus import synthetic_doc
+
+    # Set document size in tokens below
+    doc = synthetic_doc(spacy.blank('en').vocab, 300000)
+
+    for name, build in (('list of tuples', lambda: ChunkView(ChunkTable(doc), 'sentiment').tolist()),
+                        ('ChunkTable', lambda: ChunkTable(doc))):
+        gc.collect()
+        tracemalloc.start()
+        result = build()
+        held = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print(f'{name}: {held / 1024 ** 2:.1f} MB held for {len(result)} noun chunks')
+        del result
@@ -0,0 +1,285 @@
+'''
+Local analysis service keeping one model resident, so scripts don't each pay the model load.
+
+Clients connect over TCP or a Unix socket and send one JSON request per line, e.g.
+{"id": 1, "op": "stats", "text": "...", "number": 10}, and get one JSON response per line with the same id,
+{"id": 1, "result": ...} or {"id": 1, "error": "..."}. Responses of one connection may come in any order.
+
+Operations:
+stats          basicStats tables (token count, top tokens, lemmas, named entities, POS-tags)
+noun_chunks    noun chunk and root pairs, and root clusters
+sentiment      noun chunk word sentiment pairs, as nounChunks.nc_sentiment
+root_scores    root sentiment scores with most positive and most negative roots
+text_sentiment Sentiment.sentiment_text of the whitespace split text, no parsing needed
+
+Requests from all connections are put in one bounded queue and micro-batched, a batch being sent when batch_size
+requests are waiting or the first has waited max_latency seconds. Batches are parsed with nlp.pipe and analysed in
+a process pool whose workers each load the model once. When the queue is full, reading from clients pauses until
+there is room, so a client sending faster than the service analyses is slowed down instead of using more memory.
+With workers=0 batches run in a thread of the service process, e.g. for testing with the blank pipeline.
+
+Run e.g. python -m analysers.service --port 8765 --size sm
+
+INPUT: JSON lines of requests.
+OUTPUT: JSON lines of results.
+'''
+import json
+import asyncio
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+BATCH_SIZE = 32
+MAX_LATENCY = 0.01
+MAX_PENDING = 1024
+# Longest accepted request line in bytes
+LINE_LIMIT = 64 * 1024 * 1024
+
+OPERATIONS = ('stats', 'noun_chunks', 'sentiment', 'root_scores', 'text_sentiment')
+
+# Model of the worker process, loaded by _init_worker
+_nlp = None
+
+
+def _init_worker(size: str):
+    global _nlp
+    if size == 'blank':
+        import spacy
+        _nlp = spacy.blank('en')
+    else:
+        from analysers import models
+        _nlp = models.load(size=size)
+
+
+# Returns results of a batch of (op, text, params) requests, an exception instance in place of a failed result
+def _analyse_batch(requests: list) -> list:
+    from analysers import basicStats, nounChunks
+    from sentiment.classSentiment import Sentiment
+
+    parse = [i for i, (op, text, params) in enumerate(requests) if op != 'text_sentiment']
+    docs = dict(zip(parse, _nlp.pipe(requests[i][1] for i in parse)))
+    results = []
+
+    for i, (op, text, params) in enumerate(requests):
+        try:
+            number = params.get('number', 10)
+            if op == 'text_sentiment':
+                result = Sentiment.sentiment_text(text.split()).tolist()
+            elif op == 'stats':
+                stats = basicStats.StatsCollector(docs[i])
+                result = {'token_count': stats.token_count,
+                          'top_tokens': stats.get_top_tokens_cleaned(number),
+                          'top_lemmas': stats.get_top_lemmas_cleaned(number),
+                          'named_entities': stats.get_named_entities(number),
+                          'pos': stats.get_pos()}
+            else:
+                index = nounChunks.NounChunkIndex(docs[i])
+                if op == 'noun_chunks':
+                    result = {'chunks': index.chunks.tolist(), 'clusters': index.get_clusters()}
+                elif op == 'sentiment':
+                    result = index.sentiment.tolist()
+                else:
+                    result = {'scores': index.get_root_sentiment_score(),
+                              'mostpos': index.get_root_mostpos(number),
+                              'mostneg': index.get_root_mostneg(number)}
+            results.append(result)
+        except Exception as error:
+            results.append(error)
+
+    return results
+
+
+class AnalysisService:
+    def __init__(self, size='lg', workers=1, batch_size=BATCH_SIZE, max_latency=MAX_LATENCY,
+                 max_pending=MAX_PENDING):
+        self.size = size
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self.max_pending = max_pending
+        self.queue = None
+        self.executor = None
+        self._batcher = None
+        self._in_flight = None
+        self._servers = []
+        self._handlers = set()
+
+    async def start(self):
+        if self.workers:
+            self.executor = ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(self.size,))
+        else:
+            self.executor = ThreadPoolExecutor(1, initializer=_init_worker, initargs=(self.size,))
+
+        self.queue = asyncio.Queue(self.max_pending)
+        # One batch per worker in flight, further requests wait in the queue
+        self._in_flight = asyncio.Semaphore(max(self.workers, 1))
+        self._batcher = asyncio.ensure_future(self._batch_loop())
+        return self
+
+    async def close(self):
+        for server in self._servers:
+            server.close()
+        for handler in self._handlers:
+            handler.cancel()
+        if self._handlers:
+            await asyncio.wait(self._handlers)
+        for server in self._servers:
+            await server.wait_closed()
+        if self._batcher is not None:
+            self._batcher.cancel()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+
+    # Returns the result of the operation on the text, waiting if the queue is full
+    async def analyse(self, op: str, text: str, **params):
+        return await (await self._enqueue(op, text, params))
+
+    # Puts the request in the queue, waiting if it is full, returns future of the result
+    async def _enqueue(self, op: str, text: str, params: dict):
+        if op not in OPERATIONS:
+            raise ValueError(f'Unknown operation {op!r}, expected one of {", ".join(OPERATIONS)}')
+        if not isinstance(text, str):
+            raise TypeError(f'Text must be a string, not {type(text).__name__}')
+
+        future = asyncio.get_event_loop().create_future()
+        await self.queue.put((op, text, params, future))
+        return future
+
+    async def _batch_loop(self):
+        loop = asyncio.get_event_loop()
+
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_latency
+
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            await self._in_flight.acquire()
+            asyncio.ensure_future(self._run_batch(batch))
+
+    async def _run_batch(self, batch: list):
+        loop = asyncio.get_event_loop()
+        try:
+            results = await loop.run_in_executor(self.executor, _analyse_batch,
+                                                 [(op, text, params) for op, text, params, future in batch])
+        except Exception as error:
+            results = [error] * len(batch)
+        finally:
+            self._in_flight.release()
+
+        for (op, text, params, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def serve_tcp(self, host='127.0.0.1', port=8765):
+        server = await asyncio.start_server(self._handle, host, port, limit=LINE_LIMIT)
+        self._servers.append(server)
+        return server
+
+    async def serve_unix(self, path: str):
+        server = await asyncio.start_unix_server(self._handle, path, limit=LINE_LIMIT)
+        self._servers.append(server)
+        return server
+
+    async def _handle(self, reader, writer):
+        lock = asyncio.Lock()
+        tasks = set()
+        handler = asyncio.current_task()
+        self._handlers.add(handler)
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                # Waiting here for room in the queue stops reading, which is the backpressure on the client
+                tasks.add(await self._submit(line, writer, lock))
+                tasks = {task for task in tasks if not task.done()}
+
+            if tasks:
+                await asyncio.wait(tasks)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._handlers.discard(handler)
+            writer.close()
+
+    async def _submit(self, line: bytes, writer, lock):
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get('id')
+            params = {key: value for key, value in request.items() if key not in ('id', 'op', 'text')}
+            future = await self._enqueue(request['op'], request.get('text', ''), params)
+        except (ValueError, KeyError, TypeError, AttributeError) as error:
+            return asyncio.ensure_future(self._respond(writer, lock, request_id, error=error))
+
+        return asyncio.ensure_future(self._respond(writer, lock, request_id, future=future))
+
+    @staticmethod
+    async def _respond(writer, lock, request_id, future=None, error=None):
+        if future is not None:
+            try:
+                response = {'id': request_id, 'result': await future}
+            except Exception as failure:
+                response = {'id': request_id, 'error': f'{type(failure).__name__}: {failure}'}
+        else:
+            response = {'id': request_id, 'error': f'{type(error).__name__}: {error}'}
+
+        async with lock:
+            writer.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+            await writer.drain()
+
+
+# Sends requests over one connection, returns responses in request order
+# Each request is a dictionary with op, text and optional parameters
+async def query(requests: list, host='127.0.0.1', port=8765, path=None) -> list:
+    if path is not None:
+        reader, writer = await asyncio.open_unix_connection(path, limit=LINE_LIMIT)
+    else:
+        reader, writer = await asyncio.open_connection(host, port, limit=LINE_LIMIT)
+
+    for i, request in enumerate(requests):
+        writer.write(json.dumps(dict(request, id=i)).encode('utf-8') + b'\n')
+    await writer.drain()
+
+    responses = {}
+    while len(responses) < len(requests):
+        response = json.loads(await reader.readline())
+        responses[response['id']] = response
+
+    writer.close()
+    return [responses[i] for i in range(len(requests))]
+
+
+async def main(args):
+    service = await AnalysisService(args.size, args.workers, args.batch_size, args.max_latency).start()
+    server = await (service.serve_unix(args.unix) if args.unix else service.serve_tcp(args.host, args.port))
+    print(f'Serving on {args.unix or f"{args.host}:{args.port}"}')
+
+    try:
+        await server.serve_forever()
+    finally:
+        await service.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve basicStats and nounChunks analyses over a socket.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', help='Unix socket path, used instead of TCP')
+    parser.add_argument('--size', default='lg', help='sm, md, lg or blank')
+    parser.add_argument('--workers', type=int, default=1, help='worker processes, 0 for a thread in this process')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--max-latency', type=float, default=MAX_LATENCY, help='seconds to wait filling a batch')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,276 @@
+'''
+Topic clusters of noun chunk roots and named entities by word vector similarity, with shared sentiment.
+If run directly, prints the largest topic clusters of a text and their sentiment scores.
+
+The distinct roots of a NounChunkCollector and entities of an EntityIndex are looked up in the model's vectors
+(entities of several words by the mean of their word vectors) into one normalised float32 matrix, so cosine
+similarity is a matrix product. Pairs at or above threshold are found block by block, each block of rows against
+the rows after it, memory bounded by BLOCK_ELEMENTS. For large vocabularies, approximate=True finds them only within
+buckets of random hyperplane hashes (LSH) of several tables, trading some missed pairs for much less work.
+Terms joined by similar pairs form a cluster (connected components, found with vectorised union-find), so "king"
+and "monarch" share a cluster and its sentiment [sum, count] over all of its terms.
+
+Terms with no vector, e.g. with the sm model or for unknown words, stay in clusters of their own.
+
+INPUT: Spacy Vocab with vectors, NounChunkCollector, EntityIndex.
+OUTPUT: TopicClusters of the terms with cluster sentiment scores.
+'''
+import heapq
+import numpy
+from operator import itemgetter
+from timeit import default_timer as timer
+from datetime import datetime
+from spacy.strings import hash_string
+from common.profiling import measure
+
+THRESHOLD = 0.6
+# Most similarity values computed at once, 2 ** 24 float32 values being 64 MB
+BLOCK_ELEMENTS = 2 ** 24
+# Approximate mode is used by default from this many terms on
+APPROXIMATE_TERMS = 50000
+# Aimed LSH bucket size and number of hash tables
+BUCKET_SIZE = 256
+LSH_TABLES = 16
+
+ROOT = 'root'
+ENTITY = 'entity'
+
+
+# Returns list of (term, kind, total, count) of the roots of a NounChunkCollector
+def root_terms(chunks) -> list:
+    return [(root, ROOT, total, count) for root, (total, count) in chunks.root_sentiment.items()]
+
+
+# Returns list of (term, kind, total, count) of the entities of an EntityIndex, of all labels together
+def entity_terms(index) -> list:
+    sentiment = {}
+    for entry in index.entries.values():
+        accumulator = sentiment.setdefault(entry.text.lower(), [0, 0])
+        accumulator[0] += entry.total
+        accumulator[1] += entry.count
+    return [(text, ENTITY, total, count) for text, (total, count) in sentiment.items()]
+
+
+# Returns normalised float32 matrix of the term vectors, the mean of their word vectors, and boolean mask of the
+# terms that have one. Words are looked up in lowercase, then as written.
+def term_vectors(vocab, terms: list) -> tuple:
+    vectors = vocab.vectors
+    width = vectors.data.shape[1] if len(vectors.data.shape) == 2 else 0
+    matrix = numpy.zeros((len(terms), width), dtype=numpy.float32)
+    if width == 0 or not terms:
+        return matrix, numpy.zeros(len(terms), dtype=bool)
+
+    owners, words = [], []
+    for i, term in enumerate(terms):
+        for word in term.split():
+            owners.append(i)
+            words.append(word)
+
+    rows = numpy.asarray(vectors.find(keys=[hash_string(word.lower()) for word in words]))
+    missing = rows < 0
+    if missing.any():
+        rows[missing] = vectors.find(keys=[hash_string(words[i]) for i in numpy.flatnonzero(missing).tolist()])
+
+    owners = numpy.asarray(owners)
+    found = rows >= 0
+    data = numpy.asarray(vectors.data, dtype=numpy.float32)
+    numpy.add.at(matrix, owners[found], data[rows[found]])
+
+    norms = numpy.linalg.norm(matrix, axis=1)
+    has_vector = norms > 0
+    matrix[has_vector] /= norms[has_vector, None]
+
+    return matrix, has_vector
+
+
+# Returns (first, second) index arrays of the row pairs with similarity at or above threshold, first < second
+def similar_pairs(matrix, threshold=THRESHOLD) -> tuple:
+    size = len(matrix)
+    block = max(1, BLOCK_ELEMENTS // max(size, 1))
+    firsts, seconds = [], []
+
+    for start in range(0, size, block):
+        similarity = matrix[start:start + block] @ matrix[start:].T
+        rows, columns = numpy.nonzero(similarity >= threshold)
+        rows += start
+        columns += start
+        kept = columns > rows
+        firsts.append(rows[kept])
+        seconds.append(columns[kept])
+
+    if not firsts:
+        return numpy.zeros(0, dtype=numpy.intp), numpy.zeros(0, dtype=numpy.intp)
+    return numpy.concatenate(firsts), numpy.concatenate(seconds)
+
+
+# Returns similar pairs as similar_pairs, compared only within buckets of random hyperplane hashes
+# A pair is found if it shares a bucket in any of the tables, more tables find more pairs but take longer
+def lsh_pairs(matrix, threshold=THRESHOLD, tables=LSH_TABLES, bucket_size=BUCKET_SIZE, seed=0) -> tuple:
+    size, width = matrix.shape
+    bits = max(1, min(62, int(numpy.log2(max(size / bucket_size, 2)))))
+    weights = numpy.left_shift(1, numpy.arange(bits, dtype=numpy.int64))
+    random = numpy.random.RandomState(seed)
+    firsts, seconds = [], []
+
+    for table in range(tables):
+        planes = random.standard_normal((width, bits)).astype(numpy.float32)
+        codes = ((matrix @ planes) > 0) @ weights
+        order = numpy.argsort(codes, kind='stable')
+        bounds = numpy.flatnonzero(numpy.diff(codes[order])) + 1
+
+        for bucket in numpy.split(order, bounds):
+            if len(bucket) > 1:
+                first, second = similar_pairs(matrix[bucket], threshold)
+                firsts.append(bucket[first])
+                seconds.append(bucket[second])
+
+    if not firsts:
+        return numpy.zeros(0, dtype=numpy.intp), numpy.zeros(0, dtype=numpy.intp)
+    return numpy.concatenate(firsts), numpy.concatenate(seconds)
+
+
+# Returns component label of each of size items joined by the pairs, the smallest index of the component
+# Union-find over arrays: roots are hooked under the smaller root of each pair, then pointers jumped until flat
+def connected_components(size: int, first, second) -> numpy.ndarray:
+    labels = numpy.arange(size)
+
+    while True:
+        parents = labels.copy()
+        low = numpy.minimum(labels[first], labels[second])
+        numpy.minimum.at(parents, labels[first], low)
+        numpy.minimum.at(parents, labels[second], low)
+
+        while True:
+            grand = parents[parents]
+            if numpy.array_equal(grand, parents):
+                break
+            parents = grand
+
+        if numpy.array_equal(parents, labels):
+            return labels
+        labels = parents
+
+
+class TopicClusters:
+    def __init__(self, terms: list, kinds: list, labels, totals, counts):
+        self.terms = terms
+        self.kinds = kinds
+        self.labels = labels
+        self.totals = totals
+        self.counts = counts
+
+        # Cluster sentiment, the sum over the terms of the cluster
+        self.cluster_totals = numpy.bincount(labels, weights=totals, minlength=len(terms)).astype(numpy.int64)
+        self.cluster_counts = numpy.bincount(labels, weights=counts, minlength=len(terms)).astype(numpy.int64)
+
+        self._index = {}
+        for i, term in enumerate(terms):
+            self._index.setdefault(term.lower(), []).append(i)
+        self._names = None
+
+    # Returns clusters of the roots of the collector and entities of the index, approximate by default for
+    # APPROXIMATE_TERMS terms or more
+    @classmethod
+    def build(cls, vocab, chunks=None, entities=None, threshold=THRESHOLD, approximate=None):
+        items = (root_terms(chunks) if chunks is not None else []) + \
+                (entity_terms(entities) if entities is not None else [])
+        terms = [term for term, kind, total, count in items]
+        kinds = [kind for term, kind, total, count in items]
+        totals = numpy.array([total for term, kind, total, count in items], dtype=numpy.int64)
+        counts = numpy.array([count for term, kind, total, count in items], dtype=numpy.int64)
+
+        with measure('topics.vectors', len(terms)):
+            matrix, has_vector = term_vectors(vocab, terms)
+        with measure('topics.pairs', len(terms)):
+            rows = numpy.flatnonzero(has_vector)
+            if approximate is None:
+                approximate = len(rows) >= APPROXIMATE_TERMS
+            find = lsh_pairs if approximate else similar_pairs
+            first, second = find(matrix[rows], threshold)
+        with measure('topics.components', len(first)):
+            labels = connected_components(len(terms), rows[first], rows[second])
+
+        return cls(terms, kinds, labels, totals, counts)
+
+    # Returns dictionary of cluster label and its name, the term of the cluster with most sentiment words
+    def _cluster_names(self) -> dict:
+        if self._names is None:
+            names = {}
+            best = {}
+            for i, label in enumerate(self.labels.tolist()):
+                if label not in best or self.counts[i] > self.counts[best[label]]:
+                    best[label] = i
+            for label, i in best.items():
+                names[label] = self.terms[i]
+            self._names = names
+        return self._names
+
+    # Returns dictionary of cluster name and its terms, as default only clusters of two or more terms
+    def get_clusters(self, minimum=2) -> dict:
+        members = {}
+        for i, label in enumerate(self.labels.tolist()):
+            members.setdefault(label, []).append(self.terms[i])
+
+        # A term found both as root and as entity is listed once
+        names = self._cluster_names()
+        return {names[label]: list(dict.fromkeys(terms)) for label, terms in members.items() if len(terms) >= minimum}
+
+    # Returns list of terms sharing a cluster with the term, empty list if not a root or entity
+    def get_cluster(self, term: str) -> list:
+        labels = {int(self.labels[i]) for i in self._index.get(term.lower(), [])}
+        return list(dict.fromkeys(self.terms[i] for i in numpy.flatnonzero(numpy.isin(self.labels, list(labels)))))
+
+    # Returns sentiment score of the cluster of the term, 0 if it has no sentiment words or is not known
+    def get_term_score(self, term: str) -> float:
+        indexes = self._index.get(term.lower())
+        if not indexes:
+            return 0
+        label = self.labels[indexes[0]]
+        return self._score(self.cluster_totals[label], self.cluster_counts[label])
+
+    # Returns dictionary of cluster name and sentiment score
+    def get_scores(self, minimum=1) -> dict:
+        names = self._cluster_names()
+        sizes = numpy.bincount(self.labels, minlength=len(self.terms))
+        return {names[label]: self._score(self.cluster_totals[label], self.cluster_counts[label])
+                for label in names if sizes[label] >= minimum}
+
+    # Returns as default 10 highest scoring clusters of two or more terms
+    def get_mostpos(self, number=10) -> dict:
+        return dict(heapq.nlargest(number, self.get_scores(2).items(), key=itemgetter(1)))
+
+    # Returns as default 10 lowest scoring clusters of two or more terms
+    def get_mostneg(self, number=10) -> dict:
+        return dict(heapq.nsmallest(number, self.get_scores(2).items(), key=itemgetter(1)))
+
+    @staticmethod
+    def _score(total, count) -> float:
+        return 0 if total == 0 else round(float(total / count), 4)
+
+
+if __name__ == '__main__':
+    from analysers import models
+    from analysers.corpusRunner import CorpusRunner
+    from analysers.docCache import DocCache
+    from analysers.nounChunks import NounChunkCollector
+    from analysers.entitySentiment import EntityIndex
+
+    nlp = models.load('entities', 'noun_chunks', 'sentiment', size='lg')
+
+    # Set document or corpus to be analysed below
+    chunks, entities = CorpusRunner(nlp, cache=DocCache()).run('FILENAME.txt', NounChunkCollector(), EntityIndex())
+
+    print(f'Starting topic clustering at {datetime.now()} ...')
+    start = timer()
+
+    topics = TopicClusters.build(nlp.vocab, chunks, entities)
+
+    end = timer()
+    print(f'Finished topic clustering of {len(topics.terms)} terms at {datetime.now()}. '
+          f'\nTook {end - start} seconds')
+
+    clusters = topics.get_clusters()
+    for name in sorted(clusters, key=lambda x: len(clusters[x]), reverse=True)[:10]:
+        print(name, topics.get_term_score(name), clusters[name])
+    print(topics.get_mostpos())
+    print(topics.get_mostneg())
@@ -0,0 +1,247 @@
+'''
+Benchmark suite for the Sentiment class, basicStats, nounChunks and entitySentiment functions.
+
+Runs every target on synthetic documents of each size (see benchmarks.syntheticCorpus) and reports throughput
+in tokens per second, peak traced allocation and the peak RSS of the process so far, which is the high-water mark
+of every run before it, not of the target alone. With blank pipeline the documents are built already annotated, so
+the suite runs offline; with sm/md/lg the synthetic text is parsed by that model first, in pieces of at most
+MAX_CHARS characters joined into one document, so sizes over the model's max_length can be run too.
+Noun chunk indexes are cleared before each run, so nc_* timings include building the index.
+
+Results can be saved as baseline and later runs compared against it. A target is reported as regression
+if it is more than tolerance times slower than the baseline, and as not scaling if its time per token
+on the largest size is more than SCALING_LIMIT times that on the smallest, e.g. quadratic cluster merges.
+
+Run e.g. python -m benchmarks.benchSuite --sizes 1000 10000 100000 1000000 --save baseline.json
+and python -m benchmarks.benchSuite --compare baseline.json
+
+INPUT: Document sizes, pipeline and baseline file.
+OUTPUT: Benchmark table printed, baseline JSON file.
+'''
+import gc
+import sys
+import json
+import argparse
+import tracemalloc
+import numpy
+from timeit import default_timer as timer
+from spacy.attrs import TAG, POS, LEMMA, HEAD, DEP
+from spacy.tokens import Doc, Span
+from analysers import basicStats, nounChunks, entitySentiment, models
+from analysers.corpusRunner import line_pieces
+from sentiment.classSentiment import Sentiment
+from benchmarks.syntheticCorpus import SyntheticCorpus
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+SIZES = (1000, 10000, 100000)
+REPEATS = 3
+TOLERANCE = 1.5
+SCALING_LIMIT = 4.0
+
+# Token attributes copied from the parsed pieces into the joined document
+JOINED_ATTRS = [TAG, POS, LEMMA, HEAD, DEP]
+
+# Target name and function called with the document and its list of token texts
+TARGETS = [
+    ('Sentiment.sentiment_text', lambda doc, words: Sentiment.sentiment_text(words)),
+    ('Sentiment.sentiment_text_values', lambda doc, words: Sentiment.sentiment_text_values(words)),
+    ('Sentiment.sentiment_single_word', lambda doc, words: [Sentiment.sentiment_single_word(word) for word in words]),
+    ('basicStats.get_token_count', lambda doc, words: basicStats.get_token_count(doc)),
+    ('basicStats.get_top_tokens', lambda doc, words: basicStats.get_top_tokens(doc)),
+    ('basicStats.get_top_tokens_cleaned', lambda doc, words: basicStats.get_top_tokens_cleaned(doc)),
+    ('basicStats.get_named_entities', lambda doc, words: basicStats.get_named_entities(doc)),
+    ('basicStats.get_top_lemmas', lambda doc, words: basicStats.get_top_lemmas(doc)),
+    ('basicStats.get_top_lemmas_cleaned', lambda doc, words: basicStats.get_top_lemmas_cleaned(doc)),
+    ('basicStats.get_pos', lambda doc, words: basicStats.get_pos(doc)),
+    ('basicStats.StatsCollector', lambda doc, words: basicStats.StatsCollector(doc)),
+    ('nounChunks.nc_list', lambda doc, words: nounChunks.nc_list(doc)),
+    ('nounChunks.nc_list_cleaned', lambda doc, words: nounChunks.nc_list_cleaned(doc)),
+    ('nounChunks.nc_min', lambda doc, words: nounChunks.nc_min(doc)),
+    ('nounChunks.nc_words', lambda doc, words: nounChunks.nc_words(doc)),
+    ('nounChunks.nc_lemmas', lambda doc, words: nounChunks.nc_lemmas(doc)),
+    ('nounChunks.nc_clusters', lambda doc, words: nounChunks.nc_clusters(doc)),
+    ('nounChunks.nc_lemma_clusters', lambda doc, words: nounChunks.nc_lemma_clusters(doc)),
+    ('nounChunks.nc_sentiment', lambda doc, words: nounChunks.nc_sentiment(doc)),
+    ('nounChunks.nc_roots_sentiment', lambda doc, words: nounChunks.nc_roots_sentiment(doc)),
+    ('nounChunks.nc_root_sentiment', lambda doc, words: nounChunks.nc_root_sentiment(doc)),
+    ('nounChunks.nc_root_sentiment_score', lambda doc, words: nounChunks.nc_root_sentiment_score(doc)),
+    ('nounChunks.nc_root_mostpos', lambda doc, words: nounChunks.nc_root_mostpos(doc)),
+    ('nounChunks.nc_root_mostneg', lambda doc, words: nounChunks.nc_root_mostneg(doc)),
+    ('nounChunks.nc_word_cluster', lambda doc, words: nounChunks.nc_word_cluster('king', doc)),
+    ('nounChunks.nc_word_lemmas', lambda doc, words: nounChunks.nc_word_lemmas('king', doc)),
+    ('nounChunks.NounChunkCollector', lambda doc, words: nounChunks.NounChunkCollector(doc)),
+    ('entitySentiment.EntityIndex', lambda doc, words: entitySentiment.EntityIndex(doc)),
+]
+
+
+# Returns synthetic document of the size, annotated directly for blank pipeline, otherwise parsed by the model
+def make_doc(size: int, pipeline='blank', seed=0):
+    corpus = SyntheticCorpus(seed)
+
+    if pipeline == 'blank':
+        import spacy
+        return corpus.doc(spacy.blank('en').vocab, size)
+
+    nlp = models.load(size=pipeline)
+    pieces = line_pieces(corpus.text(size).splitlines(keepends=True))
+    return join_docs(nlp.vocab, nlp.pipe(pieces))
+
+
+# Returns one document of the documents in order, with their tags, lemmas, parse and entities
+def join_docs(vocab, docs):
+    words, spaces, arrays, entities = [], [], [], []
+
+    for doc in docs:
+        offset = len(words)
+        words.extend(token.text for token in doc)
+        spaces.extend(bool(token.whitespace_) for token in doc)
+        # Heads are relative to the token, so the arrays can be joined as they are
+        arrays.append(doc.to_array(JOINED_ATTRS))
+        entities.extend((offset + ent.start, offset + ent.end, ent.label) for ent in doc.ents)
+
+    document = Doc(vocab, words=words, spaces=spaces)
+    if arrays:
+        document.from_array(JOINED_ATTRS, numpy.concatenate(arrays))
+    document.ents = [Span(document, start, end, label=label) for start, end, label in entities]
+
+    return document
+
+
+# Returns peak resident set size of the process so far in kilobytes, None where not available
+def peak_rss() -> int:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, kilobytes elsewhere
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+# Returns best wall time of the target over repeats, and peak traced allocation of one more run
+def measure(function, doc, words, repeats=REPEATS) -> tuple:
+    best = None
+
+    for i in range(repeats):
+        nounChunks.nc_index_clear(doc)
+        gc.collect()
+        start = timer()
+        function(doc, words)
+        elapsed = timer() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    nounChunks.nc_index_clear(doc)
+    tracemalloc.start()
+    function(doc, words)
+    allocated = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return best, allocated
+
+
+# Runs the targets on each size, returns list of result dictionaries
+def run(sizes=SIZES, pipeline='blank', targets=None, repeats=REPEATS) -> list:
+    results = []
+
+    for size in sizes:
+        doc = make_doc(size, pipeline)
+        words = [token.text for token in doc]
+
+        for name, function in TARGETS:
+            if targets and not any(name.startswith(target) for target in targets):
+                continue
+
+            seconds, allocated = measure(function, doc, words, repeats)
+            results.append({'target': name,
+                            'size': size,
+                            'tokens': len(doc),
+                            'seconds': seconds,
+                            'tokens_per_second': len(doc) / seconds if seconds else None,
+                            'process_peak_rss_kb': peak_rss(),
+                            'peak_alloc_bytes': allocated})
+
+    return results
+
+
+# Returns list of (target, small size, large size, ratio) for targets whose time per token grows beyond the limit
+def scaling_problems(results: list, limit=SCALING_LIMIT) -> list:
+    problems = []
+    by_target = {}
+
+    for result in results:
+        by_target.setdefault(result['target'], []).append(result)
+
+    for target, rows in by_target.items():
+        rows = sorted(rows, key=lambda x: x['tokens'])
+        small, large = rows[0], rows[-1]
+        if small is large or not small['seconds']:
+            continue
+
+        ratio = (large['seconds'] / large['tokens']) / (small['seconds'] / small['tokens'])
+        if ratio > limit:
+            problems.append((target, small['size'], large['size'], ratio))
+
+    return problems
+
+
+# Returns list of (target, size, baseline seconds, seconds) for results slower than tolerance times baseline
+def regressions(results: list, baseline: list, tolerance=TOLERANCE) -> list:
+    previous = {(result['target'], result['size']): result for result in baseline}
+    slower = []
+
+    for result in results:
+        old = previous.get((result['target'], result['size']))
+        if old is not None and result['seconds'] > old['seconds'] * tolerance:
+            slower.append((result['target'], result['size'], old['seconds'], result['seconds']))
+
+    return slower
+
+
+def save(path: str, results: list, pipeline: str):
+    with open(path, 'w') as f:
+        json.dump({'pipeline': pipeline, 'results': results}, f, indent=1)
+
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def report(results: list):
+    print(f'{"target":40} {"tokens":>9} {"seconds":>10} {"tokens/s":>12} {"proc RSS kB":>12} {"alloc kB":>10}')
+    for result in results:
+        print(f'{result["target"]:40} {result["tokens"]:>9} {result["seconds"]:>10.5f} '
+              f'{result["tokens_per_second"] or 0:>12.0f} {result["process_peak_rss_kb"] or 0:>12} '
+              f'{result["peak_alloc_bytes"] // 1024:>10}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the analysers and sentiment classes.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES), help='document sizes in tokens')
+    parser.add_argument('--pipeline', default='blank', help='blank, sm, md or lg')
+    parser.add_argument('--targets', nargs='*', help='target name prefixes, e.g. nounChunks.nc_clusters')
+    parser.add_argument('--repeats', type=int, default=REPEATS)
+    parser.add_argument('--save', help='write results as baseline JSON file')
+    parser.add_argument('--compare', help='baseline JSON file to compare against')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.pipeline, args.targets, args.repeats)
+    report(results)
+    failed = False
+
+    for target, small, large, ratio in scaling_problems(results):
+        print(f'NOT SCALING: {target} time per token {ratio:.1f}x higher at {large} than at {small} tokens')
+        failed = True
+
+    if args.compare:
+        for target, size, old, new in regressions(results, load(args.compare)['results'], args.tolerance):
+            print(f'REGRESSION: {target} at {size} tokens took {new:.5f} seconds, baseline {old:.5f}')
+            failed = True
+
+    if args.save:
+        save(args.save, results, args.pipeline)
+
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,144 @@
+'''
+Deterministic synthetic corpus for benchmarking, generated offline without a language model.
+
+Sentences follow a small grammar (determiners, adjectives, nouns, verbs, prepositional phrases and person names)
+with words drawn from the Hu and Liu lexicon and neutral word lists, so sentiment lookups hit at a realistic rate.
+The same seed always gives the same text. synthetic_doc builds the document with POS, lemma, dependency and entity
+annotation already set, so noun_chunks and entities work with a blank pipeline; synthetic_text gives the plain text
+for running through a real model.
+
+INPUT: Number of tokens and seed.
+OUTPUT: Text or spacy document object.
+'''
+import random
+from spacy.attrs import POS, LEMMA, HEAD, DEP
+from spacy.tokens import Doc, Span
+from sentiment.lexicon import get_lexicon
+
+DETERMINERS = ['the', 'a', 'this', 'that', 'every', 'no', 'her', 'his', 'their']
+NOUNS = ['king', 'queen', 'goblin', 'market', 'fruit', 'sister', 'river', 'garden', 'house', 'dove', 'eagle', 'sun',
+         'season', 'fountain', 'jewel', 'peasant', 'baby', 'breast', 'guard', 'hand', 'wood', 'spice', 'flower',
+         'merchant', 'city', 'road', 'night', 'morning', 'letter', 'horse', 'ship', 'village', 'forest', 'stone']
+VERBS = ['saw', 'loved', 'feared', 'kept', 'found', 'sold', 'bought', 'carried', 'watched', 'praised', 'blamed',
+         'followed', 'left', 'met', 'heard', 'called']
+PREPOSITIONS = ['with', 'in', 'near', 'under', 'from', 'beyond', 'behind']
+NAMES = [('Laura', 'PERSON'), ('Lizzie', 'PERSON'), ('Jeanie', 'PERSON'), ('London', 'GPE'), ('Seattle', 'GPE'),
+         ('Washington', 'GPE'), ('Rossetti', 'PERSON'), ('Thames', 'LOC')]
+
+
+class SyntheticCorpus:
+    def __init__(self, seed=0):
+        self.seed = seed
+        lexicon = get_lexicon()
+        # Single words only, sorted so the choice does not depend on set order
+        self.positive = sorted(word for word in lexicon.positive if word.isalpha())
+        self.negative = sorted(word for word in lexicon.negative if word.isalpha())
+
+    # Returns list of (word, pos, lemma, head, dep) tuples of about n_tokens tokens, head being absolute index,
+    # and list of (start, end, label) entity spans
+    def tokens(self, n_tokens: int) -> tuple:
+        rng = random.Random(self.seed)
+        tokens = []
+        entities = []
+
+        while len(tokens) < n_tokens:
+            self._sentence(rng, tokens, entities)
+
+        return tokens, entities
+
+    def _sentence(self, rng, tokens, entities):
+        subject = self._noun_phrase(rng, tokens, entities)
+        verb = len(tokens)
+        word = rng.choice(VERBS)
+        tokens.append((word, 'VERB', word, verb, 'ROOT'))
+        obj = self._noun_phrase(rng, tokens, entities)
+
+        if rng.random() < 0.4:
+            preposition = len(tokens)
+            word = rng.choice(PREPOSITIONS)
+            tokens.append((word, 'ADP', word, obj, 'prep'))
+            pobj = self._noun_phrase(rng, tokens, entities)
+            self._attach(tokens, pobj, preposition, 'pobj')
+
+        self._attach(tokens, subject, verb, 'nsubj')
+        self._attach(tokens, obj, verb, 'dobj')
+        tokens.append(('.', 'PUNCT', '.', verb, 'punct'))
+
+        # Paragraph breaks every few sentences, as in real texts
+        if rng.random() < 0.1:
+            tokens.append(('\n\n', 'SPACE', '\n\n', verb, 'dep'))
+
+    # Adds a noun phrase, returns index of its root, head of the root is set later by _attach
+    def _noun_phrase(self, rng, tokens, entities) -> int:
+        if rng.random() < 0.15:
+            name, label = rng.choice(NAMES)
+            root = len(tokens)
+            tokens.append((name, 'PROPN', name, root, ''))
+            entities.append((root, root + 1, label))
+            return root
+
+        words = [(rng.choice(DETERMINERS), 'DET', 'det')]
+        for i in range(rng.choice((0, 0, 1, 1, 2))):
+            kind = rng.random()
+            if kind < 0.2:
+                words.append((rng.choice(self.positive), 'ADJ', 'amod'))
+            elif kind < 0.4:
+                words.append((rng.choice(self.negative), 'ADJ', 'amod'))
+            else:
+                words.append((rng.choice(['old', 'little', 'green', 'golden', 'quiet', 'far']), 'ADJ', 'amod'))
+
+        root = len(tokens) + len(words)
+        for word, pos, dep in words:
+            tokens.append((word, pos, word, root, dep))
+
+        noun = rng.choice(NOUNS)
+        plural = rng.random() < 0.3
+        tokens.append((noun + 's' if plural else noun, 'NOUN', noun, root, ''))
+
+        return root
+
+    @staticmethod
+    def _attach(tokens, child, head, dep):
+        word, pos, lemma, old_head, old_dep = tokens[child]
+        tokens[child] = (word, pos, lemma, head, dep)
+
+    # Returns synthetic text of about n_tokens tokens
+    def text(self, n_tokens: int) -> str:
+        tokens, entities = self.tokens(n_tokens)
+        words = [word for word, pos, lemma, head, dep in tokens]
+        return ''.join(word if word in ('.', '\n\n') or i == 0 or words[i - 1] == '\n\n' else ' ' + word
+                       for i, word in enumerate(words))
+
+    # Returns annotated document of about n_tokens tokens, noun_chunks and ents set as a parsed document would have
+    def doc(self, vocab, n_tokens: int):
+        tokens, entities = self.tokens(n_tokens)
+        words = [word for word, pos, lemma, head, dep in tokens]
+        spaces = [i + 1 < len(tokens) and tokens[i + 1][0] not in ('.', '\n\n') and word != '\n\n'
+                  for i, word in enumerate(words)]
+        document = Doc(vocab, words=words, spaces=spaces)
+
+        strings = vocab.strings
+        array = document.to_array([POS, LEMMA, HEAD, DEP])
+        for i, (word, pos, lemma, head, dep) in enumerate(tokens):
+            array[i, 0] = strings.add(pos)
+            array[i, 1] = strings.add(lemma)
+            array[i, 2] = (head - i) & 0xFFFFFFFFFFFFFFFF
+            array[i, 3] = strings.add(dep)
+        document.from_array([POS, LEMMA, HEAD, DEP], array)
+        document.ents = [Span(document, start, end, label=label) for start, end, label in entities]
+
+        return document
+
+
+# Returns synthetic text of about n_tokens tokens
+def synthetic_text(n_tokens: int, seed=0) -> str:
+    return SyntheticCorpus(seed).text(n_tokens)
+
+
+# Returns annotated synthetic document of about n_tokens tokens
+def synthetic_doc(vocab, n_tokens: int, seed=0):
+    return SyntheticCorpus(seed).doc(vocab, n_tokens)
+
+
+if __name__ == '__main__':
+    print(synthetic_text(60))
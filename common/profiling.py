@@ -0,0 +1,287 @@
+'''
+Opt-in instrumentation of the analysis stages: spacy pipeline components, noun chunk iteration, lemmatisation,
+lexicon lookups and export writing.
+
+Stages record wall and CPU time, call count, items processed (tokens, words or rows) and, with memory=True, the
+traced memory delta. Instrumentation is off unless switched on, either for a block of code:
+
+    with profiling(cprofile=True) as profile:
+        ...
+    profile.to_json('report.json')
+    profile.dump_stats('report.pstats')
+
+or for the whole process with ENTITYANALYSER_PROFILE environment variable, set to 1 for a report on stderr at exit
+or to a file path for a JSON report there (and a .pstats dump next to it).
+
+When off, an instrumented function costs one global lookup per call, so only per-document and per-list stages
+are instrumented, not per-word functions. Spacy component times come from instrument_pipeline(nlp).
+
+INPUT: Instrumented functions, spacy Language object.
+OUTPUT: Report dictionary, JSON file, pstats dump.
+'''
+import os
+import sys
+import json
+import time
+import atexit
+import cProfile
+import functools
+import tracemalloc
+from timeit import default_timer as timer
+
+ENVIRONMENT_VARIABLE = 'ENTITYANALYSER_PROFILE'
+
+_active = None
+
+
+class Stage:
+    __slots__ = ('wall', 'cpu', 'calls', 'items', 'memory')
+
+    def __init__(self):
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.calls = 0
+        self.items = 0
+        self.memory = 0
+
+    def to_dict(self) -> dict:
+        return {'wall': self.wall, 'cpu': self.cpu, 'calls': self.calls, 'items': self.items,
+                'items_per_second': self.items / self.wall if self.wall else None, 'memory': self.memory}
+
+
+class Profile:
+    def __init__(self, cprofile=False, memory=False):
+        self.stages = {}
+        self.memory = memory
+        self.profiler = cProfile.Profile() if cprofile else None
+        self.wall = 0.0
+        self._started = None
+
+    def start(self):
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if self.profiler is not None:
+            self.profiler.enable()
+        self._started = timer()
+
+    def stop(self):
+        if self._started is not None:
+            self.wall += timer() - self._started
+            self._started = None
+        if self.profiler is not None:
+            self.profiler.disable()
+        if self.memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def record(self, name: str, wall: float, cpu: float, items=0, memory=0):
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = Stage()
+
+        stage.wall += wall
+        stage.cpu += cpu
+        stage.calls += 1
+        stage.items += items
+        stage.memory += memory
+
+    # Returns report dictionary, stages sorted by wall time
+    def report(self) -> dict:
+        stages = sorted(self.stages.items(), key=lambda x: x[1].wall, reverse=True)
+        return {'wall': self.wall, 'stages': {name: stage.to_dict() for name, stage in stages}}
+
+    def to_json(self, path: str):
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=1)
+
+    # Writes cProfile statistics, readable with pstats.Stats(path)
+    def dump_stats(self, path: str):
+        if self.profiler is None:
+            raise ValueError('Profile was created without cprofile=True')
+        self.profiler.dump_stats(path)
+
+
+# Returns the active profile, None if instrumentation is off
+def active() -> Profile:
+    return _active
+
+
+class profiling:
+    def __init__(self, cprofile=False, memory=False):
+        self.profile = Profile(cprofile, memory)
+        self._previous = None
+
+    def __enter__(self) -> Profile:
+        global _active
+        self._previous = _active
+        _active = self.profile
+        self.profile.start()
+        return self.profile
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        global _active
+        self.profile.stop()
+        _active = self._previous
+
+
+# Context manager timing a block of code as a stage, does nothing when instrumentation is off
+class measure:
+    __slots__ = ('name', 'items', '_profile', '_wall', '_cpu', '_memory')
+
+    def __init__(self, name: str, items=0):
+        self.name = name
+        self.items = items
+
+    def __enter__(self):
+        self._profile = _active
+        if self._profile is not None:
+            self._memory = _traced()
+            self._cpu = time.process_time()
+            self._wall = timer()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._profile is not None:
+            wall = timer() - self._wall
+            self._profile.record(self.name, wall, time.process_time() - self._cpu, self.items,
+                                 _traced() - self._memory)
+
+
+# Decorator recording calls of the function as a stage, items(args, result) returns the number of items processed
+def stage(name: str, items=None):
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            profile = _active
+            if profile is None:
+                return function(*args, **kwargs)
+
+            memory = _traced()
+            cpu = time.process_time()
+            start = timer()
+            result = function(*args, **kwargs)
+            wall = timer() - start
+            profile.record(name, wall, time.process_time() - cpu,
+                           items(args, result) if items is not None else 0, _traced() - memory)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+# Number of items helpers for stage(), e.g. stage('name', items=first_length)
+def first_length(args, result) -> int:
+    return len(args[0])
+
+
+def second_length(args, result) -> int:
+    return len(args[1])
+
+
+def _traced() -> int:
+    return tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+
+
+# Spacy pipeline component wrapper recording the time spent in the component itself, both in nlp() and nlp.pipe()
+class TimedComponent:
+    def __init__(self, name: str, component):
+        self.name = name
+        self.component = component
+        self.stage = 'spacy.' + name
+
+    def __call__(self, doc):
+        profile = _active
+        if profile is None:
+            return self.component(doc)
+
+        cpu = time.process_time()
+        start = timer()
+        doc = self.component(doc)
+        profile.record(self.stage, timer() - start, time.process_time() - cpu, len(doc))
+        return doc
+
+    def pipe(self, stream, **kwargs):
+        if not hasattr(self.component, 'pipe'):
+            for doc in stream:
+                yield self(doc)
+            return
+        # Off when the stream starts, the component runs unwrapped
+        if _active is None:
+            yield from self.component.pipe(stream, **kwargs)
+            return
+
+        # Time pulling docs from upstream components is taken off, so each component gets only its own time
+        upstream = [0.0, 0.0]
+        docs = iter(self.component.pipe(_timed_iter(stream, upstream), **kwargs))
+        while True:
+            profile = _active
+            before_wall, before_cpu = upstream
+            cpu = time.process_time()
+            start = timer()
+            try:
+                doc = next(docs)
+            except StopIteration:
+                return
+            if profile is not None:
+                profile.record(self.stage, timer() - start - (upstream[0] - before_wall),
+                               time.process_time() - cpu - (upstream[1] - before_cpu), len(doc))
+            yield doc
+
+    def __getattr__(self, name):
+        # Guard for unpickling, when component is not set yet
+        if name == 'component':
+            raise AttributeError(name)
+        return getattr(self.component, name)
+
+
+def _timed_iter(stream, totals):
+    iterator = iter(stream)
+    while True:
+        cpu = time.process_time()
+        start = timer()
+        try:
+            doc = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            totals[0] += timer() - start
+            totals[1] += time.process_time() - cpu
+        yield doc
+
+
+# Wraps each pipeline component of the model in TimedComponent, returns the model
+def instrument_pipeline(nlp):
+    components = _components(nlp)
+    components[:] = [(name, component if isinstance(component, TimedComponent) else TimedComponent(name, component))
+                     for name, component in components]
+    return nlp
+
+
+# Removes the TimedComponent wrappers, returns the model
+def uninstrument_pipeline(nlp):
+    components = _components(nlp)
+    components[:] = [(name, component.component if isinstance(component, TimedComponent) else component)
+                     for name, component in components]
+    return nlp
+
+
+# Returns the list of (name, component) of the model, nlp.pipeline in spacy 2, nlp._components in spacy 3
+def _components(nlp) -> list:
+    return getattr(nlp, '_components', nlp.pipeline)
+
+
+def _report_at_exit(context: profiling, target: str):
+    context.__exit__(None, None, None)
+    profile = context.profile
+
+    if target == '1':
+        json.dump(profile.report(), sys.stderr, indent=1)
+    else:
+        profile.to_json(target)
+        profile.dump_stats(os.path.splitext(target)[0] + '.pstats')
+
+
+if os.environ.get(ENVIRONMENT_VARIABLE):
+    _context = profiling(cprofile=os.environ[ENVIRONMENT_VARIABLE] != '1', memory=False)
+    _context.__enter__()
+    atexit.register(_report_at_exit, _context, os.environ[ENVIRONMENT_VARIABLE])
@@ -1,6 +1,9 @@
 from sentiment.classNegative import *
 from sentiment.classPositive import *
-import regex as re
+from sentiment.lexicon import get_lexicon
+from sentiment.wordSentiment import WordSentiment
+from common.profiling import stage, first_length
+from array import array
 from timeit import default_timer as timer
 from datetime import datetime
 
@@ -11,56 +14,37 @@ class Sentiment(Negative, Positive):
         Positive.__init__(self)
 
     @staticmethod
-    def sentiment_text(text_list: list) -> list:
-        sentiment = []
-
-        for word in text_list:
-            if word is not re.search(r"\p{P}+", word):
-                if Sentiment().is_positive(word):
-                    sentiment.append((word, 1))
-                elif Sentiment().is_negative(word):
-                    sentiment.append((word, -1))
-                else:
-                    sentiment.append((word, 0))
-            else:
-                pass
-
-        return sentiment
+    @stage('sentiment.sentiment_text', items=first_length)
+    def sentiment_text(text_list: list) -> WordSentiment:
+        words = list(text_list)
+        return WordSentiment(words, array('b', get_lexicon().labels(words)))
 
     @staticmethod
+    @stage('sentiment.sentiment_text_values', items=first_length)
     def sentiment_text_values(text_list: list) -> list:
-        sentiment = []
-
-        for word in text_list:
-            if word is not re.search(r"\p{P}+", word):
-                if Sentiment().is_positive(word):
-                    sentiment.append(1)
-                elif Sentiment().is_negative(word):
-                    sentiment.append(-1)
-                else:
-                    sentiment.append(0)
-            else:
-                pass
-
-        return sentiment
+        return get_lexicon().labels(text_list)
 
     @staticmethod
     def sentiment_single_word(word: str) -> int:
-        if word is re.search(r"\p{P}+", word):
-            return 0
-        elif Sentiment().is_positive(word):
-            return 1
-        elif Sentiment().is_negative(word):
-            return -1
-        else:
+        lexicon = get_lexicon()
+        if lexicon.is_punct(word):
             return 0
+        return lexicon.label(word)
 
     @staticmethod
+    @stage('sentiment.sentiment_score_text', items=first_length)
     def sentiment_score_text(text) -> float:
-        score = [item[1] for item in Sentiment().sentiment_text(text)]
+        score = get_lexicon().labels(text)
         return float(sum(score) / len(score))
 
-    # TBI: stop word removal for sentiment score definition (lessen noise, amplify emotional features)
+    # Returns list of word and value pairs with multi-word entries, negation and intensifiers applied, stop words
+    # outside entries left out if drop_stop_words. Opt-in, the lexicon is compiled or loaded from cache on first call,
+    # see sentiment.extendedLexicon
+    @staticmethod
+    @stage('sentiment.sentiment_text_extended', items=first_length)
+    def sentiment_text_extended(text_list: list, drop_stop_words=False) -> list:
+        from sentiment.extendedLexicon import get_extended_lexicon
+        return get_extended_lexicon(drop_stop_words).pairs(list(text_list))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,67 @@
+'''
+Sentiment labels for spacy tokens, gathered by lemma hash instead of looking up word strings.
+
+The lexicon is turned once per process into a sorted array of lemma hashes (the same hashes spacy uses in
+its StringStore) and their labels. A document's labels are then one vectorised lookup over Doc.to_array(LEMMA),
+and a span's labels are a slice of that array, with no string handling per token.
+Tokens with lemma not in the lexicon are looked up by their lowercase form, as the lexicon is lowercase.
+
+INPUT: Spacy document object.
+OUTPUT: Numpy int8 array of sentiment labels per token, 1 positive, -1 negative, 0 otherwise.
+'''
+import numpy
+from functools import lru_cache
+from spacy.attrs import LEMMA, LOWER, IS_PUNCT, IS_SPACE
+from spacy.strings import hash_string
+from sentiment.lexicon import get_lexicon, NEUTRAL
+from common.profiling import stage, first_length
+
+
+# Returns sorted uint64 hashes of the lexicon words and their int8 labels, built on first call
+@lru_cache(maxsize=None)
+def polarity_table() -> tuple:
+    items = sorted((hash_string(word), label) for word, label in get_lexicon().items())
+    keys = numpy.fromiter((key for key, label in items), dtype=numpy.uint64, count=len(items))
+    labels = numpy.fromiter((label for key, label in items), dtype=numpy.int8, count=len(items))
+
+    return keys, labels
+
+
+# Returns int8 labels for array of string hashes, 0 for hashes not in lexicon
+def hash_polarity(hashes) -> numpy.ndarray:
+    keys, labels = polarity_table()
+    hashes = numpy.asarray(hashes, dtype=numpy.uint64)
+
+    index = numpy.searchsorted(keys, hashes)
+    index[index == len(keys)] = 0
+    found = keys[index] == hashes
+
+    return numpy.where(found, labels[index], NEUTRAL).astype(numpy.int8)
+
+
+# Returns int8 sentiment label for every token of the document, looked up by lemma, then by lowercase form
+@stage('sentiment.doc_polarity', items=first_length)
+def doc_polarity(document) -> numpy.ndarray:
+    if len(document) == 0:
+        return numpy.zeros(0, dtype=numpy.int8)
+
+    array = document.to_array([LEMMA, LOWER])
+    polarity = hash_polarity(array[:, 0])
+    missing = polarity == NEUTRAL
+    polarity[missing] = hash_polarity(array[missing, 1])
+
+    return polarity
+
+
+# Returns boolean array, True for the tokens that are words, i.e. not punctuation or white space
+def doc_words(document) -> numpy.ndarray:
+    if len(document) == 0:
+        return numpy.zeros(0, dtype=bool)
+
+    array = document.to_array([IS_PUNCT, IS_SPACE])
+    return (array[:, 0] == 0) & (array[:, 1] == 0)
+
+
+# Returns int8 labels of the word tokens of a span, given labels and word mask of its document
+def span_polarity(span, polarity, words) -> numpy.ndarray:
+    return polarity[span.start:span.end][words[span.start:span.end]]
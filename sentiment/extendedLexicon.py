@@ -0,0 +1,372 @@
+'''
+Weighted sentiment lexicon with multi-word entries, negation, intensifiers and optional stop word removal.
+If run directly, compiles the built-in lexicon and times cold and cached loading and scoring.
+
+Entries are loaded from the Hu and Liu lists of Positive and Negative and from files: Hu and Liu style word lists
+(one entry per line, ';' comments, weight given with the file) and TSV files of entry and weight, later sources
+overriding earlier ones. Entries may have several words, e.g. "over the moon", and are matched on word lists by an
+Aho-Corasick automaton in one pass, time linear to the words however many entries there are. Where matches overlap
+the longer one is kept, e.g. "over the moon" rather than "moon".
+
+Along with matching, a match preceded by a negator (not, never, n't ...) within negation_window words, with no clause
+break between, has its weight multiplied by negation_factor, and one preceded by intensifiers (very, slightly ...)
+by their factors. With drop_stop_words, stop words that are not part of a match are left out of the results and
+the score, so they don't dilute it. Negators and intensifiers are 0 valued words themselves.
+
+The compiled automaton is cached as a NumPy .npz file keyed by the sources' paths, sizes and modification times
+and a hash of the built-in word lists, so later loads skip parsing and building. Set cache directory with ENTITYANALYSER_LEXICON_CACHE.
+
+INPUT: Lexicon files, list of words.
+OUTPUT: Sentiment matches, word value pairs and scores.
+'''
+import os
+import hashlib
+import tempfile
+import numpy
+from collections import deque
+from functools import lru_cache
+from timeit import default_timer as timer
+from spacy.lang.en.stop_words import STOP_WORDS
+from sentiment.classNegative import Negative
+from sentiment.classPositive import Positive
+from sentiment.lexicon import Lexicon, NEUTRAL
+
+CACHE_DIR = os.environ.get('ENTITYANALYSER_LEXICON_CACHE',
+                           os.path.join(os.path.expanduser('~'), '.cache', 'entityAnalyser', 'lexicon'))
+# Bump when the cache file layout changes
+CACHE_VERSION = '1'
+
+NEGATORS = frozenset(('not', "n't", 'no', 'never', 'none', 'nobody', 'nothing', 'nowhere', 'neither', 'nor',
+                      'without', 'hardly', 'barely', 'scarcely', 'cannot', "dont", "don't", "isn't", "wasn't",
+                      "aren't", "weren't", "doesn't", "didn't", "won't", "wouldn't", "shouldn't", "couldn't",
+                      "can't"))
+INTENSIFIERS = {'very': 1.5, 'really': 1.3, 'so': 1.3, 'too': 1.3, 'extremely': 2.0, 'incredibly': 2.0,
+                'absolutely': 1.8, 'totally': 1.5, 'utterly': 1.8, 'highly': 1.5, 'most': 1.5, 'more': 1.2,
+                'quite': 1.2, 'rather': 0.8, 'fairly': 0.8, 'somewhat': 0.7, 'slightly': 0.5, 'little': 0.6,
+                'less': 0.6}
+# Words ending the reach of a negator
+CLAUSE_BREAKS = frozenset(('.', ',', ';', ':', '!', '?', '--', 'but', 'however', 'although', 'though'))
+
+NEGATION_WINDOW = 3
+NEGATION_FACTOR = -1.0
+
+
+# Yields (entry, weight) pairs of a lexicon file, TSV lines of entry and weight, otherwise one entry per line
+# weighted by the given weight, as in the Hu and Liu lists. Lines starting with ';' or '#' are comments.
+def read_lexicon(path: str, weight=None, encoding='utf-8'):
+    with open(path, encoding=encoding, errors='replace') as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith((';', '#')):
+                continue
+
+            if '\t' in line:
+                entry, value = line.rsplit('\t', 1)
+                try:
+                    value = float(value)
+                except ValueError:
+                    raise ValueError(f'{path}:{number}: weight {value!r} is not a number') from None
+            elif weight is None:
+                raise ValueError(f'{path}:{number}: no weight column and no weight given for the file')
+            else:
+                entry, value = line, float(weight)
+
+            yield entry, value
+
+
+# Returns dictionary of entry word tuples and weights, the built-in Hu and Liu lists first if builtin,
+# then each source, a path or (path, weight) tuple
+def read_entries(sources=(), builtin=True) -> dict:
+    entries = {}
+
+    if builtin:
+        # Built the same way as Lexicon, so words in both lists stay positive
+        lexicon = Lexicon(Positive().poswords, Negative().negwords)
+        entries.update(((word,), float(label)) for word, label in lexicon.items())
+
+    for source in sources:
+        path, weight = (source, None) if isinstance(source, str) else source
+        for entry, value in read_lexicon(path, weight):
+            words = tuple(entry.lower().split())
+            if words:
+                entries[words] = value
+
+    return entries
+
+
+# Aho-Corasick automaton over words, transitions of all states in one dictionary keyed by state and word number
+class Automaton:
+    __slots__ = ('words', 'transitions', 'fail', 'lengths', 'weights', 'links')
+
+    def __init__(self, words: dict, transitions: dict, fail, lengths, weights, links):
+        self.words = words
+        self.transitions = transitions
+        self.fail = fail
+        self.lengths = lengths
+        self.weights = weights
+        self.links = links
+
+    @classmethod
+    def build(cls, entries: dict):
+        words = {}
+        children = [{}]
+        lengths = [0]
+        weights = [0.0]
+
+        for entry, weight in entries.items():
+            state = 0
+            for word in entry:
+                number = words.setdefault(word, len(words))
+                following = children[state].get(number)
+                if following is None:
+                    following = children[state][number] = len(children)
+                    children.append({})
+                    lengths.append(0)
+                    weights.append(0.0)
+                state = following
+            lengths[state] = len(entry)
+            weights[state] = weight
+
+        # Breadth first, so the fail state of a state is set before its children's
+        fail = [0] * len(children)
+        links = [0] * len(children)
+        queue = deque(children[0].values())
+        while queue:
+            state = queue.popleft()
+            for number, child in children[state].items():
+                target = fail[state]
+                while target and number not in children[target]:
+                    target = fail[target]
+                fail[child] = children[target].get(number, 0)
+                # Nearest shorter entry ending at the child, 0 for none
+                links[child] = fail[child] if lengths[fail[child]] else links[fail[child]]
+                queue.append(child)
+
+        size = len(words)
+        transitions = {state * size + number: child
+                       for state, following in enumerate(children) for number, child in following.items()}
+
+        return cls(words, transitions, fail, lengths, weights, links)
+
+    # Returns list of (start, end, weight) of the entries found in the words, not overlapping each other
+    # Of entries ending at the same word the longest is taken, replacing earlier ones it covers, and where it would
+    # overlap an earlier one only partly, the longest shorter one that doesn't
+    def scan(self, words: list) -> list:
+        get_number = self.words.get
+        get_state = self.transitions.get
+        fail, lengths, weights, links = self.fail, self.lengths, self.weights, self.links
+        size = len(self.words)
+        found = []
+        state = 0
+
+        for i, word in enumerate(words):
+            number = get_number(word.lower())
+            if number is None:
+                state = 0
+                continue
+
+            following = get_state(state * size + number)
+            while following is None and state:
+                state = fail[state]
+                following = get_state(state * size + number)
+            state = following or 0
+
+            match = state if lengths[state] else links[state]
+            while match:
+                start = i + 1 - lengths[match]
+                kept = len(found)
+                while kept and found[kept - 1][0] >= start:
+                    kept -= 1
+                if kept and found[kept - 1][1] > start:
+                    match = links[match]
+                    continue
+
+                del found[kept:]
+                found.append((start, i + 1, weights[match]))
+                break
+
+        return found
+
+    def save(self, path: str):
+        keys = numpy.fromiter(self.transitions.keys(), dtype=numpy.int64, count=len(self.transitions))
+        values = numpy.fromiter(self.transitions.values(), dtype=numpy.int32, count=len(self.transitions))
+        words = numpy.frombuffer('\n'.join(self.words).encode('utf-8'), dtype=numpy.uint8)
+
+        # Written to temporary file and renamed, so other processes never read a partial file
+        descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(descriptor, 'wb') as f:
+            numpy.savez(f, words=words, keys=keys, values=values, fail=numpy.asarray(self.fail, dtype=numpy.int32),
+                        lengths=numpy.asarray(self.lengths, dtype=numpy.int32),
+                        weights=numpy.asarray(self.weights, dtype=numpy.float64),
+                        links=numpy.asarray(self.links, dtype=numpy.int32))
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path: str):
+        with numpy.load(path, allow_pickle=False) as data:
+            text = data['words'].tobytes().decode('utf-8')
+            words = {word: number for number, word in enumerate(text.split('\n'))} if text else {}
+            transitions = dict(zip(data['keys'].tolist(), data['values'].tolist()))
+            return cls(words, transitions, data['fail'].tolist(), data['lengths'].tolist(),
+                       data['weights'].tolist(), data['links'].tolist())
+
+
+class ExtendedLexicon:
+    def __init__(self, automaton: Automaton, negators=NEGATORS, intensifiers=None, drop_stop_words=False,
+                 negation_window=NEGATION_WINDOW, negation_factor=NEGATION_FACTOR, stop_words=STOP_WORDS):
+        self.automaton = automaton
+        self.negators = frozenset(negators)
+        self.intensifiers = dict(INTENSIFIERS if intensifiers is None else intensifiers)
+        self.drop_stop_words = drop_stop_words
+        self.negation_window = negation_window
+        self.negation_factor = negation_factor
+        self.stop_words = stop_words
+
+    # Returns list of (start, end, value) of the entries found in the words, see Automaton.scan, value being the
+    # entry weight with negation and intensifiers applied
+    def matches(self, words: list) -> list:
+        negators, intensifiers = self.negators, self.intensifiers
+        found = []
+        # Position of the latest negator and clause break before each word, -1 for none
+        negated = -1
+        broken = -1
+        last_negator = []
+        last_break = []
+
+        for i, word in enumerate(words):
+            lower = word.lower()
+            if lower in negators:
+                negated = i
+            elif lower in CLAUSE_BREAKS:
+                broken = i
+            last_negator.append(negated)
+            last_break.append(broken)
+
+        for start, end, weight in self.automaton.scan(words):
+            value = weight
+            position = start - 1
+            while position >= 0 and words[position].lower() in intensifiers:
+                value *= intensifiers[words[position].lower()]
+                position -= 1
+
+            if start:
+                negator = last_negator[start - 1]
+                if negator >= 0 and start - negator <= self.negation_window and last_break[start - 1] < negator:
+                    value *= self.negation_factor
+
+            found.append((start, end, value))
+
+        return found
+
+    # Returns list of (word, value) pairs, the value of an entry on its first word and 0 on the others
+    # With drop_stop_words, stop words outside entries are left out
+    def pairs(self, words: list) -> list:
+        words = list(words)
+        values = [NEUTRAL] * len(words)
+        in_entry = [False] * len(words)
+
+        for start, end, value in self.matches(words):
+            values[start] = value
+            in_entry[start:end] = [True] * (end - start)
+
+        if not self.drop_stop_words:
+            return list(zip(words, values))
+
+        stop_words = self.stop_words
+        return [(word, value) for word, value, kept in zip(words, values, in_entry)
+                if kept or word.lower() not in stop_words]
+
+    # Returns list of sentiment values of the words, see pairs()
+    def values(self, words: list) -> list:
+        return [value for word, value in self.pairs(words)]
+
+    # Returns mean sentiment value of the words, 0 for no words
+    def score(self, words: list) -> float:
+        values = self.values(words)
+        return float(sum(values) / len(values)) if values else 0.0
+
+
+# Returns hex digest of the built-in Positive and Negative word lists, so editing them changes the cache key
+@lru_cache(maxsize=None)
+def builtin_digest() -> str:
+    digest = hashlib.sha256()
+    for words in (Positive().poswords, Negative().negwords):
+        digest.update('\n'.join(words).encode('utf-8'))
+        digest.update(b'\0')
+
+    return digest.hexdigest()
+
+
+# Returns cache file path for the sources
+def cache_path(sources, builtin: bool, directory=CACHE_DIR) -> str:
+    digest = hashlib.sha256()
+    digest.update(f'{CACHE_VERSION}\0{builtin_digest() if builtin else ""}\0'.encode('utf-8'))
+    for source in sources:
+        path, weight = (source, None) if isinstance(source, str) else source
+        status = os.stat(path)
+        digest.update(f'{os.path.abspath(path)}\0{weight}\0{status.st_size}\0{status.st_mtime_ns}\0'.encode('utf-8'))
+
+    return os.path.join(directory, digest.hexdigest() + '.npz')
+
+
+# Returns the automaton of the sources, loaded from cache if compiled before, otherwise built and cached
+# Set cache_directory None for no caching
+def compile_lexicon(sources=(), builtin=True, cache_directory=CACHE_DIR) -> Automaton:
+    sources = tuple(sources)
+    path = None
+
+    if cache_directory is not None:
+        os.makedirs(cache_directory, exist_ok=True)
+        path = cache_path(sources, builtin, cache_directory)
+        try:
+            return Automaton.load(path)
+        except (FileNotFoundError, ValueError, KeyError, OSError):
+            pass
+
+    automaton = Automaton.build(read_entries(sources, builtin))
+    if path is not None:
+        automaton.save(path)
+
+    return automaton
+
+
+# Returns lexicon of the sources, options as in ExtendedLexicon, e.g.
+# load_lexicon(('positive-words.txt', 1), ('negative-words.txt', -1), 'domain.tsv', drop_stop_words=True)
+def load_lexicon(*sources, builtin=True, cache_directory=CACHE_DIR, **options) -> ExtendedLexicon:
+    return ExtendedLexicon(compile_lexicon(sources, builtin, cache_directory), **options)
+
+
+# Returns the process wide lexicon of the built-in lists, built on the first call
+@lru_cache(maxsize=None)
+def get_extended_lexicon(drop_stop_words=False) -> ExtendedLexicon:
+    return load_lexicon(drop_stop_words=drop_stop_words)
+
+
+if __name__ == '__main__':
+    text = "I, a princess, king-descended, decked with jewels, gilded, drest, " \
+           "Would rather be a peasant with her baby at her breast, " \
+           "For all I shine so like the sun, and am purple like the west." \
+           "Two and two my guards behind, two and two before," \
+           "Two and two on either hand, they guard me evermore;" \
+           "Me, poor dove, that must not coo--eagle that must not soar." \
+           "All my fountains cast up perfumes, all my gardens grow " \
+           "Scented woods and foreign spices, with all flowers in blow " \
+           "That are costly, out of season as the seasons go.".split() * 20
+
+    directory = tempfile.mkdtemp()
+
+    start = timer()
+    compile_lexicon(cache_directory=directory)
+    cold = timer() - start
+
+    start = timer()
+    lexicon = load_lexicon(cache_directory=directory, drop_stop_words=True)
+    warm = timer() - start
+
+    start = timer()
+    score = lexicon.score(text)
+    scoring = timer() - start
+
+    print(lexicon.pairs('this is not a good day , but a very happy one'.split()))
+    print(f'Compile: {cold:.4f} seconds, load from cache: {warm:.4f} seconds')
+    print(f'Score {score:.4f} of {len(text)} words in {scoring:.6f} seconds')
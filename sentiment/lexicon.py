@@ -0,0 +1,111 @@
+'''
+Compiled sentiment lexicon, built once per process from the Hu and Liu opinion lexicon classes.
+
+Positive and Negative rebuild their word lists on every instantiation and scan them linearly,
+the Lexicon freezes both lists into sets and a single word -> label map, so a lookup is one hash probe.
+Labels are the same as Sentiment gives: 1 positive, -1 negative, 0 otherwise. Words found in both
+lists are labelled positive, as is_positive is checked first.
+
+If run directly, times the lexicon against the per-word Sentiment() lookups.
+
+INPUT: Word or list of words.
+OUTPUT: Sentiment label or list of labels.
+'''
+import regex as re
+from functools import lru_cache
+from timeit import default_timer as timer
+from sentiment.classNegative import Negative
+from sentiment.classPositive import Positive
+
+POSITIVE = 1
+NEGATIVE = -1
+NEUTRAL = 0
+
+PUNCT = re.compile(r"\p{P}+")
+
+
+class Lexicon:
+    __slots__ = ('positive', 'negative', '_labels')
+
+    def __init__(self, positive, negative):
+        self.positive = frozenset(word.lower() for word in positive)
+        self.negative = frozenset(word.lower() for word in negative)
+
+        labels = dict.fromkeys(self.negative, NEGATIVE)
+        labels.update(dict.fromkeys(self.positive, POSITIVE))
+        self._labels = labels
+
+    def __len__(self):
+        return len(self._labels)
+
+    def __contains__(self, word):
+        return word.lower() in self._labels
+
+    # Returns True if the word consists of punctuation only
+    @staticmethod
+    def is_punct(word: str) -> bool:
+        return PUNCT.fullmatch(word) is not None
+
+    # Returns sentiment label of a single word, 0 for words not in lexicon
+    def label(self, word: str) -> int:
+        return self._labels.get(word.lower(), NEUTRAL)
+
+    # Returns list of sentiment labels for list of words, in the same order
+    def labels(self, words) -> list:
+        get = self._labels.get
+        return [get(word.lower(), NEUTRAL) for word in words]
+
+    # Returns list of word and sentiment label pairs, e.g. [('swift', 1), ('decay', -1)]
+    def pairs(self, words) -> list:
+        get = self._labels.get
+        return [(word, get(word.lower(), NEUTRAL)) for word in words]
+
+    # Returns the word -> label items, e.g. for building lookup tables keyed otherwise
+    def items(self):
+        return self._labels.items()
+
+
+# Returns the process wide lexicon, built on the first call
+@lru_cache(maxsize=None)
+def get_lexicon() -> Lexicon:
+    return Lexicon(Positive().poswords, Negative().negwords)
+
+
+if __name__ == '__main__':
+    from sentiment.classSentiment import Sentiment
+
+    text = "I, a princess, king-descended, decked with jewels, gilded, drest, " \
+           "Would rather be a peasant with her baby at her breast, " \
+           "For all I shine so like the sun, and am purple like the west." \
+           "Two and two my guards behind, two and two before," \
+           "Two and two on either hand, they guard me evermore;" \
+           "Me, poor dove, that must not coo--eagle that must not soar." \
+           "All my fountains cast up perfumes, all my gardens grow " \
+           "Scented woods and foreign spices, with all flowers in blow " \
+           "That are costly, out of season as the seasons go.".split() * 20
+
+    def legacy_label(word):
+        if Sentiment().is_positive(word):
+            return POSITIVE
+        elif Sentiment().is_negative(word):
+            return NEGATIVE
+        return NEUTRAL
+
+    start = timer()
+    legacy = [legacy_label(word) for word in text]
+    legacy_time = timer() - start
+
+    start = timer()
+    lexicon = get_lexicon()
+    build_time = timer() - start
+
+    start = timer()
+    compiled = lexicon.labels(text)
+    compiled_time = timer() - start
+
+    assert legacy == compiled, 'Lexicon labels differ from Sentiment labels'
+
+    print(f'Words: {len(text)}, lexicon entries: {len(lexicon)}')
+    print(f'Sentiment() per word: {legacy_time:.4f} seconds')
+    print(f'Lexicon build: {build_time:.4f} seconds, batch lookup: {compiled_time:.6f} seconds')
+    print(f'Speed-up excluding build: {legacy_time / compiled_time:.0f}x')
@@ -0,0 +1,45 @@
+'''
+Compact result of Sentiment.sentiment_text, the words with an int8 array of their sentiment values.
+
+WordSentiment is a read-only sequence keeping the old result shape: it iterates, indexes, compares and prints as the
+list of (word, value) tuples it replaces, e.g. [('swift', 1), ('decay', 0)], without a tuple per word.
+tolist() returns the plain list, e.g. for JSON or for modifying.
+
+INPUT: List of words, array of their sentiment values.
+OUTPUT: WordSentiment sequence.
+'''
+from array import array
+from collections.abc import Sequence
+
+
+class WordSentiment(Sequence):
+    __slots__ = ('words', 'values')
+
+    def __init__(self, words: list, values: array):
+        self.words = words
+        self.values = values
+
+    def __len__(self):
+        return len(self.words)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return list(zip(self.words[i], self.values[i]))
+        return self.words[i], self.values[i]
+
+    def __iter__(self):
+        return zip(self.words, self.values)
+
+    def __eq__(self, other):
+        if isinstance(other, WordSentiment):
+            return self.words == other.words and self.values == other.values
+        return isinstance(other, (list, tuple)) and self.tolist() == list(other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(self.tolist())
+
+    # Returns the results as list of (word, value) tuples
+    def tolist(self) -> list:
+        return list(zip(self.words, self.values))
@@ -0,0 +1,89 @@
+'''
+Tests of StatsCollector: collected results equal those of the per-stat functions.
+
+INPUT: Hand annotated documents on a blank English vocabulary.
+OUTPUT: Pytest results.
+'''
+import pytest
+import spacy
+from spacy.attrs import LEMMA, POS
+from spacy.tokens import Doc, Span
+from analysers import basicStats
+from analysers.basicStats import StatsCollector
+
+TEXT = 'The king and the King of Spain met the queen . The queen , the king and a dove flew over the moon .\n'
+POS_TAGS = {'The': 'DET', 'the': 'DET', 'a': 'DET', 'and': 'CCONJ', 'of': 'ADP', 'over': 'ADP', '.': 'PUNCT',
+            ',': 'PUNCT', 'met': 'VERB', 'flew': 'VERB', '\n': 'SPACE'}
+LEMMAS = {'met': 'meet', 'flew': 'fly', 'The': 'the', 'King': 'king'}
+
+
+def annotated_doc(vocab, text) -> Doc:
+    words = text.split(' ')
+    document = Doc(vocab, words=words, spaces=[True] * (len(words) - 1) + [False])
+    array = document.to_array([POS, LEMMA])
+    for i, word in enumerate(words):
+        array[i, 0] = vocab.strings.add(POS_TAGS.get(word, 'NOUN'))
+        array[i, 1] = vocab.strings.add(LEMMAS.get(word, word))
+    document.from_array([POS, LEMMA], array)
+    document.ents = [Span(document, i, i + 1, label='GPE') for i, word in enumerate(words) if word == 'Spain']
+    return document
+
+
+@pytest.fixture(scope='module')
+def vocab():
+    return spacy.blank('en').vocab
+
+
+def results(source) -> list:
+    return [source.get_token_count(), source.get_top_tokens(), source.get_top_tokens_cleaned(),
+            source.get_named_entities(), source.get_top_lemmas(), source.get_top_lemmas_cleaned(), source.get_pos()]
+
+
+def test_collector_matches_functions(vocab):
+    document = annotated_doc(vocab, TEXT)
+    functions = [basicStats.get_token_count(document), basicStats.get_top_tokens(document),
+                 basicStats.get_top_tokens_cleaned(document), basicStats.get_named_entities(document),
+                 basicStats.get_top_lemmas(document), basicStats.get_top_lemmas_cleaned(document),
+                 basicStats.get_pos(document)]
+
+    assert results(StatsCollector(document)) == functions
+
+
+def test_top_n_ties_keep_first_occurrence(vocab):
+    document = annotated_doc(vocab, TEXT)
+    collector = StatsCollector(document)
+
+    for number in range(1, 8):
+        assert collector.get_top_tokens(number) == basicStats.get_top_tokens(document, number)
+        assert collector.get_top_lemmas_cleaned(number) == basicStats.get_top_lemmas_cleaned(document, number)
+
+
+def test_updates_add_up(vocab):
+    first, second = annotated_doc(vocab, TEXT), annotated_doc(vocab, 'The dove met Spain .\n')
+    collector = StatsCollector(first).update(second)
+
+    assert collector.get_token_count() == [('Total tokens', len(first) + len(second))]
+    assert dict(collector.get_top_tokens(None)) == sum_counts(first, second)
+    assert collector.get_named_entities() == [('Spain', 2)]
+
+
+def sum_counts(*documents) -> dict:
+    counts = {}
+    for document in documents:
+        for token, count in basicStats.get_top_tokens(document, None):
+            counts[token] = counts.get(token, 0) + count
+    return counts
+
+
+def test_merge_and_subtract(vocab):
+    first, second = annotated_doc(vocab, TEXT), annotated_doc(vocab, 'The dove met Spain and the King .\n')
+    merged = StatsCollector(first).merge(StatsCollector(second))
+
+    assert results(merged) == results(StatsCollector(first).update(second))
+    assert results(merged.subtract(StatsCollector(second))) == results(StatsCollector(first))
+
+
+def test_empty_document(vocab):
+    collector = StatsCollector(Doc(vocab, words=[]))
+    assert collector.get_token_count() == [('Total tokens', 0)]
+    assert collector.get_top_tokens() == [] and collector.get_pos() == []
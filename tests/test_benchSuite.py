@@ -0,0 +1,57 @@
+'''
+Tests of the benchmark suite and the synthetic corpus: determinism, annotation and the regression and scaling checks.
+
+INPUT: Synthetic documents on a blank English vocabulary, hand made result rows.
+OUTPUT: Pytest results.
+'''
+import spacy
+from benchmarks import benchSuite
+from benchmarks.syntheticCorpus import SyntheticCorpus, synthetic_doc, synthetic_text
+
+
+def row(target, size, seconds) -> dict:
+    return {'target': target, 'size': size, 'tokens': size, 'seconds': seconds}
+
+
+def test_text_is_deterministic():
+    assert synthetic_text(500, seed=3) == synthetic_text(500, seed=3)
+    assert synthetic_text(500, seed=3) != synthetic_text(500, seed=4)
+    assert len(SyntheticCorpus(3).tokens(500)[0]) >= 500
+
+
+def test_doc_matches_text():
+    vocab = spacy.blank('en').vocab
+    document = synthetic_doc(vocab, 1000, seed=1)
+
+    assert document.text == synthetic_text(1000, seed=1)
+    assert len(list(document.noun_chunks)) > 100
+    assert document.ents and all(ent.label_ in ('PERSON', 'GPE', 'LOC') for ent in document.ents)
+    assert {token.pos_ for token in document} >= {'DET', 'NOUN', 'VERB', 'PUNCT'}
+
+
+def test_run_reports_every_target_and_size():
+    results = benchSuite.run(sizes=(200, 400), targets=['basicStats.get_top', 'nounChunks.nc_clusters'], repeats=1)
+    names = {name for name, function in benchSuite.TARGETS
+             if name.startswith('basicStats.get_top') or name.startswith('nounChunks.nc_clusters')}
+
+    assert {(result['target'], result['size']) for result in results} == {(name, size) for name in names
+                                                                          for size in (200, 400)}
+    assert all(result['tokens'] >= result['size'] and result['seconds'] >= 0 for result in results)
+
+
+def test_scaling_problems():
+    results = [row('linear', 1000, 0.01), row('linear', 100000, 1.0),
+               row('quadratic', 1000, 0.01), row('quadratic', 100000, 100.0),
+               row('single', 1000, 0.01)]
+
+    assert [(target, small, large) for target, small, large, ratio in benchSuite.scaling_problems(results)] == \
+        [('quadratic', 1000, 100000)]
+
+
+def test_regressions():
+    baseline = [row('fast', 1000, 1.0), row('slow', 1000, 1.0), row('removed', 1000, 1.0)]
+    results = [row('fast', 1000, 1.2), row('slow', 1000, 2.0), row('new', 1000, 5.0)]
+
+    assert benchSuite.regressions(results, baseline) == [('slow', 1000, 1.0, 2.0)]
+    assert benchSuite.regressions(results, baseline, tolerance=1.1) == [('fast', 1000, 1.0, 1.2),
+                                                                        ('slow', 1000, 1.0, 2.0)]
@@ -0,0 +1,75 @@
+'''
+Tests of the corpus runner: file listing, piece splitting and feeding every piece to the collectors.
+
+INPUT: Text files in a temporary directory, blank English pipeline.
+OUTPUT: Pytest results.
+'''
+import spacy
+from analysers.corpusRunner import CorpusRunner, corpus_files, corpus_pieces, file_pieces
+
+PARAGRAPH = 'The king met the queen.\nThe dove flew over the moon.\n\n'
+
+
+class TokenCounter:
+    def __init__(self):
+        self.documents = 0
+        self.tokens = 0
+
+    def update(self, document):
+        self.documents += 1
+        self.tokens += len(document)
+        return self
+
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+
+def test_corpus_files(tmp_path):
+    first = write(tmp_path / 'b.txt', PARAGRAPH)
+    second = write(tmp_path / 'sub' / 'a.txt', PARAGRAPH)
+    write(tmp_path / 'c.csv', PARAGRAPH)
+
+    assert corpus_files(str(tmp_path)) == sorted([first, second])
+    assert corpus_files(str(tmp_path / '*.txt')) == [first]
+
+
+def test_pieces_rebuild_file(tmp_path):
+    text = PARAGRAPH * 40
+    path = write(tmp_path / 'a.txt', text)
+    pieces = list(file_pieces(path, max_chars=200))
+
+    assert ''.join(pieces) == text
+    assert len(pieces) > 1 and all(len(piece) <= 200 for piece in pieces)
+    # Paragraphs are kept whole when they fit
+    assert all(piece.endswith('\n\n') for piece in pieces)
+
+
+def test_long_paragraph_split_at_lines(tmp_path):
+    text = 'The king met the queen.\n' * 30
+    pieces = list(file_pieces(write(tmp_path / 'a.txt', text), max_chars=100))
+
+    assert ''.join(pieces) == text
+    assert all(len(piece) <= 100 and piece.endswith('\n') for piece in pieces)
+
+
+def test_blank_pieces_skipped(tmp_path):
+    path = write(tmp_path / 'a.txt', '\n' * 300 + PARAGRAPH)
+    pieces = list(corpus_pieces(str(tmp_path), max_chars=100))
+
+    assert all(piece.strip() for piece, source in pieces)
+    assert {source for piece, source in pieces} == {path}
+
+
+def test_run_updates_every_collector(tmp_path):
+    for i in range(3):
+        write(tmp_path / f'{i}.txt', PARAGRAPH * 10)
+    nlp = spacy.blank('en')
+    expected = sum(len(nlp(piece)) for piece, path in corpus_pieces(str(tmp_path), max_chars=200))
+
+    first, second = CorpusRunner(nlp, batch_size=4, max_chars=200).run(str(tmp_path), TokenCounter(), TokenCounter())
+
+    assert first.tokens == second.tokens == expected
+    assert first.documents == len(list(corpus_pieces(str(tmp_path), max_chars=200)))
@@ -0,0 +1,78 @@
+'''
+Tests of the document cache: round trips, pipe order with hits and misses, keys and eviction.
+
+INPUT: Blank English pipeline, cache in a temporary directory.
+OUTPUT: Pytest results.
+'''
+import pytest
+import spacy
+from analysers.docCache import DocCache
+
+TEXTS = ['The king met the queen.', 'The dove flew over the moon.', 'Laura and Lizzie went to the market.']
+
+
+@pytest.fixture(scope='module')
+def nlp():
+    return spacy.blank('en')
+
+
+def test_parse_round_trip(nlp, tmp_path):
+    cache = DocCache(str(tmp_path))
+    assert cache.get(nlp, TEXTS[0]) is None
+
+    parsed = cache.parse(nlp, TEXTS[0])
+    cached = cache.get(nlp, TEXTS[0])
+
+    assert cached is not None and cached is not parsed
+    assert [token.text for token in cached] == [token.text for token in parsed]
+    assert cached.text == TEXTS[0]
+
+
+def test_pipe_keeps_order(nlp, tmp_path):
+    cache = DocCache(str(tmp_path))
+    cache.parse(nlp, TEXTS[1])
+
+    texts = [(text, i) for i, text in enumerate(TEXTS * 2)]
+    results = list(cache.pipe(nlp, texts, as_tuples=True, batch_size=2))
+
+    assert [(document.text, context) for document, context in results] == texts
+    assert [document.text for document in cache.pipe(nlp, TEXTS)] == TEXTS
+
+
+def test_key_depends_on_pipeline(nlp, tmp_path):
+    other = spacy.blank('en')
+    other.add_pipe('sentencizer')
+
+    assert DocCache.key(nlp, TEXTS[0]) == DocCache.key(spacy.blank('en'), TEXTS[0])
+    assert DocCache.key(nlp, TEXTS[0]) != DocCache.key(other, TEXTS[0])
+    assert DocCache.key(nlp, TEXTS[0]) != DocCache.key(nlp, TEXTS[1])
+
+
+def test_eviction_keeps_within_max_bytes(nlp, tmp_path):
+    cache = DocCache(str(tmp_path))
+    for text in TEXTS:
+        cache.parse(nlp, text)
+    size = cache.size()
+
+    small = DocCache(str(tmp_path), max_bytes=size // 2)
+    small.evict()
+
+    assert 0 < small.size() <= size // 2
+    assert len(small._files()) < len(TEXTS)
+
+    small.clear()
+    assert small.size() == 0 and small._files() == []
+
+
+def test_corrupt_entry_is_miss(nlp, tmp_path):
+    cache = DocCache(str(tmp_path))
+    path = cache.path(cache.key(nlp, TEXTS[0]))
+
+    for data in (b'', b'not a docbin', b'\x00' * 64):
+        with open(path, 'wb') as f:
+            f.write(data)
+        assert cache.get(nlp, TEXTS[0]) is None
+
+    assert cache._files() == []
+    assert cache.parse(nlp, TEXTS[0]).text == TEXTS[0]
+    assert cache.get(nlp, TEXTS[0]) is not None
@@ -0,0 +1,92 @@
+'''
+Tests of entity sentiment: mentions keep file positions across corpus pieces and their own sentiment.
+
+A blank pipeline with a rule based annotator gives every word token a one-word noun chunk headed by the token before
+it and every capitalised word after the first token a PERSON entity, so the tests run offline.
+
+INPUT: Text files in a temporary directory, synthetic annotated document.
+OUTPUT: Pytest results.
+'''
+import pytest
+import spacy
+from spacy.attrs import POS, HEAD, DEP
+from spacy.tokens import Span
+from analysers.corpusRunner import CorpusRunner
+from analysers.entitySentiment import EntityIndex, overlapping_chunks
+from benchmarks.syntheticCorpus import synthetic_doc
+
+PARAGRAPH = 'The good Laura met the evil Lizzie.\nA happy Jeanie saw the poor Laura.\n\n'
+
+
+def annotate(document):
+    strings = document.vocab.strings
+    array = document.to_array([POS, HEAD, DEP])
+    for i, token in enumerate(document):
+        array[i, 0] = strings.add('NOUN' if token.is_alpha else 'SPACE' if token.is_space else 'PUNCT')
+        array[i, 1] = -1 & 0xFFFFFFFFFFFFFFFF if i else 0
+        array[i, 2] = strings.add('dep' if i else 'ROOT')
+    document.from_array([POS, HEAD, DEP], array)
+    document.ents = [Span(document, token.i, token.i + 1, label='PERSON')
+                     for token in document if token.i and token.is_title and token.is_alpha]
+    return document
+
+
+@pytest.fixture(scope='module')
+def nlp():
+    nlp = spacy.blank('en')
+    # Functions are added as components directly in spacy 2, registered by name in spacy 3
+    if hasattr(spacy.language.Language, 'component'):
+        spacy.language.Language.component('test_entity_annotate', func=annotate)
+        nlp.add_pipe('test_entity_annotate')
+    else:
+        nlp.add_pipe(annotate)
+    return nlp
+
+
+def test_mentions_unique_across_pieces(nlp, tmp_path):
+    (tmp_path / 'a.txt').write_text(PARAGRAPH * 10, encoding='utf-8')
+    runner = CorpusRunner(nlp, max_chars=150)
+    index, = runner.run(str(tmp_path), EntityIndex())
+
+    # Tokens of the file, the pieces one after another
+    docs = [doc for doc, path in runner.docs(str(tmp_path))]
+    tokens = [token.text for doc in docs for token in doc]
+    mentions = [mention for entry in index.entries.values() for mention in entry.mentions]
+    keys = [(doc_id, start) for doc_id, piece, start, end, total, count in mentions]
+
+    assert len({piece for doc_id, piece, start, end, total, count in mentions}) > 1
+    assert len(keys) == len(set(keys)) == sum(len(doc.ents) for doc in docs)
+    for entry in index.entries.values():
+        assert all(' '.join(tokens[start:end]) == entry.text for doc_id, piece, start, end, total, count
+                   in entry.mentions)
+
+
+def test_mention_sentiment_adds_up(nlp):
+    index = EntityIndex(nlp(PARAGRAPH * 3))
+    laura = index.get('laura', 'PERSON')[0]
+
+    assert len(laura.mentions) == 6
+    assert [(total, count) for doc_id, piece, start, end, total, count in laura.mentions][:2] == [(1, 1), (-1, 1)]
+    for entry in index.entries.values():
+        assert entry.total == sum(mention[4] for mention in entry.mentions)
+        assert entry.count == sum(mention[5] for mention in entry.mentions)
+
+
+def test_merge_keeps_mentions():
+    vocab = spacy.blank('en').vocab
+    first, second = synthetic_doc(vocab, 2000, seed=1), synthetic_doc(vocab, 2000, seed=2)
+    merged = EntityIndex().update(first, 'first')
+    merged.merge(EntityIndex().update(second, 'second'))
+    single = EntityIndex().update(first, 'first').update(second, 'second')
+
+    assert merged.get_scores() == single.get_scores()
+    assert {key: entry.mentions for key, entry in merged.entries.items()} == \
+        {key: entry.mentions for key, entry in single.entries.items()}
+
+
+def test_overlapping_chunks_matches_scan():
+    document = synthetic_doc(spacy.blank('en').vocab, 3000)
+    chunks = list(document.noun_chunks)
+
+    for entity, overlapping in overlapping_chunks(document.ents, chunks):
+        assert overlapping == [chunk for chunk in chunks if chunk.start < entity.end and entity.start < chunk.end]
@@ -0,0 +1,92 @@
+'''
+Tests of the export layer: noun chunk and token sentiment rows of a corpus streamed in several pieces per file.
+
+A blank pipeline with a rule based annotator gives every word token a one-word noun chunk, so the tests run offline.
+
+INPUT: Text files in a temporary directory.
+OUTPUT: Pytest results.
+'''
+import json
+import pytest
+import spacy
+from spacy.attrs import POS, HEAD, DEP
+from analysers.corpusRunner import CorpusRunner, doc_piece
+from analysers.export import ExportCollector, noun_chunk_batch
+
+PARAGRAPH = 'The good king met the evil queen.\nThe dove flew over the moon.\n\n'
+
+
+def annotate(document):
+    strings = document.vocab.strings
+    array = document.to_array([POS, HEAD, DEP])
+    for i, token in enumerate(document):
+        array[i, 0] = strings.add('NOUN' if token.is_alpha else 'SPACE' if token.is_space else 'PUNCT')
+        array[i, 1] = 0
+        array[i, 2] = strings.add('ROOT')
+    document.from_array([POS, HEAD, DEP], array)
+    return document
+
+
+@pytest.fixture(scope='module')
+def nlp():
+    nlp = spacy.blank('en')
+    # Functions are added as components directly in spacy 2, registered by name in spacy 3
+    if hasattr(spacy.language.Language, 'component'):
+        spacy.language.Language.component('test_export_annotate', func=annotate)
+        nlp.add_pipe('test_export_annotate')
+    else:
+        nlp.add_pipe(annotate)
+    return nlp
+
+
+def read(path) -> list:
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_doc_piece_counts_tokens_per_file(nlp, tmp_path):
+    for name in ('a.txt', 'b.txt'):
+        (tmp_path / name).write_text(PARAGRAPH * 10, encoding='utf-8')
+
+    positions = {}
+    for doc, path in CorpusRunner(nlp, max_chars=150).docs(str(tmp_path)):
+        positions.setdefault(path, []).append((doc_piece(doc), len(doc)))
+
+    for path, pieces in positions.items():
+        assert len(pieces) > 1
+        offset = 0
+        for i, ((source, piece, start), length) in enumerate(pieces):
+            assert (source, piece, start) == (path, i, offset)
+            offset += length
+
+    assert doc_piece(nlp('The king.')) == ('', 0, 0)
+
+
+def test_join_key_unique_across_pieces(nlp, tmp_path):
+    for name in ('a.txt', 'b.txt'):
+        (tmp_path / name).write_text(PARAGRAPH * 10, encoding='utf-8')
+    collector = ExportCollector(str(tmp_path / 'export'), file_format='ndjson')
+    CorpusRunner(nlp, max_chars=150).run(str(tmp_path), collector)
+    collector.close()
+
+    chunks = read(collector.noun_chunks.path)
+    tokens = read(collector.token_sentiment.path)
+    keys = [(row['source'], row['start']) for row in chunks]
+
+    assert len({row['piece'] for row in chunks}) > 1
+    assert len(keys) == len(set(keys))
+    assert {(row['source'], row['chunk_start']) for row in tokens} <= set(keys)
+
+    # Absolute positions grow through each file, across its pieces
+    for source in {row['source'] for row in chunks}:
+        starts = [row['start'] for row in chunks if row['source'] == source]
+        assert all(first < second for first, second in zip(starts, starts[1:]))
+
+
+def test_batch_offsets(nlp):
+    document = nlp('The king met the queen.')
+    batch = noun_chunk_batch(document, 'a.txt', piece=3, offset=100)
+
+    assert batch['start'] == [100, 101, 102, 103, 104]
+    assert batch['end'] == [101, 102, 103, 104, 105]
+    assert batch['piece'] == [3] * 5 and batch['chunk'] == ['The', 'king', 'met', 'the', 'queen']
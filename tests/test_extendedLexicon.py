@@ -0,0 +1,98 @@
+'''
+Tests of the extended lexicon: Aho-Corasick matching and overlaps, negation, intensifiers, stop words and caching.
+
+INPUT: Small in-memory lexicons and lexicon files in a temporary directory.
+OUTPUT: Pytest results.
+'''
+import random
+from sentiment.extendedLexicon import Automaton, ExtendedLexicon, cache_path, compile_lexicon, load_lexicon
+
+ENTRIES = {('a', 'b'): 1.0, ('b', 'c', 'd'): 2.0, ('c', 'd'): 3.0,
+           ('moon',): -1.0, ('the', 'moon'): 0.5, ('over', 'the', 'moon'): 2.0}
+
+
+def lexicon(**options) -> ExtendedLexicon:
+    return ExtendedLexicon(Automaton.build({('good',): 1.0, ('bad',): -1.0, ('over', 'the', 'moon'): 2.0}), **options)
+
+
+def test_scan_takes_longest_entry():
+    automaton = Automaton.build(ENTRIES)
+    assert automaton.scan('over the moon'.split()) == [(0, 3, 2.0)]
+    assert automaton.scan('the moon and the Moon'.split()) == [(0, 2, 0.5), (3, 5, 0.5)]
+
+
+def test_scan_partial_overlap_keeps_shorter_entry():
+    # b c d would overlap a b only partly, so c d ending at the same word is taken instead
+    assert Automaton.build(ENTRIES).scan('a b c d'.split()) == [(0, 2, 1.0), (2, 4, 3.0)]
+
+
+def test_scan_matches_brute_force():
+    rng = random.Random(0)
+    vocabulary = 'abcde'
+
+    for trial in range(300):
+        entries = {tuple(rng.choice(vocabulary) for i in range(rng.randint(1, 4))): float(rng.randint(-3, 3))
+                   for j in range(rng.randint(1, 8))}
+        words = [rng.choice(vocabulary) for i in range(rng.randint(0, 30))]
+        found = Automaton.build(entries).scan(words)
+
+        # Matches are entries, in order and not overlapping
+        assert all(tuple(words[start:end]) in entries and entries[tuple(words[start:end])] == weight
+                   for start, end, weight in found)
+        assert all(found[i][1] <= found[i + 1][0] for i in range(len(found) - 1))
+
+        # Every occurrence of an entry overlaps a match
+        for entry in entries:
+            for start in range(len(words) - len(entry) + 1):
+                if tuple(words[start:start + len(entry)]) == entry:
+                    assert any(first < start + len(entry) and start < last for first, last, weight in found)
+
+
+def test_automaton_save_and_load(tmp_path):
+    automaton = Automaton.build(ENTRIES)
+    path = str(tmp_path / 'lexicon.npz')
+    automaton.save(path)
+
+    words = 'over the moon a b c d the moon'.split()
+    assert Automaton.load(path).scan(words) == automaton.scan(words)
+
+
+def test_negation_within_window():
+    assert lexicon().matches('this is not good'.split()) == [(3, 4, -1.0)]
+    assert lexicon().matches('not a b good'.split()) == [(3, 4, -1.0)]
+    assert lexicon().matches('not a b c good'.split()) == [(4, 5, 1.0)]
+    assert lexicon().matches('not over the moon'.split()) == [(1, 4, -2.0)]
+
+
+def test_negation_ends_at_clause_break():
+    assert lexicon().matches('not , good'.split()) == [(2, 3, 1.0)]
+    assert lexicon().matches('it was not bad but good'.split()) == [(3, 4, 1.0), (5, 6, 1.0)]
+
+
+def test_intensifiers():
+    assert lexicon().matches('very good'.split()) == [(1, 2, 1.5)]
+    assert lexicon().matches('not very good'.split()) == [(2, 3, -1.5)]
+    assert lexicon().matches('slightly bad'.split()) == [(1, 2, -0.5)]
+
+
+def test_stop_words_dropped():
+    words = 'this is a good day'.split()
+    assert lexicon().pairs(words) == [('this', 0), ('is', 0), ('a', 0), ('good', 1.0), ('day', 0)]
+    assert lexicon(drop_stop_words=True).pairs(words) == [('good', 1.0), ('day', 0)]
+    assert lexicon(drop_stop_words=True).score(words) == 0.5
+
+
+def test_cache_follows_source_changes(tmp_path):
+    source = tmp_path / 'domain.tsv'
+    source.write_text('over the moon\t2\nmeh\t-0.5\n')
+    cache = str(tmp_path / 'cache')
+
+    loaded = load_lexicon(str(source), builtin=False, cache_directory=cache)
+    assert loaded.matches('meh'.split()) == [(0, 1, -0.5)]
+    # Loaded from the cache file on the second call
+    assert compile_lexicon((str(source),), False, cache).scan('over the moon'.split()) == [(0, 3, 2.0)]
+
+    first = cache_path((str(source),), False, cache)
+    source.write_text('over the moon\t2\nmeh\t-1\nblah\t-1\n')
+    assert cache_path((str(source),), False, cache) != first
+    assert load_lexicon(str(source), builtin=False, cache_directory=cache).matches('meh'.split()) == [(0, 1, -1.0)]
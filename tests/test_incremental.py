@@ -0,0 +1,151 @@
+'''
+Tests of incremental analysis: totals after appends, edits and removals equal those of a fresh parse, and noun chunk
+counters can take off what they added in any order. Lines longer than a block are cut as corpus pieces cut them.
+
+A blank pipeline with a rule based annotator gives every word token a one-word noun chunk and every capitalised word
+after the first token a PERSON entity, so the tests run offline.
+
+INPUT: Synthetic text files in a temporary directory.
+OUTPUT: Pytest results.
+'''
+import pytest
+import spacy
+from spacy.attrs import POS, HEAD, DEP
+from spacy.tokens import Doc, Span
+from analysers.basicStats import StatsCollector
+from analysers.corpusRunner import CorpusRunner, split_lines
+from analysers.incremental import IncrementalAnalyser, MAX_BLOCK_BYTES, file_blocks
+from analysers.nounChunks import NounChunkCounter
+from benchmarks.syntheticCorpus import synthetic_text
+
+
+def annotate(document):
+    strings = document.vocab.strings
+    array = document.to_array([POS, HEAD, DEP])
+    for i, token in enumerate(document):
+        array[i, 0] = strings.add('NOUN' if token.is_alpha else 'SPACE' if token.is_space else 'PUNCT')
+        array[i, 1] = 0
+        array[i, 2] = strings.add('ROOT')
+    document.from_array([POS, HEAD, DEP], array)
+    document.ents = [Span(document, token.i, token.i + 1, label='PERSON')
+                     for token in document if token.i and token.is_title and token.is_alpha]
+    return document
+
+
+@pytest.fixture(scope='module')
+def nlp():
+    nlp = spacy.blank('en')
+    # Functions are added as components directly in spacy 2, registered by name in spacy 3
+    if hasattr(spacy.language.Language, 'component'):
+        spacy.language.Language.component('test_annotate', func=annotate)
+        nlp.add_pipe('test_annotate')
+    else:
+        nlp.add_pipe(annotate)
+    return nlp
+
+
+def totals(analyser) -> tuple:
+    stats, chunks = analyser.stats, analyser.chunks
+    return (stats.token_count, dict(stats.tokens), dict(stats.tokens_cleaned), dict(stats.lemmas),
+            dict(stats.entities), dict(stats.pos),
+            {root: dict(words) for root, words in chunks.clusters.items()},
+            {root: dict(lemmas) for root, lemmas in chunks.lemma_clusters.items()},
+            {root: tuple(value) for root, value in chunks.root_sentiment.items()},
+            chunks.get_root_sentiment_score())
+
+
+def fresh(nlp, directory) -> tuple:
+    return totals(IncrementalAnalyser(nlp).run(str(directory)))
+
+
+@pytest.mark.parametrize('append_only', [False, True])
+def test_append_matches_fresh_parse(nlp, tmp_path, append_only):
+    path = tmp_path / 'feed.txt'
+    path.write_text(synthetic_text(20000, 1))
+    analyser = IncrementalAnalyser(nlp, append_only=append_only)
+    analyser.update(str(path))
+    assert analyser.update(str(path)) == (0, 0)
+
+    with open(path, 'a') as f:
+        f.write(synthetic_text(500, 2))
+    parsed, removed = analyser.update(str(path))
+
+    assert parsed <= 3
+    assert totals(analyser) == fresh(nlp, tmp_path)
+
+
+def test_edit_matches_fresh_parse(nlp, tmp_path):
+    path = tmp_path / 'text.txt'
+    text = synthetic_text(20000, 3)
+    path.write_text(text)
+    analyser = IncrementalAnalyser(nlp)
+    analyser.update(str(path))
+    blocks = len(analyser.files[str(path)].blocks)
+
+    middle = len(text) // 2
+    path.write_text(text[:middle] + ' Zed wonderful ' + text[middle:])
+    parsed, removed = analyser.update(str(path))
+    assert parsed < blocks // 2
+    assert totals(analyser) == fresh(nlp, tmp_path)
+
+    path.write_text(text[:1000] + text[5000:])
+    analyser.update(str(path))
+    assert totals(analyser) == fresh(nlp, tmp_path)
+
+    path.write_text(text)
+    analyser.update(str(path))
+    assert totals(analyser) == fresh(nlp, tmp_path)
+
+
+def test_removed_file_is_taken_off(nlp, tmp_path):
+    (tmp_path / 'a.txt').write_text(synthetic_text(3000, 4))
+    (tmp_path / 'b.txt').write_text(synthetic_text(3000, 5))
+    analyser = IncrementalAnalyser(nlp).run(str(tmp_path))
+
+    (tmp_path / 'b.txt').unlink()
+    analyser.run(str(tmp_path))
+    assert totals(analyser) == fresh(nlp, tmp_path)
+
+    (tmp_path / 'a.txt').unlink()
+    analyser.run(str(tmp_path))
+    assert analyser.stats.token_count == 0
+    assert analyser.chunks.clusters == {} and analyser.chunks.root_sentiment == {}
+
+
+def test_counter_subtracts_chunks_without_words(nlp):
+    vocab = nlp.vocab
+
+    def document(words):
+        return Doc(vocab, words=words, pos=['NOUN', 'VERB', 'NOUN'], deps=['nsubj', 'ROOT', 'dobj'], heads=[1, 1, 1])
+
+    parts = [NounChunkCounter(document(words)) for words in (['—', 'saw', 'dog'], ['—', 'saw', 'cat'],
+                                                              ['king', 'saw', 'dog'])]
+    total = NounChunkCounter()
+    for part in parts:
+        total.merge(part)
+
+    # The punctuation root has a chunk with no words in two parts, it stays until both are taken off
+    total.subtract(parts[1])
+    kept = NounChunkCounter().merge(parts[0]).merge(parts[2])
+    assert (total.clusters, total.lemma_clusters, total.root_sentiment) == \
+           (kept.clusters, kept.lemma_clusters, kept.root_sentiment)
+
+    total.subtract(parts[0]).subtract(parts[2])
+    assert total.clusters == {} and total.lemma_clusters == {} and total.root_sentiment == {}
+
+
+def test_long_lines_cut_as_corpus_pieces(nlp, tmp_path):
+    line = ' '.join(synthetic_text(12000, 6).split()) + '\n'
+    text = synthetic_text(2000, 7) + '\n\n' + line + '\n' + 'é' * MAX_BLOCK_BYTES + '\n'
+    data = text.encode()
+    blocks = file_blocks(data)
+
+    assert [start for start, end in blocks[1:]] == [end for start, end in blocks[:-1]] and blocks[-1][1] == len(data)
+    assert all(end - start <= MAX_BLOCK_BYTES for start, end in blocks)
+    assert ''.join(data[start:end].decode() for start, end in blocks) == text
+    assert [part.encode() for part in split_lines([line], MAX_BLOCK_BYTES)] == \
+        list(split_lines([line.encode()], MAX_BLOCK_BYTES))
+
+    (tmp_path / 'long.txt').write_text(synthetic_text(2000, 7) + '\n\n' + line)
+    pieces, = CorpusRunner(nlp, max_chars=MAX_BLOCK_BYTES).run(str(tmp_path), StatsCollector())
+    assert IncrementalAnalyser(nlp).run(str(tmp_path)).stats.tokens_cleaned == pieces.tokens_cleaned
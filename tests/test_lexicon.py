@@ -0,0 +1,44 @@
+'''
+Tests of the compiled sentiment lexicon and the Sentiment methods built on it.
+
+INPUT: Words from the Hu and Liu opinion lexicon and a short text.
+OUTPUT: Pytest results.
+'''
+from sentiment.classNegative import Negative
+from sentiment.classPositive import Positive
+from sentiment.classSentiment import Sentiment
+from sentiment.lexicon import NEGATIVE, NEUTRAL, POSITIVE, get_lexicon
+
+TEXT = 'I would rather be a peasant with her baby , for all I shine so like the sun ; poor dove !'.split()
+
+
+def legacy_label(word) -> int:
+    if Positive().is_positive(word):
+        return POSITIVE
+    elif Negative().is_negative(word):
+        return NEGATIVE
+    return NEUTRAL
+
+
+def test_labels_match_word_lists():
+    words = TEXT + ['Swift', 'DECAY', 'gilded', 'hate', 'love', 'zzz']
+    assert get_lexicon().labels(words) == [legacy_label(word) for word in words]
+
+
+def test_label_is_case_insensitive():
+    lexicon = get_lexicon()
+    assert lexicon.label('love') == lexicon.label('LOVE') == POSITIVE
+    assert lexicon.label('hate') == lexicon.label('Hate') == NEGATIVE
+    assert 'Love' in lexicon and 'zzz' not in lexicon
+
+
+def test_lexicon_is_shared():
+    assert get_lexicon() is get_lexicon()
+
+
+def test_sentiment_methods():
+    assert Sentiment.sentiment_text(['love', 'zzz', 'hate']) == [('love', 1), ('zzz', 0), ('hate', -1)]
+    assert Sentiment.sentiment_text_values(['love', 'zzz', 'hate']) == [1, 0, -1]
+    assert Sentiment.sentiment_score_text(['love', 'love', 'hate', 'zzz']) == 0.25
+    assert Sentiment.sentiment_single_word('...') == 0
+    assert Sentiment.sentiment_single_word('love') == 1
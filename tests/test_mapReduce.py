@@ -0,0 +1,123 @@
+'''
+Tests of map-reduce corpus stats on the blank pipeline: sharding, exact count tables against StatsCollector and the
+error bounds of the approximate sketches.
+
+INPUT: Synthetic corpus files in a temporary directory.
+OUTPUT: Pytest results.
+'''
+import random
+import pickle
+import numpy
+import pytest
+import spacy
+from analysers import mapReduce
+from analysers.basicStats import StatsCollector
+from analysers.corpusRunner import CorpusRunner
+from benchmarks.syntheticCorpus import synthetic_text
+
+REPORTS = ('get_top_tokens', 'get_top_tokens_cleaned', 'get_top_lemmas', 'get_top_lemmas_cleaned',
+           'get_named_entities')
+
+
+@pytest.fixture(scope='module')
+def corpus(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('corpus')
+    for i in range(3):
+        (directory / f'text{i}.txt').write_text(synthetic_text(5000 * (i + 1), i))
+    (directory / 'empty.txt').write_text('')
+
+    return str(directory)
+
+
+@pytest.fixture(scope='module')
+def reference(corpus):
+    stats, = CorpusRunner(spacy.blank('en')).run(corpus, StatsCollector())
+    return stats
+
+
+@pytest.mark.parametrize('text', [
+    synthetic_text(3000, 5),
+    ''.join(f'2026-10-18 record {i} value {i * 7 % 13}\n' for i in range(2000)),
+    ' '.join(f'w{i}' for i in range(5000)),
+    'ä€😀' * 3000,
+])
+def test_shards_cover_file_exactly(tmp_path, text):
+    path = tmp_path / 'file.txt'
+    path.write_text(text, encoding='utf-8')
+    data = path.read_bytes()
+
+    for shard_bytes in (1000, 7777):
+        shards = mapReduce.corpus_shards(str(path), shard_bytes)
+        parts = [''.join(mapReduce.shard_lines(*shard, window=shard_bytes)).encode('utf-8') for shard in shards]
+        assert b''.join(parts) == data
+        # Files without blank lines are spread over the shards too
+        assert max(len(part) for part in parts) < 2 * shard_bytes + 100
+
+
+def test_count_tables_equal_stats_collector(corpus, reference):
+    tables = mapReduce.map_reduce(corpus, 'blank', workers=0, shard_bytes=4000)
+
+    assert tables.get_token_count() == reference.get_token_count()
+    for report in REPORTS:
+        assert getattr(tables, report)(None) == getattr(reference, report)(None), report
+    assert tables.get_pos() == reference.get_pos()
+
+
+def test_count_tables_merge_in_any_order(corpus, reference):
+    shards = mapReduce.corpus_shards(corpus, 4000)
+    mapReduce._init_worker('blank')
+    parts = [mapReduce.map_shard(shard, number) for number, shard in enumerate(shards)]
+    random.Random(0).shuffle(parts)
+
+    # Pickled as sent from workers
+    tables = mapReduce.CountTables().merge(*[pickle.loads(pickle.dumps(part)) for part in parts])
+    for report in REPORTS:
+        assert getattr(tables, report)(None) == getattr(reference, report)(None), report
+
+
+def test_sketch_tables_within_error_bounds(corpus):
+    capacity = 50
+    exact = mapReduce.map_reduce(corpus, 'blank', workers=0, shard_bytes=4000)
+    sketches = mapReduce.map_reduce(corpus, 'blank', workers=0, approximate=True, capacity=capacity, width=256,
+                                    shard_bytes=4000)
+
+    for report in ('get_top_tokens', 'get_top_lemmas'):
+        counts = dict(getattr(exact, report)(None))
+        bound = sum(counts.values()) / capacity
+        for key, count in getattr(sketches, report)(20):
+            assert counts[key] <= count <= counts[key] + bound, (report, key)
+
+    assert sketches.token_count == exact.token_count
+    assert len(sketches.strings) <= capacity * len(mapReduce.TABLES)
+
+
+def test_space_saving_merge_bounds():
+    rng = numpy.random.RandomState(0)
+    counts = rng.zipf(1.5, size=(4, 2000)) % 500
+    capacity = 40
+    summary = mapReduce.SpaceSaving(capacity)
+    true = numpy.zeros(500, dtype=numpy.int64)
+
+    for part in counts:
+        keys, values = numpy.unique(part, return_counts=True)
+        other = mapReduce.SpaceSaving(capacity).merge(keys.astype(numpy.uint64), values)
+        summary.merge_summary(other)
+        numpy.add.at(true, part, 1)
+
+    bound = true.sum() / capacity
+    assert len(summary.keys) <= capacity
+    for key, count, error in zip(summary.keys.tolist(), summary.counts.tolist(), summary.errors.tolist()):
+        assert true[key] <= count <= true[key] + error
+        assert error <= bound
+
+
+def test_count_min_sketch_never_underestimates():
+    rng = numpy.random.RandomState(1)
+    keys = rng.randint(0, 2 ** 63, size=3000, dtype=numpy.uint64)
+    counts = rng.randint(1, 20, size=3000)
+    first = mapReduce.CountMinSketch(256, 4).update(keys[:1500], counts[:1500])
+    second = mapReduce.CountMinSketch(256, 4).update(keys[1500:], counts[1500:])
+
+    estimates = first.merge(second).estimate(keys)
+    assert (estimates >= counts).all()
+    assert (estimates - counts).mean() <= counts.sum() * numpy.e / 256
@@ -0,0 +1,92 @@
+'''
+Tests of the model registry: names, needed components, one load per model shared by views of its components, and
+profiling of views.
+
+A blank pipeline with rule based components named tagger, parser and ner is saved as a model directory, so the tests
+run offline.
+
+INPUT: Model directory in a temporary directory.
+OUTPUT: Pytest results.
+'''
+import pytest
+import spacy
+from analysers import models
+from common import profiling
+
+
+@pytest.fixture(scope='module')
+def model(tmp_path_factory):
+    nlp = spacy.blank('en')
+    nlp.add_pipe('attribute_ruler', name='tagger').add([[{'LOWER': 'the'}]], {'POS': 'DET'})
+    nlp.add_pipe('sentencizer', name='parser')
+    nlp.add_pipe('entity_ruler', name='ner').add_patterns([{'label': 'PERSON', 'pattern': 'Laura'}])
+    path = tmp_path_factory.mktemp('models') / 'en_test'
+    nlp.to_disk(path)
+    return str(path)
+
+
+@pytest.fixture(autouse=True)
+def clear():
+    yield
+    models.clear()
+
+
+def test_model_name(model):
+    assert models.model_name('sm') == 'en_core_web_sm'
+    assert models.model_name(model) == model
+    with pytest.raises(ValueError):
+        models.model_name('xl')
+
+
+def test_required_components():
+    assert models.required_components(None) is None
+    assert models.required_components(['tokens']) == ()
+    assert models.required_components(['noun_chunks', 'entities']) == \
+        ('attribute_ruler', 'lemmatizer', 'ner', 'parser', 'tagger', 'tok2vec')
+    assert models.required_components(['entities']) == ('ner',)
+    with pytest.raises(ValueError):
+        models.required_components(['topics'])
+
+
+def test_load_runs_needed_components_only(model):
+    nlp = models.load('entities', size=model)
+
+    assert nlp.pipe_names == ['ner']
+    assert nlp.max_length == models.MAX_LENGTH
+    assert models.load('entities', size=model) is nlp
+
+
+def test_full_pipeline(model):
+    assert models.load(size=model).pipe_names == ['tagger', 'parser', 'ner']
+    models.clear()
+    assert models.load('tokens', size=model).pipe_names == []
+
+
+def test_one_load_per_model(model, monkeypatch):
+    calls = []
+    load = spacy.load
+    monkeypatch.setattr(spacy, 'load', lambda *args, **kwargs: calls.append(args) or load(*args, **kwargs))
+
+    stats = models.load('entities', 'pos', size=model)
+    chunks = models.load('noun_chunks', size=model)
+    full = models.load(size=model)
+
+    assert len(calls) == 1
+    assert stats.pipe_names == ['tagger', 'ner'] and chunks.pipe_names == ['tagger', 'parser']
+    assert full.pipe_names == ['tagger', 'parser', 'ner']
+    assert stats.vocab is chunks.vocab is full.vocab
+    assert dict(stats.pipeline)['tagger'] is dict(chunks.pipeline)['tagger'] is dict(full.pipeline)['tagger']
+    # Views made before a component was enabled keep their own components
+    assert stats.pipe_names == ['tagger', 'ner']
+
+
+def test_views_profiled_when_made_before(model):
+    view = models.load('entities', size=model)
+    assert profiling.active() is None
+
+    with profiling.profiling() as profile:
+        assert [ent.text for ent in view('Laura met Lizzie.').ents] == ['Laura']
+        list(view.pipe(['The king.', 'The queen.']))
+
+    assert profile.stages['spacy.ner'].calls == 3
+    assert 'spacy.parser' not in profile.stages
@@ -0,0 +1,165 @@
+'''
+Tests of the noun chunk collector and index: running root sentiment sums, merging, top-K roots and the cached
+per-document index and lemmas of words out of context.
+
+Documents are built with a hand made parse of subject verb object sentences on a blank English vocabulary, so the
+tests run offline.
+
+INPUT: Seeded random sentences of lexicon and neutral words.
+OUTPUT: Pytest results.
+'''
+import gc
+import random
+import weakref
+import pytest
+import spacy
+from spacy.attrs import POS, LEMMA, HEAD, DEP
+from spacy.tokens import Doc
+from spacy.lookups import Lookups
+from sentiment.lexicon import get_lexicon
+from analysers import models, nounChunks
+from analysers.nounChunks import NounChunkCollector, nc_index, nc_index_clear, nc_index_version
+
+NOUNS = ['king', 'queen', 'dove', 'eagle', 'market', 'garden', 'fruit', 'sister']
+ADJECTIVES = ['good', 'happy', 'bad', 'poor', 'old', 'green', 'golden', 'evil']
+VERBS = ['saw', 'met', 'loved', 'kept']
+
+
+@pytest.fixture(scope='module')
+def vocab():
+    return spacy.blank('en').vocab
+
+
+# Returns list of (word, pos, dep) tuples of a noun phrase, dep of the root being set when added
+def noun_phrase(rng) -> list:
+    words = [('the', 'DET', 'det')] + [(rng.choice(ADJECTIVES), 'ADJ', 'amod') for i in range(rng.randint(0, 2))]
+    return words + [(rng.choice(NOUNS), 'NOUN', None)]
+
+
+# Adds (word, pos, head, dep) tuples of the noun phrase, its root attached to head
+def add_phrase(tokens, words, head, dep):
+    root = len(tokens) + len(words) - 1
+    for word, pos, word_dep in words:
+        tokens.append((word, pos, root, word_dep) if word_dep else (word, pos, head, dep))
+
+
+# Returns document of n subject verb object sentences with POS, lemma and dependency annotation set
+def parsed_doc(vocab, n, seed=0) -> Doc:
+    rng = random.Random(seed)
+    tokens = []
+
+    for i in range(n):
+        subject = noun_phrase(rng)
+        verb = len(tokens) + len(subject)
+        add_phrase(tokens, subject, verb, 'nsubj')
+        tokens.append((rng.choice(VERBS), 'VERB', verb, 'ROOT'))
+        add_phrase(tokens, noun_phrase(rng), verb, 'dobj')
+        tokens.append(('.', 'PUNCT', verb, 'punct'))
+
+    document = Doc(vocab, words=[word for word, pos, head, dep in tokens])
+    array = document.to_array([POS, LEMMA, HEAD, DEP])
+    for i, (word, pos, head, dep) in enumerate(tokens):
+        array[i] = [vocab.strings.add(pos), vocab.strings.add(word), (head - i) & 0xFFFFFFFFFFFFFFFF,
+                    vocab.strings.add(dep)]
+    document.from_array([POS, LEMMA, HEAD, DEP], array)
+    return document
+
+
+# Returns root -> [sum, count] of the chunk word labels, counted chunk by chunk
+def reference_sentiment(*documents) -> dict:
+    lexicon = get_lexicon()
+    sentiment = {}
+    for document in documents:
+        for chunk in document.noun_chunks:
+            accumulator = sentiment.setdefault(chunk.root.text.lower(), [0, 0])
+            accumulator[0] += sum(lexicon.label(token.text) for token in chunk)
+            accumulator[1] += len(chunk)
+    return sentiment
+
+
+def test_root_sentiment_sums(vocab):
+    document = parsed_doc(vocab, 50)
+    collector = NounChunkCollector(document)
+    expected = reference_sentiment(document)
+
+    assert collector.root_sentiment == expected
+    assert collector.get_root_sentiment_score() == {root: 0 if total == 0 else round(total / count, 4)
+                                                    for root, (total, count) in expected.items()}
+
+
+def test_merge_equals_one_collector(vocab):
+    first, second = parsed_doc(vocab, 30, seed=1), parsed_doc(vocab, 30, seed=2)
+    merged = NounChunkCollector(first).merge(NounChunkCollector(second))
+    single = NounChunkCollector(first).update(second)
+
+    assert merged.root_sentiment == single.root_sentiment == reference_sentiment(first, second)
+    assert merged.clusters == single.clusters
+    assert merged.lemma_clusters == single.lemma_clusters
+    assert merged.get_root_sentiment_score() == single.get_root_sentiment_score()
+
+
+def test_top_roots_match_sorted(vocab):
+    scores = NounChunkCollector(parsed_doc(vocab, 80)).get_root_sentiment_score().items()
+    collector = NounChunkCollector(parsed_doc(vocab, 80))
+
+    for number in list(range(len(scores) + 2)) + [None]:
+        assert list(collector.get_root_mostpos(number).items()) == \
+            sorted(scores, key=lambda x: x[1], reverse=True)[:number]
+        assert list(collector.get_root_mostneg(number).items()) == sorted(scores, key=lambda x: x[1])[:number]
+
+
+def test_index_cached_until_cleared(vocab):
+    document = parsed_doc(vocab, 10)
+    index = nc_index(document)
+    assert nc_index(document) is index
+    assert nounChunks.nc_list(document) == [(chunk.text, chunk.root.text) for chunk in document.noun_chunks]
+
+    # Re-parsed in place without a length change: the old index is kept until the version is raised
+    array = document.to_array([DEP])
+    array[array == vocab.strings['dobj']] = vocab.strings.add('dep')
+    document.from_array([DEP], array)
+    assert nc_index(document) is index
+
+    nc_index_clear(document)
+    assert nc_index_version(document) == 1
+    assert nc_index(document) is not index
+    assert nounChunks.nc_list(document) == [(chunk.text, chunk.root.text) for chunk in document.noun_chunks]
+    assert len(nounChunks.nc_list(document)) == 10
+
+
+def test_index_not_kept_with_document(vocab):
+    document = parsed_doc(vocab, 10)
+    chunks = nounChunks.nc_list(document)
+    expected = [(chunk.text, chunk.root.text) for chunk in document.noun_chunks]
+
+    # Nothing in user_data, so the document serialises as before
+    assert document.user_data == {}
+    assert len(document.to_bytes()) > 0
+
+    reference = weakref.ref(document)
+    del document
+    gc.collect()
+
+    assert reference() is None
+    assert chunks == expected
+
+
+def test_word_lemmas_from_vocab_lookups():
+    vocab = spacy.blank('en').vocab
+    vocab.lookups.add_table('lemma_lookup', {'kings': 'king'})
+    document = parsed_doc(vocab, 20)
+
+    assert nounChunks.nc_word_lemmas('kings', document) == nounChunks.nc_word_lemmas('king', document) != []
+
+
+def test_word_lemmas_from_lemmatizer(monkeypatch):
+    nlp = spacy.blank('en')
+    lookups = Lookups()
+    lookups.add_table('lemma_lookup', {'kings': 'king', 'Queens': 'queen'})
+    nlp.add_pipe('lemmatizer', config={'mode': 'lookup'}).initialize(lookups=lookups)
+    monkeypatch.setitem(models._models, 'test_lemmatizer', nlp)
+    document = parsed_doc(nlp.vocab, 20)
+
+    assert nounChunks.nc_word_lemmas('kings', document) == nounChunks.nc_word_lemmas('king', document) != []
+    assert nounChunks.nc_word_lemmas('Queens', document) == nounChunks.nc_word_lemmas('queen', document) != []
+    assert nounChunks.nc_word_lemmas('kings', parsed_doc(spacy.blank('en').vocab, 20)) == []
@@ -0,0 +1,80 @@
+'''
+Tests of the profiling hooks: stage records when switched on only, nesting, pipeline instrumentation and reports.
+
+INPUT: Small instrumented functions, blank English pipeline with a sentencizer.
+OUTPUT: Pytest results.
+'''
+import json
+import pytest
+import spacy
+from common import profiling
+
+
+@profiling.stage('test.double', items=profiling.first_length)
+def double(words) -> list:
+    return words * 2
+
+
+def test_stage_records_only_when_on():
+    double(['a', 'b'])
+    assert profiling.active() is None
+
+    with profiling.profiling() as profile:
+        double(['a', 'b'])
+        double(['a', 'b', 'c'])
+        with profiling.measure('test.block', items=5):
+            double([])
+
+    stages = profile.report()['stages']
+    assert stages['test.double']['calls'] == 3 and stages['test.double']['items'] == 5
+    assert stages['test.block']['calls'] == 1 and stages['test.block']['items'] == 5
+    assert profiling.active() is None
+
+
+def test_nested_profiles():
+    with profiling.profiling() as outer:
+        with profiling.profiling() as inner:
+            double(['a'])
+        assert profiling.active() is outer
+        double(['a', 'b'])
+
+    assert inner.stages['test.double'].items == 1
+    assert outer.stages['test.double'].items == 2
+
+
+def test_report_sorted_by_wall_time(tmp_path):
+    profile = profiling.Profile()
+    profile.record('fast', 0.1, 0.1)
+    profile.record('slow', 0.5, 0.4, items=10)
+    profile.record('slow', 0.5, 0.4, items=10)
+
+    report = profile.report()
+    assert list(report['stages']) == ['slow', 'fast']
+    assert report['stages']['slow'] == {'wall': 1.0, 'cpu': 0.8, 'calls': 2, 'items': 20, 'items_per_second': 20.0,
+                                        'memory': 0}
+
+    path = str(tmp_path / 'report.json')
+    profile.to_json(path)
+    with open(path) as f:
+        assert json.load(f) == report
+
+    with pytest.raises(ValueError):
+        profile.dump_stats(str(tmp_path / 'report.pstats'))
+
+
+def test_instrument_pipeline():
+    nlp = spacy.blank('en')
+    nlp.add_pipe('sentencizer')
+    profiling.instrument_pipeline(nlp)
+    profiling.instrument_pipeline(nlp)
+    texts = ['The king met the queen. The dove flew.', 'Over the moon.']
+
+    with profiling.profiling() as profile:
+        documents = [nlp(texts[0])] + list(nlp.pipe(texts))
+
+    stage = profile.stages['spacy.sentencizer']
+    assert stage.calls == 3 and stage.items == sum(len(document) for document in documents)
+    assert len(list(documents[0].sents)) == 2
+
+    profiling.uninstrument_pipeline(nlp)
+    assert not any(isinstance(component, profiling.TimedComponent) for name, component in nlp.pipeline)
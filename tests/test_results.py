@@ -0,0 +1,86 @@
+'''
+Tests of the compact result types: ChunkView and ChunkRecord give the tuples of the lists they replace,
+WordSentiment those of Sentiment.sentiment_text.
+
+INPUT: Synthetic annotated document on a blank English vocabulary.
+OUTPUT: Pytest results.
+'''
+import pytest
+import spacy
+from sentiment.lexicon import get_lexicon
+from sentiment.classSentiment import Sentiment
+from sentiment.wordSentiment import WordSentiment
+from analysers.results import ChunkRecord, ChunkTable, ChunkView
+from benchmarks.syntheticCorpus import synthetic_doc
+
+
+@pytest.fixture(scope='module')
+def document():
+    return synthetic_doc(spacy.blank('en').vocab, 2000, seed=5)
+
+
+def label(token) -> int:
+    lexicon = get_lexicon()
+    return lexicon.label(token.lemma_) or lexicon.label(token.lower_)
+
+
+# Returns the expected tuples of each view kind, built chunk by chunk from the spacy spans
+def expected(document) -> dict:
+    kinds = {kind: [] for kind in ('chunks', 'words', 'lemmas', 'sentiment', 'values')}
+    for chunk in document.noun_chunks:
+        tokens = [token for token in chunk if not token.is_punct and not token.is_space]
+        words = [token.text for token in tokens]
+        values = [label(token) for token in tokens]
+        root = chunk.root.text
+        kinds['chunks'].append((chunk.text, root))
+        kinds['words'].append((words, root))
+        kinds['lemmas'].append(([token.lemma_.lower() for token in tokens], chunk.root.lemma_.lower()))
+        kinds['sentiment'].append((list(zip(words, values)), root))
+        kinds['values'].append((values, root))
+    return kinds
+
+
+def test_views_match_spans(document):
+    table = ChunkTable(document)
+    assert len(table) == len(list(document.noun_chunks)) > 0
+
+    for kind, tuples in expected(document).items():
+        view = ChunkView(table, kind)
+        assert view.tolist() == tuples
+        assert view == tuples and list(view) == tuples
+        assert view[-1] == tuples[-1] and view[2:5] == tuples[2:5]
+
+
+def test_record_accessors(document):
+    table = ChunkTable(document)
+    chunk = list(document.noun_chunks)[3]
+    record = ChunkView(table, 'sentiment')[3]
+
+    assert isinstance(record, ChunkRecord)
+    assert (record.start, record.end, record.text) == (chunk.start, chunk.end, chunk.text)
+    assert record.root == chunk.root.text and record.root_lemma == chunk.root.lemma_.lower()
+    assert record.words == [token.text for token in chunk]
+    assert record.values == [label(token) for token in chunk]
+    assert record.pairs == list(zip(record.words, record.values))
+
+    pairs, root = record
+    assert (pairs, root) == record.astuple() and record[1] == root and len(record) == 2
+    assert repr(record) == repr((pairs, root))
+
+
+def test_view_errors(document):
+    view = ChunkView(ChunkTable(document), 'words')
+    with pytest.raises(IndexError):
+        view[len(view)]
+    with pytest.raises(ValueError):
+        ChunkView(view.table, 'roots')
+
+
+def test_word_sentiment_matches_pairs():
+    words = 'The good king and the evil queen'.split()
+    result = Sentiment.sentiment_text(words)
+
+    assert isinstance(result, WordSentiment)
+    assert result == get_lexicon().pairs(words) and result.tolist() == get_lexicon().pairs(words)
+    assert result[1] == ('good', 1) and result[-2:] == [('evil', -1), ('queen', 0)]
+    assert len(result) == len(words)
@@ -0,0 +1,123 @@
+'''
+Tests of the analysis service with the blank pipeline: micro-batching, error responses, the max_pending limit and
+TCP and Unix socket connections.
+
+INPUT: Requests to a service running in the test's event loop, workers=0.
+OUTPUT: Pytest results.
+'''
+import asyncio
+import threading
+from sentiment.lexicon import get_lexicon
+from analysers import service
+from analysers.service import AnalysisService, query
+
+TEXT = 'The good king met the evil queen .'
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+async def started(**options) -> AnalysisService:
+    return await AnalysisService(size='blank', workers=0, **options).start()
+
+
+def test_concurrent_requests_batched(monkeypatch):
+    sizes = []
+    analyse_batch = service._analyse_batch
+
+    def recording(requests):
+        sizes.append(len(requests))
+        return analyse_batch(requests)
+
+    monkeypatch.setattr(service, '_analyse_batch', recording)
+
+    async def scenario():
+        analyser = await started(batch_size=8, max_latency=0.05)
+        try:
+            return await asyncio.gather(*(analyser.analyse('text_sentiment', f'{TEXT} {i}') for i in range(20)))
+        finally:
+            await analyser.close()
+
+    results = run(scenario())
+
+    assert results == [get_lexicon().pairs(f'{TEXT} {i}'.split()) for i in range(20)]
+    assert sum(sizes) == 20 and max(sizes) > 1 and all(size <= 8 for size in sizes)
+
+
+def test_error_responses(tmp_path):
+    async def scenario():
+        analyser = await started()
+        server = await analyser.serve_tcp(port=0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            return await query([{'op': 'stats', 'text': TEXT, 'number': 3},
+                                {'op': 'topics', 'text': TEXT},
+                                {'op': 'noun_chunks', 'text': TEXT},
+                                {'op': 'text_sentiment', 'text': 'good evil'},
+                                {'op': 'stats', 'text': 12}], port=port)
+        finally:
+            await analyser.close()
+
+    stats, unknown, chunks, sentiment, wrong_type = run(scenario())
+
+    assert stats['result']['token_count'] == 8 and len(stats['result']['top_tokens']) == 3
+    assert unknown['error'].startswith('ValueError: Unknown operation')
+    # The blank pipeline has no parser, so noun chunks fail for this request only
+    assert 'error' in chunks and 'result' not in chunks
+    assert sentiment['result'] == [['good', 1], ['evil', -1]]
+    assert wrong_type['error'].startswith('TypeError')
+
+
+def test_max_pending_limits_queue(monkeypatch):
+    release = threading.Event()
+    analyse_batch = service._analyse_batch
+
+    def blocked(requests):
+        release.wait(10)
+        return analyse_batch(requests)
+
+    monkeypatch.setattr(service, '_analyse_batch', blocked)
+
+    async def scenario():
+        analyser = await started(batch_size=1, max_latency=0, max_pending=2)
+        try:
+            # One batch runs, one waits for a free worker and two fill the queue, the fifth waits for room
+            futures = []
+            for i in range(4):
+                futures.append(await asyncio.wait_for(analyser._enqueue('text_sentiment', TEXT, {}), 1))
+                await asyncio.sleep(0.05)
+            waiting = asyncio.ensure_future(analyser._enqueue('text_sentiment', TEXT, {}))
+            await asyncio.sleep(0.1)
+            full, blocked_put = analyser.queue.full(), not waiting.done()
+
+            release.set()
+            futures.append(await asyncio.wait_for(waiting, 5))
+            results = await asyncio.wait_for(asyncio.gather(*futures), 5)
+            return full, blocked_put, results
+        finally:
+            release.set()
+            await analyser.close()
+
+    full, blocked_put, results = run(scenario())
+
+    assert full and blocked_put
+    assert len(results) == 5 and all(len(result) == len(TEXT.split()) for result in results)
+
+
+def test_unix_socket(tmp_path):
+    path = str(tmp_path / 'service.sock')
+
+    async def scenario():
+        analyser = await started()
+        await analyser.serve_unix(path)
+        try:
+            return await query([{'op': 'text_sentiment', 'text': 'good king'}, {'op': 'stats', 'text': TEXT}],
+                               path=path)
+        finally:
+            await analyser.close()
+
+    sentiment, stats = run(scenario())
+
+    assert sentiment == {'id': 0, 'result': [['good', 1], ['king', 0]]}
+    assert stats['id'] == 1 and stats['result']['token_count'] == 8
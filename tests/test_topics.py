@@ -0,0 +1,94 @@
+'''
+Tests of topic clustering: exact and LSH similar pairs against brute force, connected components and cluster
+sentiment.
+
+INPUT: Random unit vectors around a few centres, blank English vocabulary with hand set word vectors.
+OUTPUT: Pytest results.
+'''
+import numpy
+import spacy
+from analysers import topics
+from analysers.nounChunks import NounChunkCollector
+from analysers.topics import TopicClusters, connected_components, lsh_pairs, similar_pairs
+
+
+# Returns normalised float32 rows scattered around a number of random centres
+def clustered(size, centres=20, width=32, spread=0.3, seed=0) -> numpy.ndarray:
+    random = numpy.random.RandomState(seed)
+    middles = random.standard_normal((centres, width))
+    matrix = middles[random.randint(0, centres, size)] + spread * random.standard_normal((size, width))
+    matrix /= numpy.linalg.norm(matrix, axis=1)[:, None]
+    return matrix.astype(numpy.float32)
+
+
+def brute_force(matrix, threshold) -> set:
+    similarity = matrix @ matrix.T
+    return {(i, j) for i, j in zip(*numpy.nonzero(similarity >= threshold)) if i < j}
+
+
+def pair_set(pairs) -> set:
+    return set(zip(pairs[0].tolist(), pairs[1].tolist()))
+
+
+def test_similar_pairs_match_brute_force(monkeypatch):
+    matrix = clustered(300)
+    expected = brute_force(matrix, 0.6)
+    assert len(expected) > 100
+
+    assert pair_set(similar_pairs(matrix, 0.6)) == expected
+    # Many small blocks give the same pairs
+    monkeypatch.setattr(topics, 'BLOCK_ELEMENTS', 1000)
+    first, second = similar_pairs(matrix, 0.6)
+    assert pair_set((first, second)) == expected and len(first) == len(expected)
+
+
+def test_lsh_pairs_agree_with_exact():
+    matrix = clustered(2000, centres=40)
+    exact = pair_set(similar_pairs(matrix, 0.8))
+    approximate = pair_set(lsh_pairs(matrix, 0.8, bucket_size=64))
+
+    # No pair below threshold, and most exact pairs found
+    assert approximate <= exact
+    assert len(approximate) >= 0.9 * len(exact)
+    assert pair_set(lsh_pairs(matrix, 0.8, bucket_size=64)) == approximate
+
+
+def test_connected_components_match_reference():
+    random = numpy.random.RandomState(1)
+    for trial in range(20):
+        size = random.randint(1, 60)
+        first = random.randint(0, size, random.randint(0, size))
+        second = random.randint(0, size, len(first))
+
+        # Reference labels by repeated relaxation to the smallest neighbour label
+        expected = list(range(size))
+        changed = True
+        while changed:
+            changed = False
+            for i, j in zip(first.tolist(), second.tolist()):
+                low = min(expected[i], expected[j])
+                if expected[i] != low or expected[j] != low:
+                    expected[i] = expected[j] = low
+                    changed = True
+
+        assert connected_components(size, first, second).tolist() == expected
+
+
+def test_clusters_share_sentiment():
+    vocab = spacy.blank('en').vocab
+    vocab.reset_vectors(width=3)
+    for word, vector in (('king', [1, 0, 0]), ('monarch', [0.9, 0.1, 0]), ('queen', [0.8, 0.2, 0.1]),
+                         ('dove', [0, 1, 0]), ('laura', [0, 0, 1])):
+        vocab.set_vector(word, numpy.array(vector, dtype=numpy.float32))
+
+    chunks = NounChunkCollector()
+    chunks.root_sentiment = {'king': [2, 4], 'monarch': [-1, 2], 'queen': [3, 3], 'dove': [1, 2], 'goblin': [-2, 2]}
+    clusters = TopicClusters.build(vocab, chunks, threshold=0.9)
+
+    assert clusters.get_clusters() == {'king': ['king', 'monarch', 'queen']}
+    assert clusters.get_cluster('Monarch') == ['king', 'monarch', 'queen']
+    assert clusters.get_cluster('goblin') == ['goblin'] and clusters.get_cluster('nobody') == []
+    assert clusters.get_term_score('queen') == round(4 / 9, 4)
+    assert clusters.get_term_score('dove') == 0.5 and clusters.get_term_score('nobody') == 0
+    assert clusters.get_mostpos() == {'king': round(4 / 9, 4)}
+    assert clusters.get_scores() == {'king': round(4 / 9, 4), 'dove': 0.5, 'goblin': -1.0}